@@ -6,52 +6,26 @@ Returns: HTTP response dict с JWT токеном или ошибкой
 '''
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime, timedelta
 import hashlib
 import secrets
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 
-JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-key-change-in-production')
-DATABASE_URL = os.environ.get('DATABASE_URL')
+from db import get_connection, prepared
+from responses import compressible, dumps, make_etag, not_modified, with_etag
+from tokens import create_token, verify_token
 
-def create_jwt(user_id: int, email: str) -> str:
-    """Создание простого JWT токена (упрощенная версия без библиотек)"""
-    payload = {
-        'user_id': user_id,
-        'email': email,
-        'exp': (datetime.utcnow() + timedelta(days=30)).isoformat()
-    }
-    
-    payload_str = json.dumps(payload)
-    signature = hashlib.sha256(f"{payload_str}{JWT_SECRET}".encode()).hexdigest()
-    
-    token = f"{payload_str}::{signature}"
-    import base64
-    return base64.b64encode(token.encode()).decode()
+USER_BY_ID = prepared(
+    'auth_user_by_id',
+    "SELECT id, email, full_name FROM t_p45717398_energy_dashboard_pro.users WHERE id = $1",
+    ('int',)
+)
+# Поиск по LOWER(email) идёт по функциональному индексу idx_users_email_lower
+USER_BY_EMAIL = prepared(
+    'auth_user_by_email',
+    "SELECT id, email, full_name, password_hash FROM t_p45717398_energy_dashboard_pro.users WHERE LOWER(email) = $1",
+    ('varchar',)
+)
 
-def verify_jwt(token: str) -> Optional[Dict[str, Any]]:
-    """Проверка JWT токена"""
-    try:
-        import base64
-        decoded = base64.b64decode(token.encode()).decode()
-        payload_str, signature = decoded.split('::')
-        
-        expected_signature = hashlib.sha256(f"{payload_str}{JWT_SECRET}".encode()).hexdigest()
-        
-        if signature != expected_signature:
-            return None
-        
-        payload = json.loads(payload_str)
-        
-        exp_time = datetime.fromisoformat(payload['exp'])
-        if datetime.utcnow() > exp_time:
-            return None
-        
-        return payload
-    except Exception:
-        return None
 
 def hash_password(password: str) -> str:
     """Хеширование пароля с солью"""
@@ -68,6 +42,7 @@ def verify_password(password: str, stored_hash: str) -> bool:
     except Exception:
         return False
 
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -77,15 +52,38 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    # Проверка токена до соединения с БД: отказ отвечается без psycopg2
+    if method == 'GET':
+        auth_header = event.get('headers', {}).get('X-Auth-Token', '')
+        
+        if not auth_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': dumps({'error': 'Токен не предоставлен'}),
+                'isBase64Encoded': False
+            }
+        
+        payload = verify_token(auth_header)
+        
+        if not payload:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': dumps({'error': 'Невалидный или истекший токен'}),
+                'isBase64Encoded': False
+            }
+    
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = get_connection()
+        from psycopg2.extras import RealDictCursor
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'POST':
@@ -102,25 +100,25 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Email и пароль обязательны'})
+                        'body': dumps({'error': 'Email и пароль обязательны'})
                     }
                 
                 if len(password) < 6:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пароль должен быть минимум 6 символов'}),
+                        'body': dumps({'error': 'Пароль должен быть минимум 6 символов'}),
                         'isBase64Encoded': False
                     }
                 
-                cur.execute("SELECT id FROM t_p45717398_energy_dashboard_pro.users WHERE email = %s", (email,))
+                USER_BY_EMAIL.execute(cur, email)
                 existing = cur.fetchone()
                 
                 if existing:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пользователь с таким email уже существует'}),
+                        'body': dumps({'error': 'Пользователь с таким email уже существует'}),
                         'isBase64Encoded': False
                     }
                 
@@ -152,12 +150,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 user = cur.fetchone()
                 conn.commit()
                 
-                token = create_jwt(user['id'], user['email'])
+                token = create_token(user['id'], user['email'])
                 
                 return {
                     'statusCode': 201,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
+                    'body': dumps({
                         'token': token,
                         'user': {
                             'id': user['id'],
@@ -176,18 +174,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Email и пароль обязательны'})
+                        'body': dumps({'error': 'Email и пароль обязательны'})
                     }
                 
                 email_lower = email_or_username.lower()
-                cur.execute("SELECT id, email, full_name, password_hash FROM t_p45717398_energy_dashboard_pro.users WHERE LOWER(email) = %s", (email_lower,))
+                USER_BY_EMAIL.execute(cur, email_lower)
                 user = cur.fetchone()
                 
                 if not user:
                     return {
                         'statusCode': 404,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Аккаунт не найден. Пожалуйста, зарегистрируйтесь'}),
+                        'body': dumps({'error': 'Аккаунт не найден. Пожалуйста, зарегистрируйтесь'}),
                         'isBase64Encoded': False
                     }
                 
@@ -200,16 +198,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     return {
                         'statusCode': 401,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Неверный пароль'}),
+                        'body': dumps({'error': 'Неверный пароль'}),
                         'isBase64Encoded': False
                     }
                 
-                token = create_jwt(user['id'], user['email'])
+                token = create_token(user['id'], user['email'])
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
+                    'body': dumps({
                         'token': token,
                         'user': {
                             'id': user['id'],
@@ -221,41 +219,26 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
         
         elif method == 'GET':
-            auth_header = event.get('headers', {}).get('X-Auth-Token', '')
-            
-            if not auth_header:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Токен не предоставлен'}),
-                    'isBase64Encoded': False
-                }
-            
-            payload = verify_jwt(auth_header)
-            
-            if not payload:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Невалидный или истекший токен'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute("SELECT id, email, full_name FROM t_p45717398_energy_dashboard_pro.users WHERE id = %s", (payload['user_id'],))
+            USER_BY_ID.execute(cur, payload['user_id'])
             user = cur.fetchone()
             
             if not user:
                 return {
                     'statusCode': 404,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Пользователь не найден'}),
+                    'body': dumps({'error': 'Пользователь не найден'}),
                     'isBase64Encoded': False
                 }
             
-            return {
+            etag = make_etag('user', user['id'], user['email'], user['full_name'])
+            cached = not_modified(event, etag)
+            if cached:
+                return cached
+            
+            return with_etag({
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
+                'body': dumps({
                     'user': {
                         'id': user['id'],
                         'email': user['email'],
@@ -263,7 +246,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     }
                 }),
                 'isBase64Encoded': False
-            }
+            }, etag)
         
         cur.close()
         conn.close()
@@ -271,7 +254,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'body': dumps({'error': 'Метод не поддерживается'}),
             'isBase64Encoded': False
         }
     
@@ -279,6 +262,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Ошибка сервера: {str(e)}'}),
+            'body': dumps({'error': f'Ошибка сервера: {str(e)}'}),
             'isBase64Encoded': False
         }
\ No newline at end of file
@@ -0,0 +1,82 @@
+'''
+Business: Выпуск и проверка токенов авторизации с кэшем проверенных токенов в тёплом контейнере
+Args: token - строка из заголовка X-Auth-Token, user_id и email для выпуска
+Returns: payload токена (user_id, email, exp) или None, если токен невалиден или истёк
+'''
+import base64
+import hashlib
+import hmac
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-key-change-in-production')
+TOKEN_LIFETIME = timedelta(days=30)
+# Сколько проверенных токенов держит один контейнер
+CACHE_SIZE = 1024
+
+_verified: 'OrderedDict[bytes, Tuple[Dict[str, Any], datetime]]' = OrderedDict()
+
+
+def _sign(payload_str: str) -> str:
+    return hashlib.sha256(f"{payload_str}{JWT_SECRET}".encode()).hexdigest()
+
+
+def create_token(user_id: int, email: str) -> str:
+    """Выпуск токена: base64 от JSON-payload и подписи"""
+    payload_str = json.dumps({
+        'user_id': user_id,
+        'email': email,
+        'exp': (datetime.utcnow() + TOKEN_LIFETIME).isoformat()
+    })
+    return base64.b64encode(f"{payload_str}::{_sign(payload_str)}".encode()).decode()
+
+
+def _verify_uncached(token: str) -> Optional[Tuple[Dict[str, Any], datetime]]:
+    try:
+        payload_str, signature = base64.b64decode(token.encode()).decode().split('::')
+        if not hmac.compare_digest(signature, _sign(payload_str)):
+            return None
+        payload = json.loads(payload_str)
+        return payload, datetime.fromisoformat(payload['exp'])
+    except Exception:
+        return None
+
+
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    """Проверка токена; успешные проверки кэшируются до истечения токена (LRU по дайджесту)"""
+    if not token:
+        return None
+    key = hashlib.sha256(token.encode()).digest()
+    now = datetime.utcnow()
+
+    cached = _verified.get(key)
+    if cached is not None:
+        payload, expires = cached
+        if now > expires:
+            del _verified[key]
+            return None
+        _verified.move_to_end(key)
+        return dict(payload)
+
+    verified = _verify_uncached(token)
+    if verified is None or now > verified[1]:
+        return None
+    _verified[key] = verified
+    if len(_verified) > CACHE_SIZE:
+        _verified.popitem(last=False)
+    return dict(verified[0])
+
+
+if __name__ == '__main__':
+    import timeit
+
+    sample = create_token(1, 'bench@example.com')
+    runs = 100000
+    uncached = timeit.timeit(lambda: _verify_uncached(sample), number=runs)
+    verify_token(sample)
+    cached = timeit.timeit(lambda: verify_token(sample), number=runs)
+    print(f'uncached: {uncached / runs * 1e6:.2f} us/verify')
+    print(f'cached:   {cached / runs * 1e6:.2f} us/verify ({uncached / cached:.1f}x)')
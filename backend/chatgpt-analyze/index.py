@@ -1,10 +1,11 @@
-import json
 import os
 from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import requests
 
+from insights import describe_insights, load_insights
+from db import get_connection
+from responses import compressible, dumps, make_etag, not_modified, with_etag
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Analyze user energy entries using ChatGPT and provide recommendations
@@ -20,7 +21,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -36,14 +37,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': 'User ID required'})
+            'body': dumps({'error': 'User ID required'})
         }
     
-    database_url = os.environ.get('DATABASE_URL')
+    if not str(user_id).isdigit():
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': dumps({'error': 'Invalid user ID'})
+        }
     
     if method == 'GET':
         # Return existing analysis from DB
-        conn = psycopg2.connect(database_url)
+        conn = get_connection()
+        from psycopg2.extras import RealDictCursor
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         user_id_escaped = str(user_id).replace("'", "''")
@@ -65,21 +75,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'error': 'No analysis found'})
+                'body': dumps({'error': 'No analysis found'})
             }
         
-        return {
+        # Анализ меняется только при пересчёте, updated_at однозначно задаёт тело ответа
+        etag = make_etag('analysis', user_id, existing['updated_at'], existing['total_entries'])
+        cached = not_modified(event, etag)
+        if cached:
+            return cached
+        
+        return with_etag({
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
+            'body': dumps({
                 'analysis': existing['analysis_text'],
                 'total_entries': existing['total_entries'],
                 'updated_at': existing['updated_at'].isoformat() if existing['updated_at'] else None
             })
-        }
+        }, etag)
     
     if method != 'POST':
         return {
@@ -88,7 +104,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': dumps({'error': 'Method not allowed'})
         }
     
     openai_key = os.environ.get('OPENAI_API_KEY')
@@ -101,7 +117,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': 'OpenAI API key not configured'})
+            'body': dumps({'error': 'OpenAI API key not configured'})
         }
     
     if not proxy_url:
@@ -111,10 +127,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': 'Proxy URL not configured. Add OPENAI_PROXY_URL secret.'})
+            'body': dumps({'error': 'Proxy URL not configured. Add OPENAI_PROXY_URL secret.'})
         }
     
-    conn = psycopg2.connect(database_url)
+    conn = get_connection()
+    from psycopg2.extras import RealDictCursor
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     user_id_escaped = str(user_id).replace("'", "''")
@@ -139,32 +156,43 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     entries = cursor.fetchall()
     cursor.close()
-    conn.close()
     
     if not entries:
+        conn.close()
         return {
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
+            'body': dumps({
                 'analysis': 'Недостаточно данных для анализа. Добавьте больше записей об энергии.',
                 'recommendations': []
             })
         }
     
+    # Статистика по тегам за всю историю считается заранее, а не выводится моделью из строк
+    tag_facts = describe_insights(load_insights(conn, int(user_id)))
+    conn.commit()
+    conn.close()
+    
     entries_text = "\n".join([
         f"Дата: {entry['entry_date']}, Оценка дня: {entry['score']}/5, Теги: {entry['tags'] or 'нет'}, Мысли: {entry['thoughts'] or 'нет'}"
         for entry in entries
     ])
     
+    facts_text = "\n".join(f"- {fact}" for fact in tag_facts) or "- недостаточно данных"
+    
     prompt = f"""Ты — персональный аналитик энергии и эмоционального состояния.  
 Проанализируй последние 7 дней записей пользователя.
 
 ДАННЫЕ (последние 7 дней):
 {entries_text}
 
+ПОСЧИТАННЫЕ ФАКТЫ ПО ТЕГАМ (вся история, разница средней оценки с тегом и без него):
+{facts_text}
+Опирайся на эти цифры, когда говоришь о влиянии тегов, а не угадывай его по записям.
+
 Каждая запись содержит:
 - оценку дня (1–5)
 - мысли
@@ -266,6 +294,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'https': proxy_url
             }
         
+        import requests
         response = requests.post(
             'https://api.openai.com/v1/chat/completions',
             headers=request_headers,
@@ -281,7 +310,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({
+                'body': dumps({
                     'error': f'OpenAI API error: {response.status_code}', 
                     'details': response.text[:200]
                 })
@@ -303,7 +332,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 recommendations.append(line.lstrip('•-0123456789. '))
         
         # Save or update analysis in database
-        conn = psycopg2.connect(database_url)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute(f'''
@@ -326,7 +355,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
+            'body': dumps({
                 'analysis': analysis,
                 'recommendations': recommendations if recommendations else ['Продолжай отслеживать свою энергию'],
                 'total_entries': len(entries)
@@ -340,5 +369,5 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': f'Analysis failed: {str(e)}'})
+            'body': dumps({'error': f'Analysis failed: {str(e)}'})
         }
\ No newline at end of file
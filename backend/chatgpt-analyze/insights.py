@@ -0,0 +1,192 @@
+'''
+Business: Влияние тегов на энергию: средняя с тегом и без, lift, доверительный интервал, эффект на следующий день, совместные теги
+Args: conn - соединение с БД, user_id - пользователь; история записей (дата, оценка, теги)
+Returns: dict с фактами по тегам, закэшированный до следующей записи пользователя
+'''
+import json
+from datetime import timedelta
+from itertools import combinations
+from math import sqrt
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Тег (и пара тегов) попадает в выводы, если встречается хотя бы в стольких записях
+MIN_TAG_OCCURRENCES = 3
+# z-квантиль для 95% доверительного интервала разницы средних
+Z_95 = 1.96
+MAX_PAIRS = 20
+
+
+class _Acc:
+    """Сумма, сумма квадратов и число наблюдений"""
+    __slots__ = ('n', 'total', 'squares')
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0
+        self.squares = 0
+
+    def add(self, value: int) -> None:
+        self.n += 1
+        self.total += value
+        self.squares += value * value
+
+    def minus(self, other: '_Acc') -> '_Acc':
+        rest = _Acc()
+        rest.n = self.n - other.n
+        rest.total = self.total - other.total
+        rest.squares = self.squares - other.squares
+        return rest
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.n if self.n else None
+
+    def variance(self) -> Optional[float]:
+        if self.n < 2:
+            return None
+        mean = self.total / self.n
+        return max((self.squares - self.n * mean * mean) / (self.n - 1), 0.0)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def _difference(with_tag: _Acc, without_tag: _Acc) -> Tuple[Optional[float], Optional[List[float]]]:
+    """Разница средних и её 95% интервал (приближение Уэлча)"""
+    if not with_tag.n or not without_tag.n:
+        return None, None
+    diff = with_tag.mean() - without_tag.mean()
+    var_with, var_without = with_tag.variance(), without_tag.variance()
+    if var_with is None or var_without is None:
+        return diff, None
+    margin = Z_95 * sqrt(var_with / with_tag.n + var_without / without_tag.n)
+    return diff, [round(diff - margin, 2), round(diff + margin, 2)]
+
+
+def compute_insights(entries: Iterable[Tuple[Any, int, Iterable[str]]]) -> Dict[str, Any]:
+    """Все теги за один проход по истории: «без тега» выводится вычитанием из общих сумм"""
+    entries = [(d, s, set(tags or [])) for d, s, tags in entries]
+    score_by_date = {d: s for d, s, _ in entries}
+
+    overall, overall_next = _Acc(), _Acc()
+    per_tag: Dict[str, _Acc] = {}
+    per_tag_next: Dict[str, _Acc] = {}
+    pairs: Dict[Tuple[str, str], _Acc] = {}
+
+    for entry_date, score, tags in entries:
+        next_score = score_by_date.get(entry_date + timedelta(days=1))
+        overall.add(score)
+        if next_score is not None:
+            overall_next.add(next_score)
+        for tag in tags:
+            per_tag.setdefault(tag, _Acc()).add(score)
+            if next_score is not None:
+                per_tag_next.setdefault(tag, _Acc()).add(next_score)
+        for pair in combinations(sorted(tags), 2):
+            pairs.setdefault(pair, _Acc()).add(score)
+
+    overall_mean = overall.mean()
+    tag_stats = []
+    for tag, with_tag in per_tag.items():
+        if with_tag.n < MIN_TAG_OCCURRENCES:
+            continue
+        without_tag = overall.minus(with_tag)
+        difference, interval = _difference(with_tag, without_tag)
+
+        next_with = per_tag_next.get(tag, _Acc())
+        next_difference, next_interval = _difference(next_with, overall_next.minus(next_with))
+
+        tag_stats.append({
+            'tag': tag,
+            'count': with_tag.n,
+            'averageWith': _round(with_tag.mean()),
+            'averageWithout': _round(without_tag.mean()),
+            'difference': _round(difference),
+            'ci95': interval,
+            'lift': _round(with_tag.mean() / overall_mean) if overall_mean else None,
+            'nextDay': {
+                'count': next_with.n,
+                'average': _round(next_with.mean()),
+                'difference': _round(next_difference),
+                'ci95': next_interval
+            }
+        })
+    tag_stats.sort(key=lambda t: (-abs(t['difference'] or 0), -t['count'], t['tag']))
+
+    co_occurrence = []
+    for (first, second), both in pairs.items():
+        if both.n < MIN_TAG_OCCURRENCES:
+            continue
+        union = per_tag[first].n + per_tag[second].n - both.n
+        co_occurrence.append({
+            'tags': [first, second],
+            'count': both.n,
+            'jaccard': round(both.n / union, 2),
+            'average': _round(both.mean())
+        })
+    co_occurrence.sort(key=lambda p: (-p['count'], -p['jaccard'], p['tags']))
+
+    return {
+        'entries': overall.n,
+        'average': _round(overall_mean),
+        'tags': tag_stats,
+        'pairs': co_occurrence[:MAX_PAIRS]
+    }
+
+
+def load_insights(conn, user_id: int) -> Dict[str, Any]:
+    """Выводы из кэша user_insights или пересчёт, если с тех пор были записи.
+    Новый кэш пишется в текущей транзакции, коммит остаётся за вызывающим"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COALESCE(v.version, 0), i.version, i.payload
+        FROM (SELECT %s::int as user_id) u
+        LEFT JOIN t_p45717398_energy_dashboard_pro.data_versions v
+            ON v.user_id = u.user_id AND v.resource = 'entries'
+        LEFT JOIN t_p45717398_energy_dashboard_pro.user_insights i
+            ON i.user_id = u.user_id
+    """, (user_id,))
+    version, cached_version, payload = cur.fetchone()
+    if cached_version == version and payload is not None:
+        cur.close()
+        return payload
+
+    cur.execute("""
+        SELECT entry_date, score, tags
+        FROM t_p45717398_energy_dashboard_pro.energy_entries
+        WHERE user_id = %s
+    """, (user_id,))
+    payload = compute_insights(cur.fetchall())
+
+    cur.execute("""
+        INSERT INTO t_p45717398_energy_dashboard_pro.user_insights (user_id, version, payload)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE
+        SET version = EXCLUDED.version, payload = EXCLUDED.payload, computed_at = CURRENT_TIMESTAMP
+        WHERE user_insights.version <= EXCLUDED.version
+    """, (user_id, version, json.dumps(payload, ensure_ascii=False)))
+    cur.close()
+    return payload
+
+
+def describe_insights(insights: Dict[str, Any], limit: int = 5) -> List[str]:
+    """Короткие формулировки фактов для промпта ИИ и еженедельного отчёта"""
+    lines = []
+    for tag in insights['tags'][:limit]:
+        if tag['difference'] is None:
+            continue
+        line = (
+            f"«{tag['tag']}» ({tag['count']} дн.): средняя {tag['averageWith']} "
+            f"против {tag['averageWithout']} без тега ({tag['difference']:+.2f}"
+        )
+        if tag['ci95']:
+            line += f", 95% ДИ {tag['ci95'][0]:+.2f}…{tag['ci95'][1]:+.2f}"
+        line += ')'
+        if tag['nextDay']['difference'] is not None:
+            line += f", на следующий день {tag['nextDay']['difference']:+.2f}"
+        lines.append(line)
+    for pair in insights['pairs'][:limit]:
+        lines.append(
+            f"«{pair['tags'][0]}» и «{pair['tags'][1]}» вместе {pair['count']} раз, средняя {pair['average']}"
+        )
+    return lines
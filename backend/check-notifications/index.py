@@ -1,11 +1,46 @@
-import json
 import os
-import psycopg2
-import requests
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
-from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING, Dict, Any, List
 
+from analytics import rolling_windows
+from insights import load_insights
+from risk import describe_risk
+from db import get_connection, get_read_connection, prepared
+from responses import compressible, dumps
+
+if TYPE_CHECKING:
+    from zoneinfo import ZoneInfo
+
+# Флаг риска учитывается, только если последняя запись не старше стольких дней
+RISK_MAX_AGE_DAYS = 7
+# Час (UTC), в который вызов крона выполняет ежедневное обслуживание базы
+MAINTENANCE_HOUR_UTC = 3
+
+# Получатели рассылки; частичный индекс idx_users_telegram_recipients отсекает пользователей без Telegram
+RECIPIENTS = prepared('notifications_recipients', """
+    SELECT id, telegram_chat_id, notification_settings, full_name,
+           last_notification_sent, last_weekly_report_sent, last_burnout_warning_sent
+    FROM t_p45717398_energy_dashboard_pro.users 
+    WHERE telegram_chat_id IS NOT NULL 
+    AND email != 'test@test'
+    AND (
+        notification_settings->>'dailyReminder' = 'true'
+        OR notification_settings->>'weeklyReport' = 'true'
+        OR notification_settings->>'burnoutWarnings' = 'true'
+    )
+""", ())
+WEEK_SERIES = prepared('notifications_week_series', """
+    SELECT entry_date, score
+    FROM t_p45717398_energy_dashboard_pro.energy_entries
+    WHERE user_id = $1 AND entry_date > $2 AND entry_date <= $3
+""", ('int', 'date', 'date'))
+FLAGGED_RISKS = prepared('notifications_flagged_risks', """
+    SELECT user_id, reason, low_streak, low_sum, ewma
+    FROM t_p45717398_energy_dashboard_pro.energy_risk
+    WHERE at_risk AND last_date >= CURRENT_DATE - $1
+""", ('int',))
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Check notification settings and send daily reminders, weekly reports, and burnout warnings via Telegram
@@ -26,44 +61,38 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
     bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
     
     if not bot_token:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'TELEGRAM_BOT_TOKEN not configured'})
+            'body': dumps({'error': 'TELEGRAM_BOT_TOKEN not configured'})
         }
     
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
+    from zoneinfo import ZoneInfo
+    from datetime import timezone
     
-    cur.execute("""
-        SELECT id, telegram_chat_id, notification_settings, full_name,
-               last_notification_sent, last_weekly_report_sent, last_burnout_warning_sent
-        FROM t_p45717398_energy_dashboard_pro.users 
-        WHERE telegram_chat_id IS NOT NULL 
-        AND email != 'test@test'
-        AND (
-            notification_settings->>'dailyReminder' = 'true'
-            OR notification_settings->>'weeklyReport' = 'true'
-            OR notification_settings->>'burnoutWarnings' = 'true'
-        )
-    """)
+    current_time_utc = datetime.now(timezone.utc)
     
-    users = cur.fetchall()
-    cur.close()
+    conn = get_connection()
+    if current_time_utc.hour == MAINTENANCE_HOUR_UTC:
+        run_daily_maintenance(conn)
+    # Выборки для рассылки читаются с реплики, отметки об отправке пишутся в основную базу
+    replica = get_read_connection()
+    cur = replica.cursor()
     
-    from datetime import timezone
+    RECIPIENTS.execute(cur)
     
-    current_time_utc = datetime.now(timezone.utc)
+    users = cur.fetchall()
+    cur.close()
     
     print(f"Checking notifications. Current UTC time: {current_time_utc.strftime('%H:%M')}, Users found: {len(users)}")
     
     daily_sent = 0
     weekly_sent = 0
     burnout_sent = 0
+    flagged_risks = get_flagged_risks(replica)
     cur = conn.cursor()
     
     for user_id, chat_id, settings, full_name, last_daily, last_weekly, last_burnout in users:
@@ -104,7 +133,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if settings.get('weeklyReport') and current_weekday == 0 and current_hour == 9:
             if not last_weekly or last_weekly.astimezone(tz).date() < today_date:
-                weekly_stats = get_weekly_stats(conn, user_id, tz)
+                weekly_stats = get_weekly_stats(replica, user_id, tz)
                 
                 if weekly_stats:
                     message = f"📊 Еженедельный отчёт для {full_name or 'тебя'}!\n\n"
@@ -118,6 +147,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     else:
                         message += "➡️ Стабильная неделя. Так держать!"
                     
+                    message += get_tag_highlight(conn, user_id)
+                    
                     if send_telegram_message(bot_token, chat_id, message):
                         weekly_sent += 1
                         cur.execute("""
@@ -130,12 +161,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if settings.get('burnoutWarnings') and current_hour == 20:
             if not last_burnout or (current_time_utc - last_burnout).days >= 1:
-                burnout_risk = check_burnout_risk(conn, user_id)
+                burnout_risk = flagged_risks.get(user_id)
                 
                 if burnout_risk:
                     message = f"⚠️ {full_name or 'Друг'}, важное предупреждение!\n\n"
-                    message += f"Я заметил, что последние {burnout_risk['days']} дня твоя оценка энергии низкая "
-                    message += f"(в среднем {burnout_risk['avg_score']:.1f}/5).\n\n"
+                    message += f"Я заметил, что {burnout_risk}.\n\n"
                     message += "Это может быть признаком выгорания. 🔥\n\n"
                     message += "Рекомендации:\n"
                     message += "• Возьми выходной или отпуск\n"
@@ -154,6 +184,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         print(f"✅ Burnout warning sent to user {user_id} ({full_name})")
     
     cur.close()
+    replica.close()
     conn.close()
     
     total_sent = daily_sent + weekly_sent + burnout_sent
@@ -163,7 +194,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'isBase64Encoded': False,
-        'body': json.dumps({
+        'body': dumps({
             'checked': len(users),
             'daily_sent': daily_sent,
             'weekly_sent': weekly_sent,
@@ -174,6 +205,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
 
 def send_telegram_message(bot_token: str, chat_id: int, message: str) -> bool:
+    import requests
     try:
         response = requests.post(
             f'https://api.telegram.org/bot{bot_token}/sendMessage',
@@ -190,78 +222,64 @@ def send_telegram_message(bot_token: str, chat_id: int, message: str) -> bool:
         return False
 
 
-def get_weekly_stats(conn, user_id: int, tz: ZoneInfo) -> Dict[str, Any]:
+def get_weekly_stats(conn, user_id: int, tz: 'ZoneInfo') -> Dict[str, Any]:
     cur = conn.cursor()
     
     from datetime import timezone
     now_utc = datetime.now(timezone.utc)
-    now_user = now_utc.astimezone(tz)
-    week_ago = now_user - timedelta(days=7)
-    two_weeks_ago = now_user - timedelta(days=14)
+    yesterday = now_utc.astimezone(tz).date() - timedelta(days=1)
     
-    cur.execute("""
-        SELECT 
-            COUNT(*) as count,
-            AVG(score) as avg_score
-        FROM t_p45717398_energy_dashboard_pro.energy_entries
-        WHERE user_id = %s AND entry_date >= %s AND entry_date < %s
-    """, (user_id, week_ago.date(), now_user.date()))
+    WEEK_SERIES.execute(cur, user_id, yesterday - timedelta(days=14), yesterday)
     
-    result = cur.fetchone()
-    
-    if not result or result[0] == 0:
-        cur.close()
-        return None
+    series = cur.fetchall()
+    cur.close()
     
-    count, avg_score = result
+    week = rolling_windows(series, yesterday, (7,))[7]
     
-    cur.execute("""
-        SELECT AVG(score) as prev_avg_score
-        FROM t_p45717398_energy_dashboard_pro.energy_entries
-        WHERE user_id = %s AND entry_date >= %s AND entry_date < %s
-    """, (user_id, two_weeks_ago.date(), week_ago.date()))
+    if week['count'] == 0:
+        return None
     
-    prev_result = cur.fetchone()
-    prev_avg = prev_result[0] if prev_result and prev_result[0] else avg_score
-    
-    cur.close()
+    prev_avg = week['previousAverage'] if week['previousAverage'] is not None else week['average']
     
     return {
-        'count': count,
-        'avg_score': float(avg_score),
-        'trend': float(avg_score - prev_avg)
+        'count': week['count'],
+        'avg_score': week['average'],
+        'trend': week['average'] - prev_avg
     }
 
 
-def check_burnout_risk(conn, user_id: int) -> Dict[str, Any]:
+def get_tag_highlight(conn, user_id: int) -> str:
+    """Строка отчёта о теге, который заметнее всего поднимает энергию (по кэшу выводов)"""
+    insights = load_insights(conn, user_id)
+    conn.commit()
+    for tag in insights['tags']:
+        # Только теги, у которых весь 95% интервал разницы выше нуля
+        if tag['ci95'] and tag['ci95'][0] > 0:
+            return f"\n\n🏷 Больше всего энергии даёт «{tag['tag']}»: {tag['averageWith']:.1f} против {tag['averageWithout']:.1f} без него"
+    return ''
+
+
+def run_daily_maintenance(conn) -> None:
+    """Обслуживание раз в сутки: годовые секции energy_entries на текущий и следующий год
+    (с переносом строк из секции по умолчанию) и пересчёт популярных тегов для автодополнения"""
     cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT score, entry_date
-        FROM t_p45717398_energy_dashboard_pro.energy_entries
-        WHERE user_id = %s
-        ORDER BY entry_date DESC
-        LIMIT 5
-    """, (user_id,))
-    
-    entries = cur.fetchall()
+    cur.execute("SELECT t_p45717398_energy_dashboard_pro.ensure_energy_entries_partitions()")
+    created = cur.fetchone()[0]
+    conn.commit()
+    cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY t_p45717398_energy_dashboard_pro.popular_tags")
+    conn.commit()
     cur.close()
-    
-    if len(entries) < 3:
-        return None
-    
-    low_energy_days = 0
-    total_score = 0
-    
-    for score, entry_date in entries:
-        if score <= 2:
-            low_energy_days += 1
-            total_score += score
-    
-    if low_energy_days >= 3:
-        return {
-            'days': low_energy_days,
-            'avg_score': total_score / low_energy_days
-        }
-    
-    return None
\ No newline at end of file
+    if created:
+        print(f"Created {created} energy_entries partition(s)")
+
+
+def get_flagged_risks(conn) -> Dict[int, str]:
+    """Пользователи с флагом риска от детектора в entries/energy, одним запросом"""
+    cur = conn.cursor()
+    FLAGGED_RISKS.execute(cur, RISK_MAX_AGE_DAYS)
+    rows = cur.fetchall()
+    cur.close()
+    return {
+        user_id: describe_risk(reason, low_streak, low_sum, ewma)
+        for user_id, reason, low_streak, low_sum, ewma in rows
+    }
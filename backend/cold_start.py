@@ -0,0 +1,121 @@
+'''
+Business: Замер холодного старта функций: время импорта index и первого ответа на OPTIONS и на запрос без авторизации
+Args: имена каталогов функций (по умолчанию все каталоги с index.py)
+Returns: таблица замеров; код 1, если функция вышла за бюджет или загрузила тяжёлый модуль на этих запросах
+'''
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Бюджет в миллисекундах на импорт index и на первый ответ
+IMPORT_BUDGET_MS = 150
+RESPONSE_BUDGET_MS = 50
+# Функции с собственным бюджетом импорта
+IMPORT_BUDGETS_MS: Dict[str, int] = {}
+# Эти модули не должны загружаться, пока запрос не дошёл до БД или внешнего API
+HEAVY_MODULES = ('psycopg2', 'requests', 'zoneinfo', 'numpy')
+# Заглушки секретов, чтобы проверки конфигурации не отвечали 500 раньше проверки авторизации;
+# соединение с БД на замеряемых запросах не открывается
+PROBE_ENV = {'DATABASE_URL': 'postgresql://cold-start', 'JWT_SECRET': 'cold-start'}
+
+# Выполняется в свежем интерпретаторе из каталога функции
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+results = []
+for request in json.loads(sys.argv[1]):
+    before = time.perf_counter()
+    response = index.handler(request['event'], None)
+    results.append({
+        'name': request['name'],
+        'status': response.get('statusCode'),
+        'expected': request['expected'],
+        'ms': (time.perf_counter() - before) * 1000
+    })
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'requests': results,
+    'heavy': [m for m in json.loads(sys.argv[2]) if m in sys.modules]
+}))
+'''
+
+
+def probe_requests(function_dir: str) -> List[Dict[str, Any]]:
+    """OPTIONS и запросы из tests.json, которые должны закончиться отказом в авторизации"""
+    requests = [{
+        'name': 'OPTIONS',
+        'event': {'httpMethod': 'OPTIONS', 'headers': {}},
+        'expected': 200
+    }]
+    tests_path = os.path.join(function_dir, 'tests.json')
+    if os.path.exists(tests_path):
+        with open(tests_path) as f:
+            tests = json.load(f).get('tests', [])
+        for test in tests:
+            if test.get('expectedStatus') != 401:
+                continue
+            requests.append({
+                'name': test['name'],
+                'event': {
+                    'httpMethod': test['method'],
+                    'headers': test.get('headers', {}),
+                    'queryStringParameters': test.get('query'),
+                    'body': json.dumps(test['body']) if 'body' in test else None
+                },
+                'expected': 401
+            })
+    return requests
+
+
+def measure(name: str) -> Dict[str, Any]:
+    function_dir = os.path.join(BACKEND_DIR, name)
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(probe_requests(function_dir)), json.dumps(HEAVY_MODULES)],
+        cwd=function_dir, capture_output=True, text=True,
+        env={**PROBE_ENV, **os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    )
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(names: List[str]) -> int:
+    failed = False
+    for name in names:
+        result = measure(name)
+        problems = []
+        if 'error' in result:
+            problems.append(result['error'])
+        else:
+            budget = IMPORT_BUDGETS_MS.get(name, IMPORT_BUDGET_MS)
+            if result['import_ms'] > budget:
+                problems.append(f"import {result['import_ms']:.1f} ms > {budget} ms")
+            for request in result['requests']:
+                if request['status'] != request['expected']:
+                    problems.append(f"{request['name']}: status {request['status']}, expected {request['expected']}")
+                if request['ms'] > RESPONSE_BUDGET_MS:
+                    problems.append(f"{request['name']}: {request['ms']:.1f} ms > {RESPONSE_BUDGET_MS} ms")
+            if result['heavy']:
+                problems.append(f"loaded {', '.join(result['heavy'])}")
+        failed = failed or bool(problems)
+
+        timings = ''
+        if 'error' not in result:
+            timings = f"import {result['import_ms']:.1f} ms, " + ', '.join(
+                f"{r['name']} {r['ms']:.1f} ms" for r in result['requests']
+            )
+        print(f"{name}: {timings}{' — ' if timings and problems else ''}{'; '.join(problems) or ''}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    # python cold_start.py [функция ...]
+    functions = sys.argv[1:] or sorted(
+        d for d in os.listdir(BACKEND_DIR) if os.path.exists(os.path.join(BACKEND_DIR, d, 'index.py'))
+    )
+    sys.exit(main(functions))
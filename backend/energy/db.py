@@ -0,0 +1,348 @@
+'''
+Business: Соединение с БД, переживающее вызовы в тёплом контейнере: проверка, переподключение, сброс транзакции
+Args: dsn - строка подключения (по умолчанию DATABASE_POOLER_URL или DATABASE_URL);
+      user_id - для чтения с реплики с учётом недавних записей пользователя
+Returns: соединение psycopg2, у которого close() возвращает его для следующего вызова вместо закрытия;
+         соединение для чтения (реплика DATABASE_URL_REPLICA, если она не отстаёт);
+         реестр подготовленных запросов (PREPARE один раз на соединение) и проверка их планов,
+         а также планов динамических запросов с конкретными параметрами
+'''
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+# psycopg2 импортируется при первом соединении: OPTIONS и отказ в авторизации обходятся без него
+if TYPE_CHECKING:
+    import psycopg2.extensions
+
+# DSN пулера в режиме транзакций (PgBouncer): если задан, handlers ходят через него
+POOLER_URL = os.environ.get('DATABASE_POOLER_URL')
+DATABASE_URL = POOLER_URL or os.environ.get('DATABASE_URL')
+# За пулером в режиме транзакций нельзя полагаться на состояние сессии (PREPARE, SET)
+USING_POOLER = bool(POOLER_URL)
+# Простаивавшее дольше соединение перед выдачей проверяется запросом SELECT 1
+VALIDATE_AFTER_SECONDS = 30
+CONNECT_TIMEOUT_SECONDS = 5
+
+# Реплика для чтения: без неё всё читается с основной базы
+REPLICA_URL = os.environ.get('DATABASE_URL_REPLICA')
+# При отставании реплики больше порога чтение уходит на основную базу
+MAX_REPLICA_LAG_SECONDS = float(os.environ.get('MAX_REPLICA_LAG_SECONDS', '2'))
+# Сколько последний замер отставания считается актуальным
+LAG_CHECK_SECONDS = 5
+# После своей записи пользователь столько читает с основной базы (read-your-writes)
+RECENT_WRITE_SECONDS = 30
+
+# Проверка планов: таблица считается большой, если в ней по статистике не меньше строк
+LARGE_TABLE_ROWS = 10000
+# Оценка числа строк узла плана выше порога — признак развалившейся оценки
+MAX_PLAN_ROWS = 100000
+
+# psycopg2.extensions.TRANSACTION_STATUS_IDLE и TRANSACTION_STATUS_UNKNOWN
+_IDLE = 0
+_UNKNOWN = 4
+
+_connection_class = None
+
+
+def _reusable_connection_class():
+    """Класс соединения строится при первом подключении вместе с импортом psycopg2"""
+    global _connection_class
+    if _connection_class is None:
+        import psycopg2.extensions
+
+        class ReusableConnection(psycopg2.extensions.connection):
+            """close() откатывает незавершённую транзакцию и оставляет соединение открытым"""
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.released_at = 0.0
+                # Имя запроса -> удался ли PREPARE на этом соединении
+                self.prepared: Dict[str, bool] = {}
+
+            def close(self) -> None:
+                if not self.closed:
+                    _reset(self)
+                self.released_at = time.monotonic()
+
+            def terminate(self) -> None:
+                super().close()
+
+        _connection_class = ReusableConnection
+    return _connection_class
+
+
+_connections: Dict[str, 'psycopg2.extensions.connection'] = {}
+# user_id -> время последней записи в этом контейнере
+_recent_writes: Dict[int, float] = {}
+# (время замера, отставание реплики в секундах или None, если реплика недоступна)
+_replica_lag: Tuple[float, Optional[float]] = (0.0, None)
+STATEMENTS: Dict[str, 'Statement'] = {}
+
+
+def _reset(conn: 'psycopg2.extensions.connection') -> bool:
+    """Откат транзакции, оставленной предыдущим вызовом (в том числе после исключения)"""
+    import psycopg2
+    try:
+        if conn.info.transaction_status != _IDLE:
+            conn.rollback()
+        return conn.info.transaction_status == _IDLE
+    except psycopg2.Error:
+        return False
+
+
+def _usable(conn: 'psycopg2.extensions.connection') -> bool:
+    import psycopg2
+    if conn.closed or conn.info.transaction_status == _UNKNOWN or not _reset(conn):
+        return False
+    if time.monotonic() - conn.released_at < VALIDATE_AFTER_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection(dsn: Optional[str] = None) -> 'psycopg2.extensions.connection':
+    """Соединение для текущего вызова: закэшированное, если оно живо, иначе новое"""
+    import psycopg2
+    dsn = dsn or DATABASE_URL
+    conn = _connections.get(dsn)
+    if conn is not None and _usable(conn):
+        return conn
+    if conn is not None:
+        try:
+            conn.terminate()
+        except psycopg2.Error:
+            pass
+    conn = psycopg2.connect(
+        dsn,
+        connection_factory=_reusable_connection_class(),
+        connect_timeout=CONNECT_TIMEOUT_SECONDS,
+    )
+    _connections[dsn] = conn
+    return conn
+
+
+def mark_written(user_id: int) -> None:
+    """Отметка о записи: ближайшие чтения этого пользователя пойдут на основную базу"""
+    now = time.monotonic()
+    _recent_writes[user_id] = now
+    for key, written_at in list(_recent_writes.items()):
+        if now - written_at > RECENT_WRITE_SECONDS:
+            del _recent_writes[key]
+
+
+def _measure_lag(conn: 'psycopg2.extensions.connection') -> Optional[float]:
+    """Отставание реплики: 0, если всё полученное WAL уже применено"""
+    import psycopg2
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END
+            """)
+            lag = float(cur.fetchone()[0])
+        conn.rollback()
+        return lag
+    except psycopg2.Error:
+        return None
+
+
+def get_read_connection(user_id: Optional[int] = None) -> 'psycopg2.extensions.connection':
+    """Соединение для запросов без записи: реплика, если она задана и не отстаёт,
+    а пользователь недавно ничего не записывал; иначе основная база"""
+    global _replica_lag
+    import psycopg2
+    if not REPLICA_URL:
+        return get_connection()
+    now = time.monotonic()
+    if user_id is not None and now - _recent_writes.get(user_id, float('-inf')) < RECENT_WRITE_SECONDS:
+        return get_connection()
+
+    checked_at, lag = _replica_lag
+    fresh = now - checked_at < LAG_CHECK_SECONDS
+    # Недоступная или отстающая реплика не проверяется повторно до следующего замера
+    if fresh and (lag is None or lag > MAX_REPLICA_LAG_SECONDS):
+        return get_connection()
+    try:
+        conn = get_connection(REPLICA_URL)
+        if not conn.readonly:
+            conn.readonly = True
+        if not fresh:
+            lag = _measure_lag(conn)
+            _replica_lag = (now, lag)
+    except psycopg2.Error:
+        _replica_lag = (now, None)
+        return get_connection()
+    if lag is None or lag > MAX_REPLICA_LAG_SECONDS:
+        return get_connection()
+    return conn
+
+
+class Statement:
+    """Запрос из горячего набора: PREPARE один раз на соединение, дальше EXECUTE по имени.
+    Параметры в sql — $1..$n, их типы в types"""
+
+    def __init__(self, name: str, sql: str, types: Tuple[str, ...]):
+        self.name = name
+        self.sql = sql
+        self.types = types
+        self._type_list = f" ({', '.join(types)})" if types else ''
+        self._execute_sql = f"EXECUTE {name}" + (f" ({', '.join(f'%s::{t}' for t in types)})" if types else '')
+        # Без PREPARE типы параметров задаются приведением, как в EXECUTE
+        self._plain_sql = re.sub(
+            r'\$(\d+)', lambda m: f'%(p{m.group(1)})s::{types[int(m.group(1)) - 1]}', sql.replace('%', '%%')
+        )
+
+    def _prepare(self, cur) -> bool:
+        import psycopg2
+        prepared = cur.connection.prepared
+        if self.name not in prepared:
+            # Ошибка PREPARE не должна ломать транзакцию вызова, поэтому он идёт под точкой сохранения
+            cur.execute('SAVEPOINT prepare_statement')
+            try:
+                cur.execute(f"PREPARE {self.name}{self._type_list} AS {self.sql}")
+                prepared[self.name] = True
+            except psycopg2.Error:
+                cur.execute('ROLLBACK TO SAVEPOINT prepare_statement')
+                prepared[self.name] = False
+            cur.execute('RELEASE SAVEPOINT prepare_statement')
+        return prepared[self.name]
+
+    def execute(self, cur, *params) -> None:
+        """EXECUTE подготовленного запроса; за пулером или если PREPARE не удался — обычный запрос"""
+        if len(params) != len(self.types):
+            raise TypeError(f'{self.name} expects {len(self.types)} parameters')
+        if not USING_POOLER and isinstance(cur.connection, _reusable_connection_class()) and self._prepare(cur):
+            cur.execute(self._execute_sql, params)
+        else:
+            cur.execute(self._plain_sql, {f'p{i}': value for i, value in enumerate(params, 1)})
+
+
+def prepared(name: str, sql: str, types: Tuple[str, ...]) -> Statement:
+    """Регистрация запроса в реестре подготовленных"""
+    if name in STATEMENTS:
+        raise ValueError(f'Statement {name} is already registered')
+    STATEMENTS[name] = Statement(name, sql, types)
+    return STATEMENTS[name]
+
+
+def benchmark(conn, statement: Statement, params: tuple, runs: int = 200) -> Dict[str, float]:
+    """Среднее время обычного и подготовленного выполнения и время планирования из EXPLAIN"""
+    cur = conn.cursor()
+    plain = {f'p{i}': value for i, value in enumerate(params, 1)}
+    cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + statement._plain_sql, plain)
+    planning_ms = cur.fetchone()[0][0]['Planning Time']
+
+    started = time.perf_counter()
+    for _ in range(runs):
+        cur.execute(statement._plain_sql, plain)
+        cur.fetchall()
+    plain_ms = (time.perf_counter() - started) * 1000 / runs
+
+    statement._prepare(cur)
+    started = time.perf_counter()
+    for _ in range(runs):
+        cur.execute(statement._execute_sql, params)
+        cur.fetchall()
+    prepared_ms = (time.perf_counter() - started) * 1000 / runs
+    conn.rollback()
+    cur.close()
+    return {'planning_ms': planning_ms, 'plain_ms': plain_ms, 'prepared_ms': prepared_ms}
+
+
+def _plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def _plan_problems(cur, plan: Dict[str, Any]) -> List[str]:
+    """Последовательное чтение большой таблицы и раздутая оценка числа строк в плане"""
+    problems = []
+    for node in _plan_nodes(plan):
+        if node['Node Type'] == 'Seq Scan':
+            relation = f"{node.get('Schema', 'public')}.{node['Relation Name']}"
+            cur.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)', (relation,))
+            row = cur.fetchone()
+            if row and row[0] >= LARGE_TABLE_ROWS:
+                problems.append(f'seq scan on {relation} (~{int(row[0])} rows)')
+        if node['Plan Rows'] > MAX_PLAN_ROWS:
+            problems.append(f"{node['Node Type']} estimates {int(node['Plan Rows'])} rows")
+    return problems
+
+
+def check_plan(conn, statement: Statement) -> List[str]:
+    """Проблемы общего плана зарегистрированного запроса (EXPLAIN GENERIC_PLAN, PostgreSQL 16+)"""
+    cur = conn.cursor()
+    cur.execute('EXPLAIN (GENERIC_PLAN, VERBOSE, FORMAT JSON) ' + statement.sql)
+    problems = _plan_problems(cur, cur.fetchone()[0][0]['Plan'])
+    conn.rollback()
+    cur.close()
+    return problems
+
+
+def query_plan(conn, sql: str, params: Any) -> Dict[str, Any]:
+    """План запроса, собранного в коде, с конкретными параметрами (EXPLAIN VERBOSE, без выполнения)"""
+    cur = conn.cursor()
+    cur.execute('EXPLAIN (VERBOSE, FORMAT JSON) ' + sql, params)
+    plan = cur.fetchone()[0][0]['Plan']
+    conn.rollback()
+    cur.close()
+    return plan
+
+
+def check_query_plan(conn, sql: str, params: Any) -> List[str]:
+    """Проблемы плана динамического запроса с конкретными параметрами"""
+    plan = query_plan(conn, sql, params)
+    cur = conn.cursor()
+    problems = _plan_problems(cur, plan)
+    conn.rollback()
+    cur.close()
+    return problems
+
+
+if __name__ == '__main__':
+    # Из каталога функции, против копии базы с боевым объёмом данных:
+    #   python db.py --check-plans [USER_ID] — планы всех запросов функции, код 1 при регрессии;
+    #       с USER_ID ещё и динамические запросы из index.plan_samples(user_id), если функция их задаёт
+    #   python db.py USER_ID — сравнение для её запросов с единственным параметром user_id
+    import sys
+    import index  # регистрирует запросы функции
+    # Файл запущен как __main__, а index регистрирует запросы в импортированном модуле db
+    from db import STATEMENTS
+
+    connection = get_connection()
+    if sys.argv[1] == '--check-plans':
+        failed = False
+        for statement in STATEMENTS.values():
+            problems = check_plan(connection, statement)
+            failed = failed or bool(problems)
+            print(f"{statement.name}: {'; '.join(problems) or 'ok'}")
+        if len(sys.argv) > 2 and hasattr(index, 'plan_samples'):
+            for name, (sql, params) in index.plan_samples(int(sys.argv[2])).items():
+                problems = check_query_plan(connection, sql, params)
+                failed = failed or bool(problems)
+                print(f"{name}: {'; '.join(problems) or 'ok'}")
+        connection.terminate()
+        sys.exit(1 if failed else 0)
+
+    user_id = int(sys.argv[1])
+    for statement in STATEMENTS.values():
+        if statement.types != ('int',):
+            continue
+        result = benchmark(connection, statement, (user_id,))
+        print(
+            f"{statement.name}: planning {result['planning_ms']:.3f} ms, "
+            f"plain {result['plain_ms']:.3f} ms, prepared {result['prepared_ms']:.3f} ms, "
+            f"saved {result['plain_ms'] - result['prepared_ms']:.3f} ms/request"
+        )
+    connection.terminate()
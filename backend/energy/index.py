@@ -6,37 +6,44 @@ Backend функция для работы с записями энергии п
 
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2 import errors
-from datetime import datetime
-from typing import Dict, Any, Optional
-import hashlib
-import base64
+from typing import Dict, Any
+
+from rollups import apply_rollup_changes
+from deletions import record_deletion
+from streaks import apply_streak_changes
+from tag_dictionary import apply_tag_changes, entry_tag_changes
+from risk import apply_risk_changes
+from db import DATABASE_URL, get_connection, get_read_connection, mark_written, prepared
+from responses import compressible, dumps
+from tokens import verify_token
 
 JWT_SECRET = os.environ.get('JWT_SECRET', '')
-DATABASE_URL = os.environ.get('DATABASE_URL', '')
 
-def verify_jwt(token: str) -> Optional[Dict[str, Any]]:
-    try:
-        decoded = base64.b64decode(token.encode()).decode()
-        payload_str, signature = decoded.split('::')
-        
-        expected_signature = hashlib.sha256(f"{payload_str}{JWT_SECRET}".encode()).hexdigest()
-        
-        if signature != expected_signature:
-            return None
-        
-        payload = json.loads(payload_str)
-        
-        exp_time = datetime.fromisoformat(payload['exp'])
-        if datetime.utcnow() > exp_time:
-            return None
-        
-        return payload
-    except Exception:
-        return None
+# Версия данных записей: сбрасывает ETag у GET в entries после записи здесь
+BUMP_ENTRIES_VERSION_SQL = '''
+    INSERT INTO t_p45717398_energy_dashboard_pro.data_versions (user_id, resource, version)
+    VALUES (%s, 'entries', 1)
+    ON CONFLICT (user_id, resource) DO UPDATE
+    SET version = data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+'''
+LIST_ENTRIES = prepared('energy_list', '''
+    SELECT id, entry_date, score, thoughts, created_at, updated_at
+    FROM t_p45717398_energy_dashboard_pro.energy_entries
+    WHERE user_id = $1
+    ORDER BY entry_date DESC
+''', ('int',))
+# Та же блокировка (пользователь, дата), что в entries: FOR UPDATE не видит ещё не вставленную
+# строку, и два одновременных первых сохранения даты иначе оба посчитали бы её новой
+LOCK_DATE = prepared('energy_lock_date', '''
+    SELECT pg_advisory_xact_lock($1, $2 - DATE '2000-01-01')
+''', ('int', 'date'))
+LOCK_ENTRY = prepared('energy_lock_entry', '''
+    SELECT score, tags FROM t_p45717398_energy_dashboard_pro.energy_entries
+    WHERE user_id = $1 AND entry_date = $2
+    FOR UPDATE
+''', ('int', 'date'))
 
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -57,7 +64,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Server configuration error'}),
+            'body': dumps({'error': 'Server configuration error'}),
             'isBase64Encoded': False
         }
     
@@ -68,16 +75,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Требуется авторизация'}),
+            'body': dumps({'error': 'Требуется авторизация'}),
             'isBase64Encoded': False
         }
     
-    payload = verify_jwt(token)
+    payload = verify_token(token)
     if not payload:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Невалидный или истёкший токен'}),
+            'body': dumps({'error': 'Невалидный или истёкший токен'}),
             'isBase64Encoded': False
         }
     
@@ -86,16 +93,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     conn = None
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = get_read_connection(user_id) if method == 'GET' else get_connection()
+        from psycopg2.extras import RealDictCursor
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
-            cur.execute(f'''
-                SELECT id, entry_date, score, thoughts, created_at, updated_at
-                FROM t_p45717398_energy_dashboard_pro.energy_entries
-                WHERE user_id = {user_id}
-                ORDER BY entry_date DESC
-            ''')
+            LIST_ENTRIES.execute(cur, user_id)
             entries = cur.fetchall()
             
             result = []
@@ -112,7 +115,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(result),
+                'body': dumps(result),
                 'isBase64Encoded': False
             }
         
@@ -128,7 +131,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'date и score обязательны'}),
+                    'body': dumps({'error': 'date и score обязательны'}),
                     'isBase64Encoded': False
                 }
             
@@ -148,42 +151,53 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'score должен быть от 1 до 5'}),
+                    'body': dumps({'error': 'score должен быть от 1 до 5'}),
                     'isBase64Encoded': False
                 }
             
-            # Экранируем значения для SimpleQuery
-            safe_thoughts = thoughts.replace("'", "''")
-            
-            # Сначала пробуем вставить новую запись
-            try:
-                cur.execute(f'''
-                    INSERT INTO t_p45717398_energy_dashboard_pro.energy_entries (user_id, entry_date, score, thoughts)
-                    VALUES ({user_id}, '{entry_date}', {score}, '{safe_thoughts}')
-                ''')
-                conn.commit()
-            except Exception as e:
-                # Если запись уже существует (любая ошибка уникальности), откатываем и обновляем
-                conn.rollback()
-                cur.execute(f'''
-                    UPDATE t_p45717398_energy_dashboard_pro.energy_entries 
-                    SET score = {score}, thoughts = '{safe_thoughts}', updated_at = CURRENT_TIMESTAMP
-                    WHERE user_id = {user_id} AND entry_date = '{entry_date}'
-                ''')
-                conn.commit()
+            # Upsert и обновление агрегатов выполняются в одной транзакции
+            LOCK_DATE.execute(cur, user_id, entry_date)
+            LOCK_ENTRY.execute(cur, user_id, entry_date)
+            previous = cur.fetchone()
             
-            # Получаем результат
-            cur.execute(f'''
-                SELECT id, entry_date, score, thoughts
-                FROM t_p45717398_energy_dashboard_pro.energy_entries
-                WHERE user_id = {user_id} AND entry_date = '{entry_date}'
-            ''')
+            cur.execute('''
+                INSERT INTO t_p45717398_energy_dashboard_pro.energy_entries (user_id, entry_date, score, thoughts)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id, entry_date)
+                DO UPDATE SET score = EXCLUDED.score, thoughts = EXCLUDED.thoughts, updated_at = CURRENT_TIMESTAMP
+                RETURNING id, entry_date, score, thoughts, tags
+            ''', (user_id, entry_date, score, thoughts))
             new_entry = cur.fetchone()
             
+            apply_rollup_changes(cur, user_id, [
+                (new_entry['entry_date'], previous['score'] if previous else None, new_entry['score'])
+            ])
+            if not previous:
+                apply_streak_changes(cur, user_id, added=[new_entry['entry_date']])
+            apply_risk_changes(cur, user_id, [
+                (new_entry['entry_date'], previous['score'] if previous else None, new_entry['score'])
+            ])
+            apply_tag_changes(cur, user_id, entry_tag_changes(
+                new_entry['entry_date'],
+                previous['tags'] if previous else None,
+                previous['score'] if previous else None,
+                new_entry['tags'],
+                new_entry['score']
+            ))
+            # Теги здесь не меняются, но аналитика тегов должна видеть новую оценку
+            cur.execute('''
+                UPDATE t_p45717398_energy_dashboard_pro.tag_analytics
+                SET score = %s
+                WHERE entry_id = %s AND score <> %s
+            ''', (new_entry['score'], new_entry['id'], new_entry['score']))
+            cur.execute(BUMP_ENTRIES_VERSION_SQL, (user_id,))
+            conn.commit()
+            mark_written(user_id)
+            
             return {
                 'statusCode': 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
+                'body': dumps({
                     'id': new_entry['id'],
                     'date': new_entry['entry_date'].strftime('%Y-%m-%d'),
                     'score': new_entry['score'],
@@ -200,7 +214,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'date параметр обязателен'}),
+                    'body': dumps({'error': 'date параметр обязателен'}),
                     'isBase64Encoded': False
                 }
             
@@ -214,16 +228,29 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             else:
                 entry_date = entry_date_str
             
-            cur.execute(f'''
+            cur.execute('''
                 DELETE FROM t_p45717398_energy_dashboard_pro.energy_entries 
-                WHERE entry_date = '{entry_date}' AND user_id = {user_id}
-            ''')
+                WHERE entry_date = %s AND user_id = %s
+                RETURNING id, entry_date, score, tags
+            ''', (entry_date, user_id))
+            deleted = cur.fetchone()
+            if deleted:
+                apply_rollup_changes(cur, user_id, [(deleted['entry_date'], deleted['score'], None)])
+                # Tombstone для delta-синхронизации в entries
+                record_deletion(cur, user_id, deleted['id'], deleted['entry_date'])
+                apply_streak_changes(cur, user_id, removed=[deleted['entry_date']])
+                apply_risk_changes(cur, user_id, [(deleted['entry_date'], deleted['score'], None)])
+                apply_tag_changes(cur, user_id, entry_tag_changes(
+                    deleted['entry_date'], deleted['tags'], deleted['score'], None, None
+                ))
+                cur.execute(BUMP_ENTRIES_VERSION_SQL, (user_id,))
             conn.commit()
+            mark_written(user_id)
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True}),
+                'body': dumps({'success': True}),
                 'isBase64Encoded': False
             }
         
@@ -231,7 +258,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 405,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Метод не поддерживается'}),
+                'body': dumps({'error': 'Метод не поддерживается'}),
                 'isBase64Encoded': False
             }
     
@@ -244,7 +271,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e), 'type': type(e).__name__}),
+            'body': dumps({'error': str(e), 'type': type(e).__name__}),
             'isBase64Encoded': False
         }
     
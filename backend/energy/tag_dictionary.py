@@ -0,0 +1,121 @@
+'''
+Business: Словарь тегов пользователя (частота, последнее использование, средняя оценка) и автодополнение
+Args: cur - курсор открытой транзакции, изменения тегов записей пользователя
+Returns: None при обновлении, список подсказок при поиске по префиксу
+'''
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# (тег, старая оценка или None, новая оценка или None, дата записи)
+TagChange = Tuple[str, Optional[int], Optional[int], Any]
+
+
+def entry_tag_changes(entry_date, old_tags, old_score, new_tags, new_score) -> List[TagChange]:
+    """Изменения словаря для одной записи: снятые, добавленные и переоценённые теги"""
+    old_tags = set(old_tags or []) if old_score is not None else set()
+    new_tags = set(new_tags or []) if new_score is not None else set()
+    changes = []
+    for tag in old_tags | new_tags:
+        old = old_score if tag in old_tags else None
+        new = new_score if tag in new_tags else None
+        if old != new:
+            changes.append((tag, old, new, entry_date))
+    return changes
+
+
+def apply_tag_changes(cur, user_id: int, changes: Iterable[TagChange]) -> None:
+    """Применение изменений к словарю тегов одним запросом, неиспользуемые теги удаляются"""
+    changes = list(changes)
+    if not changes:
+        return
+
+    cur.execute("""
+        INSERT INTO t_p45717398_energy_dashboard_pro.user_tags AS t
+            (user_id, tag, usage_count, score_sum, last_used)
+        SELECT %s, c.tag,
+               SUM((c.new_score IS NOT NULL)::int - (c.old_score IS NOT NULL)::int),
+               SUM(COALESCE(c.new_score, 0) - COALESCE(c.old_score, 0)),
+               MAX(c.entry_date) FILTER (WHERE c.new_score IS NOT NULL)
+        FROM unnest(%s::varchar[], %s::int[], %s::int[], %s::date[]) AS c(tag, old_score, new_score, entry_date)
+        GROUP BY c.tag
+        ON CONFLICT (user_id, tag) DO UPDATE SET
+            usage_count = t.usage_count + EXCLUDED.usage_count,
+            score_sum = t.score_sum + EXCLUDED.score_sum,
+            last_used = GREATEST(t.last_used, EXCLUDED.last_used),
+            updated_at = CURRENT_TIMESTAMP
+    """, (
+        user_id,
+        [c[0] for c in changes],
+        [c[1] for c in changes],
+        [c[2] for c in changes],
+        [str(c[3]) for c in changes],
+    ))
+    cur.execute("""
+        DELETE FROM t_p45717398_energy_dashboard_pro.user_tags
+        WHERE user_id = %s AND tag = ANY(%s::varchar[]) AND usage_count <= 0
+    """, (user_id, list({c[0] for c in changes})))
+
+    # GREATEST не откатывает last_used назад: если тег снят с записи за дату его последнего
+    # использования, дата пересчитывается по оставшимся записям с этим тегом
+    removed: Dict[str, str] = {}
+    for tag, old_score, new_score, entry_date in changes:
+        if old_score is not None and new_score is None:
+            removed[tag] = max(removed.get(tag, ''), str(entry_date))
+    if removed:
+        cur.execute("""
+            UPDATE t_p45717398_energy_dashboard_pro.user_tags AS t
+            SET last_used = (
+                SELECT MAX(e.entry_date)
+                FROM t_p45717398_energy_dashboard_pro.energy_entries e
+                WHERE e.user_id = t.user_id AND e.tags ? t.tag
+            ), updated_at = CURRENT_TIMESTAMP
+            FROM unnest(%s::varchar[], %s::date[]) AS r(tag, entry_date)
+            WHERE t.user_id = %s AND t.tag = r.tag AND t.last_used <= r.entry_date
+        """, (list(removed), list(removed.values()), user_id))
+
+
+def _like_prefix(prefix: str) -> str:
+    escaped = prefix.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+def suggest_tags(cur, user_id: int, prefix: str, limit: int) -> List[Dict[str, Any]]:
+    """Подсказки по префиксу: сначала теги пользователя по частоте, затем популярные у других"""
+    pattern = _like_prefix(prefix)
+    cur.execute("""
+        SELECT tag, usage_count, last_used, score_sum
+        FROM t_p45717398_energy_dashboard_pro.user_tags
+        WHERE user_id = %s AND LOWER(tag) LIKE %s
+        ORDER BY usage_count DESC, last_used DESC NULLS LAST, tag
+        LIMIT %s
+    """, (user_id, pattern, limit))
+    suggestions = [
+        {
+            'tag': row['tag'],
+            'count': row['usage_count'],
+            'lastUsed': row['last_used'].isoformat() if row['last_used'] else None,
+            'average': round(row['score_sum'] / row['usage_count'], 2),
+            'source': 'user'
+        }
+        for row in cur.fetchall()
+    ]
+
+    if len(suggestions) < limit:
+        known = [s['tag'] for s in suggestions]
+        suggestions.extend(popular_tags(cur, pattern, limit - len(suggestions), exclude=known))
+    return suggestions
+
+
+def popular_tags(cur, pattern: str, limit: int, exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """Популярные теги всех пользователей (для новых пользователей без своей истории)
+    из представления popular_tags, которое пересчитывает ежедневное обслуживание"""
+    cur.execute("""
+        SELECT tag
+        FROM t_p45717398_energy_dashboard_pro.popular_tags
+        WHERE LOWER(tag) LIKE %s AND NOT (tag = ANY(%s::varchar[]))
+        ORDER BY users DESC, usage_count DESC, tag
+        LIMIT %s
+    """, (pattern, list(exclude), limit))
+    return [
+        {'tag': row['tag'], 'count': None, 'lastUsed': None, 'average': None, 'source': 'popular'}
+        for row in cur.fetchall()
+    ]
@@ -0,0 +1,20 @@
+'''
+Business: Tombstone удалённых записей энергии для delta-синхронизации клиентов
+Args: cur - курсор открытой транзакции, user_id, id и дата удалённой записи
+Returns: ничего; устаревшие tombstone пользователя удаляются той же транзакцией
+'''
+
+# Сколько дней хранятся записи об удалениях для delta-синхронизации
+TOMBSTONE_RETENTION_DAYS = 90
+
+
+def record_deletion(cur, user_id: int, entry_id: int, entry_date) -> None:
+    """Запись tombstone для delta-синхронизации и чистка устаревших"""
+    cur.execute("""
+        INSERT INTO t_p45717398_energy_dashboard_pro.energy_entry_deletions (user_id, entry_id, entry_date)
+        VALUES (%s, %s, %s)
+    """, (user_id, entry_id, entry_date))
+    cur.execute("""
+        DELETE FROM t_p45717398_energy_dashboard_pro.energy_entry_deletions
+        WHERE user_id = %s AND deleted_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+    """, (user_id, TOMBSTONE_RETENTION_DAYS))
@@ -0,0 +1,373 @@
+'''
+Business: Прогноз энергии на 7 дней: экспоненциальное сглаживание (Хольт-Винтерс) с затуханием тренда и недельной сезонностью
+Args: conn - соединение с БД, user_id; история оценок пользователя
+Returns: dict с прогнозом по дням, параметры модели кэшируются в user_forecasts
+Batch: python forecast.py — перефит всех пользователей векторно по numpy (нужен DATABASE_URL и numpy);
+       python forecast.py --benchmark [N] — замер перефита N синтетических пользователей без БД
+'''
+import os
+from datetime import date, timedelta
+from itertools import product
+from math import sqrt
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Затухание тренда: на шкале 1-5 незатухающий тренд быстро уводит прогноз за границы
+PHI = 0.9
+ALPHAS = (0.1, 0.3, 0.5)
+BETAS = (0.0, 0.05, 0.15)
+GAMMAS = (0.05, 0.15, 0.3)
+PARAMETER_GRID = tuple(product(ALPHAS, BETAS, GAMMAS))
+# Модель строится по последнему году и только при достаточном числе оценок
+HISTORY_DAYS = 365
+MIN_OBSERVATIONS = 14
+HORIZON_DAYS = 7
+MIN_SCORE, MAX_SCORE = 1, 5
+Z_95 = 1.96
+# Ночной перефит 10 тысяч пользователей должен укладываться в столько секунд
+REFIT_BUDGET_USERS = 10000
+REFIT_BUDGET_SECONDS = 10
+
+# Контрольная сумма истории: ловит правки и удаления в прошлом, а не только новые дни
+CHECKSUM_SQL = "SUM(score * (entry_date - DATE '2000-01-01'))"
+
+
+def _step(model: Dict[str, Any], day: date, score: Optional[int]) -> Optional[float]:
+    """Один день рекурсии: с оценкой — коррекция уровня, тренда и сезонности, без неё — дрейф"""
+    season = model['season']
+    weekday = day.weekday()
+    drift_level = model['level'] + PHI * model['trend']
+    if score is None:
+        model['level'], model['trend'] = drift_level, PHI * model['trend']
+        return None
+
+    error = score - (drift_level + season[weekday])
+    level = model['alpha'] * (score - season[weekday]) + (1 - model['alpha']) * drift_level
+    model['trend'] = model['beta'] * (level - model['level']) + (1 - model['beta']) * PHI * model['trend']
+    model['level'] = level
+    season[weekday] = model['gamma'] * (score - level) + (1 - model['gamma']) * season[weekday]
+    return error
+
+
+def _run(points: List[Tuple[date, int]], alpha: float, beta: float, gamma: float) -> Dict[str, Any]:
+    """Сглаживание ряда от первой оценки до последней, пропущенные дни — дрейф"""
+    first_date, first_score = points[0]
+    model = {
+        'alpha': alpha, 'beta': beta, 'gamma': gamma,
+        'level': float(first_score), 'trend': 0.0, 'season': [0.0] * 7,
+        'sse': 0.0, 'errors': 0, 'last_date': first_date
+    }
+    by_date = dict(points)
+    day = first_date + timedelta(days=1)
+    while day <= points[-1][0]:
+        error = _step(model, day, by_date.get(day))
+        if error is not None:
+            model['sse'] += error * error
+            model['errors'] += 1
+        day += timedelta(days=1)
+    model['last_date'] = points[-1][0]
+    return model
+
+
+def fit_model(points: Iterable[Tuple[date, int]]) -> Optional[Dict[str, Any]]:
+    """Подбор параметров по сетке: минимум ошибки прогноза на шаг вперёд"""
+    points = sorted(points)
+    if len(points) < MIN_OBSERVATIONS:
+        return None
+    best = None
+    for alpha, beta, gamma in PARAMETER_GRID:
+        model = _run(points, alpha, beta, gamma)
+        if best is None or model['sse'] < best['sse']:
+            best = model
+    best['observations'] = len(points)
+    return best
+
+
+def update_model(model: Dict[str, Any], points: Iterable[Tuple[date, int]]) -> Dict[str, Any]:
+    """Инкрементальное обновление состояния новыми днями после last_date без повторного подбора"""
+    by_date = dict(points)
+    if not by_date:
+        return model
+    day = model['last_date'] + timedelta(days=1)
+    last = max(by_date)
+    while day <= last:
+        error = _step(model, day, by_date.get(day))
+        if error is not None:
+            model['sse'] += error * error
+            model['errors'] += 1
+            model['observations'] += 1
+        day += timedelta(days=1)
+    model['last_date'] = last
+    return model
+
+
+def project(model: Dict[str, Any], today: date, horizon: int = HORIZON_DAYS) -> List[Dict[str, Any]]:
+    """Прогноз на дни после today с интервалом, расширяющимся с горизонтом"""
+    rmse = sqrt(model['sse'] / model['errors']) if model['errors'] else 0.0
+    result = []
+    for offset in range(1, horizon + 1):
+        day = today + timedelta(days=offset)
+        steps = (day - model['last_date']).days
+        damped = sum(PHI ** i for i in range(1, steps + 1))
+        value = model['level'] + damped * model['trend'] + model['season'][day.weekday()]
+        margin = Z_95 * rmse * sqrt(1 + (steps - 1) * model['alpha'] ** 2)
+        result.append({
+            'date': day.isoformat(),
+            'score': round(min(max(value, MIN_SCORE), MAX_SCORE), 2),
+            'low': round(min(max(value - margin, MIN_SCORE), MAX_SCORE), 2),
+            'high': round(min(max(value + margin, MIN_SCORE), MAX_SCORE), 2)
+        })
+    return result
+
+
+def _save(cur, user_id: int, version: int, model: Dict[str, Any], history_count: int, checksum: int) -> None:
+    cur.execute("""
+        INSERT INTO t_p45717398_energy_dashboard_pro.user_forecasts
+            (user_id, version, alpha, beta, gamma, level, trend, season, sse, errors,
+             observations, last_date, history_count, history_checksum)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            version = EXCLUDED.version, alpha = EXCLUDED.alpha, beta = EXCLUDED.beta, gamma = EXCLUDED.gamma,
+            level = EXCLUDED.level, trend = EXCLUDED.trend, season = EXCLUDED.season,
+            sse = EXCLUDED.sse, errors = EXCLUDED.errors, observations = EXCLUDED.observations,
+            last_date = EXCLUDED.last_date, history_count = EXCLUDED.history_count,
+            history_checksum = EXCLUDED.history_checksum, updated_at = CURRENT_TIMESTAMP
+    """, (
+        user_id, version, model['alpha'], model['beta'], model['gamma'], model['level'], model['trend'],
+        model['season'], model['sse'], model['errors'], model['observations'], model['last_date'],
+        history_count, checksum
+    ))
+
+
+def load_forecast(conn, user_id: int) -> Dict[str, Any]:
+    """Прогноз по кэшированной модели: без пересчёта, если записей не было, дообучение на новых днях,
+    полный подбор только при изменениях в прошлом. Коммит остаётся за вызывающим"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT CURRENT_DATE, COALESCE(v.version, 0), f.version, f.alpha, f.beta, f.gamma, f.level, f.trend,
+               f.season, f.sse, f.errors, f.observations, f.last_date, f.history_count, f.history_checksum
+        FROM (SELECT %s::int as user_id) u
+        LEFT JOIN t_p45717398_energy_dashboard_pro.data_versions v
+            ON v.user_id = u.user_id AND v.resource = 'entries'
+        LEFT JOIN t_p45717398_energy_dashboard_pro.user_forecasts f
+            ON f.user_id = u.user_id
+    """, (user_id,))
+    (today, version, cached_version, alpha, beta, gamma, level, trend, season, sse, errors,
+     observations, last_date, history_count, checksum) = cur.fetchone()
+
+    model = None
+    if cached_version is not None:
+        model = {
+            'alpha': alpha, 'beta': beta, 'gamma': gamma, 'level': level, 'trend': trend,
+            'season': list(season), 'sse': sse, 'errors': errors, 'observations': observations,
+            'last_date': last_date
+        }
+
+    if model is None or cached_version != version:
+        refit = model is None
+        if model is not None:
+            cur.execute(f"""
+                SELECT COUNT(*) FILTER (WHERE entry_date <= %s),
+                       COALESCE({CHECKSUM_SQL} FILTER (WHERE entry_date <= %s), 0)
+                FROM t_p45717398_energy_dashboard_pro.energy_entries
+                WHERE user_id = %s AND entry_date <= CURRENT_DATE
+            """, (last_date, last_date, user_id))
+            refit = tuple(cur.fetchone()) != (history_count, checksum)
+
+        since = today - timedelta(days=HISTORY_DAYS) if refit else last_date
+        cur.execute("""
+            SELECT entry_date, score
+            FROM t_p45717398_energy_dashboard_pro.energy_entries
+            WHERE user_id = %s AND entry_date > %s AND entry_date <= CURRENT_DATE
+            ORDER BY entry_date
+        """, (user_id, since))
+        points = cur.fetchall()
+        model = fit_model(points) if refit else update_model(model, points)
+
+        if model is None:
+            cur.execute(
+                "DELETE FROM t_p45717398_energy_dashboard_pro.user_forecasts WHERE user_id = %s", (user_id,)
+            )
+        else:
+            cur.execute(f"""
+                SELECT COUNT(*), COALESCE({CHECKSUM_SQL}, 0)
+                FROM t_p45717398_energy_dashboard_pro.energy_entries
+                WHERE user_id = %s AND entry_date <= %s
+            """, (user_id, model['last_date']))
+            history_count, checksum = cur.fetchone()
+            _save(cur, user_id, version, model, history_count, checksum)
+    cur.close()
+
+    if model is None:
+        return {'days': [], 'minObservations': MIN_OBSERVATIONS}
+    return {
+        'lastEntry': model['last_date'].isoformat(),
+        'days': project(model, today),
+        'model': {
+            'alpha': model['alpha'],
+            'beta': model['beta'],
+            'gamma': model['gamma'],
+            'rmse': round(sqrt(model['sse'] / model['errors']), 2) if model['errors'] else None,
+            'observations': model['observations']
+        }
+    }
+
+
+def _fit_matrix(matrix, weekdays: List[int]):
+    """Подбор по сетке для матрицы пользователи × дни (NaN — нет оценки): та же рекурсия, что в _run,
+    по всем пользователям сразу. Возвращает минимальную ошибку и параметры со снимком состояния"""
+    import numpy as np
+
+    users, history_days = matrix.shape
+    best_sse = np.full(users, np.inf)
+    best = {}
+    for alpha, beta, gamma in PARAMETER_GRID:
+        level = np.zeros(users)
+        trend = np.zeros(users)
+        season = np.zeros((users, 7))
+        started = np.zeros(users, dtype=bool)
+        sse = np.zeros(users)
+        errors = np.zeros(users, dtype=int)
+        snap_level, snap_trend, last_index = np.zeros(users), np.zeros(users), np.zeros(users, dtype=int)
+        for t in range(history_days):
+            y = matrix[:, t]
+            w = weekdays[t]
+            observed = ~np.isnan(y)
+            update = observed & started
+            first = observed & ~started
+
+            s = season[:, w]
+            drift_level = level + PHI * trend
+            error = np.where(update, y - (drift_level + s), 0.0)
+            new_level = np.where(update, alpha * (y - s) + (1 - alpha) * drift_level,
+                                 np.where(started, drift_level, np.where(first, y, level)))
+            trend = np.where(update, beta * (new_level - level) + (1 - beta) * PHI * trend,
+                             np.where(started, PHI * trend, trend))
+            season[:, w] = np.where(update, gamma * (y - new_level) + (1 - gamma) * s, s)
+            level = new_level
+            sse += error * error
+            errors += update
+
+            snap_level = np.where(observed, level, snap_level)
+            snap_trend = np.where(observed, trend, snap_trend)
+            last_index = np.where(observed, t, last_index)
+            started |= observed
+
+        better = sse < best_sse
+        best_sse = np.where(better, sse, best_sse)
+        for key, value in (('level', snap_level), ('trend', snap_trend), ('errors', errors),
+                           ('last_index', last_index)):
+            best[key] = np.where(better, value, best.get(key, value))
+        best['season'] = np.where(better[:, None], season, best.get('season', season))
+        for key, value in (('alpha', alpha), ('beta', beta), ('gamma', gamma)):
+            best[key] = np.where(better, value, best.get(key, np.full(users, value)))
+
+    return best_sse, best
+
+
+def refit_all(conn) -> int:
+    """Полный перефит всех пользователей: рекурсия идёт по дням, а пользователи и сетка — векторами numpy"""
+    import numpy as np
+    from psycopg2.extras import execute_values
+
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT e.user_id, CURRENT_DATE - e.entry_date, e.score, CURRENT_DATE
+        FROM t_p45717398_energy_dashboard_pro.energy_entries e
+        WHERE e.user_id IS NOT NULL
+        AND e.entry_date > CURRENT_DATE - %s AND e.entry_date <= CURRENT_DATE
+    """, (HISTORY_DAYS,))
+    rows = cur.fetchall()
+    if not rows:
+        return 0
+    today = rows[0][3]
+
+    user_ids = sorted({r[0] for r in rows})
+    index = {u: i for i, u in enumerate(user_ids)}
+    matrix = np.full((len(user_ids), HISTORY_DAYS), np.nan)
+    for user_id, age, score, _ in rows:
+        matrix[index[user_id], HISTORY_DAYS - 1 - age] = score
+    days = [today - timedelta(days=HISTORY_DAYS - 1 - t) for t in range(HISTORY_DAYS)]
+    weekdays = [d.weekday() for d in days]
+
+    counts = (~np.isnan(matrix)).sum(axis=1)
+    keep = counts >= MIN_OBSERVATIONS
+    matrix, counts = matrix[keep], counts[keep]
+    user_ids = [u for u, k in zip(user_ids, keep) if k]
+    users = len(user_ids)
+    if not users:
+        return 0
+
+    best_sse, best = _fit_matrix(matrix, weekdays)
+
+    cur.execute(f"""
+        SELECT e.user_id, COALESCE(v.version, 0), COUNT(*), COALESCE({CHECKSUM_SQL}, 0)
+        FROM t_p45717398_energy_dashboard_pro.energy_entries e
+        JOIN unnest(%s::int[], %s::date[]) AS u(user_id, last_date) ON u.user_id = e.user_id
+        LEFT JOIN t_p45717398_energy_dashboard_pro.data_versions v
+            ON v.user_id = e.user_id AND v.resource = 'entries'
+        WHERE e.entry_date <= u.last_date
+        GROUP BY e.user_id, v.version
+    """, (user_ids, [days[i] for i in best['last_index']]))
+    history = {r[0]: r[1:] for r in cur.fetchall()}
+
+    # Сезонность меняется только в дни с оценкой, поэтому вместе со снимком уровня и тренда
+    # она соответствует дате последней оценки, как и у fit_model
+    execute_values(cur, """
+        INSERT INTO t_p45717398_energy_dashboard_pro.user_forecasts
+            (user_id, version, alpha, beta, gamma, level, trend, season, sse, errors,
+             observations, last_date, history_count, history_checksum)
+        VALUES %s
+        ON CONFLICT (user_id) DO UPDATE SET
+            version = EXCLUDED.version, alpha = EXCLUDED.alpha, beta = EXCLUDED.beta, gamma = EXCLUDED.gamma,
+            level = EXCLUDED.level, trend = EXCLUDED.trend, season = EXCLUDED.season,
+            sse = EXCLUDED.sse, errors = EXCLUDED.errors, observations = EXCLUDED.observations,
+            last_date = EXCLUDED.last_date, history_count = EXCLUDED.history_count,
+            history_checksum = EXCLUDED.history_checksum, updated_at = CURRENT_TIMESTAMP
+    """, [
+        (
+            user_id, int(history[user_id][0]), float(best['alpha'][i]), float(best['beta'][i]),
+            float(best['gamma'][i]), float(best['level'][i]), float(best['trend'][i]),
+            [float(x) for x in best['season'][i]], float(best_sse[i]), int(best['errors'][i]),
+            int(counts[i]), days[int(best['last_index'][i])], int(history[user_id][1]), int(history[user_id][2])
+        )
+        for i, user_id in enumerate(user_ids)
+        if user_id in history
+    ])
+    conn.commit()
+    cur.close()
+    return users
+
+
+def benchmark(users: int = REFIT_BUDGET_USERS, fill: float = 0.7, seed: int = 0) -> float:
+    """Время подбора по сетке для синтетических пользователей с годом истории, заполненной на fill"""
+    import time
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    matrix = rng.integers(MIN_SCORE, MAX_SCORE + 1, size=(users, HISTORY_DAYS)).astype(float)
+    matrix[rng.random((users, HISTORY_DAYS)) > fill] = np.nan
+    weekdays = [t % 7 for t in range(HISTORY_DAYS)]
+    started_at = time.perf_counter()
+    _fit_matrix(matrix, weekdays)
+    return time.perf_counter() - started_at
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    if sys.argv[1:2] == ['--benchmark']:
+        # python forecast.py --benchmark [пользователей]
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else REFIT_BUDGET_USERS
+        elapsed = benchmark(count)
+        budget = REFIT_BUDGET_SECONDS * count / REFIT_BUDGET_USERS
+        print(f'Fitted {count} synthetic users in {elapsed:.2f}s (budget {budget:.1f}s)')
+        sys.exit(1 if elapsed > budget else 0)
+
+    import psycopg2
+
+    started_at = time.monotonic()
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    refitted = refit_all(connection)
+    connection.close()
+    print(f'Refitted {refitted} users in {time.monotonic() - started_at:.1f}s')
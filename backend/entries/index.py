@@ -6,38 +6,628 @@ Args: event - dict с httpMethod, body, queryStringParameters, headers
 Returns: HTTP response dict с данными записей или статистикой за 14 дней и текущий месяц
 '''
 import json
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
-import hashlib
+from datetime import datetime, date, timedelta
+import base64
+from decimal import Decimal
 from typing import Dict, Any, Optional
 
-JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-key-change-in-production')
-DATABASE_URL = os.environ.get('DATABASE_URL')
+from analytics import rolling_windows, DEFAULT_WINDOWS
+from deletions import TOMBSTONE_RETENTION_DAYS, record_deletion
+from rollups import apply_rollup_changes
+from streaks import apply_streak_changes, fetch_streak
+from tag_dictionary import apply_tag_changes, entry_tag_changes, suggest_tags
+from insights import load_insights
+from forecast import load_forecast
+from risk import apply_risk_changes
+from db import get_connection, get_read_connection, mark_written, prepared
+from responses import compressible, dumps, make_etag, not_modified, with_etag
+from tokens import verify_token
 
-def verify_jwt(token: str) -> Optional[Dict[str, Any]]:
-    """Проверка JWT токена"""
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Максимум записей в одном пакетном POST
+MAX_BATCH_SIZE = 366
+# Длина тега ограничена колонкой tag_analytics.tag
+MAX_TAG_LENGTH = 50
+# Надбавка к метке синхронизации на транзакции, закоммиченные позже чтения
+SYNC_OVERLAP_SECONDS = 5
+# Диапазон временного ряда по умолчанию для каждой детализации
+SERIES_DEFAULT_SPAN = {
+    'day': timedelta(days=30),
+    'week': timedelta(weeks=12),
+    'month': timedelta(days=365),
+    'year': timedelta(days=5 * 365)
+}
+# Ограничение диапазона временного ряда (около 10 лет)
+MAX_SERIES_DAYS = 3700
+# Колонки, которые format=columnar отдаёт только по запросу в fields
+COLUMNAR_OPTIONAL_FIELDS = ('id', 'thoughts', 'tags')
+# Скользящие окна статистики в днях (ключи lastNDays в ответе)
+STATS_WINDOWS = DEFAULT_WINDOWS
+# Глубина истории для поиска лучших и худших периодов
+ANALYTICS_LOOKBACK_DAYS = 365
+# Максимум тегов в одном фильтре anyTags/allTags
+MAX_FILTER_TAGS = 20
+# Число подсказок автодополнения тегов по умолчанию и максимум
+DEFAULT_TAG_SUGGESTIONS = 10
+MAX_TAG_SUGGESTIONS = 50
+# Максимальная длина поискового запроса
+MAX_SEARCH_QUERY_LENGTH = 200
+# GET-представления, которые пишут кэш в БД и поэтому всегда идут на основную базу
+CACHING_VIEWS = ('forecast', 'insights')
+# Параметры подсветки совпадений в сниппетах поиска
+SEARCH_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2, FragmentDelimiter=" … "'
+
+# Горячие запросы: PREPARE один раз на соединение, дальше EXECUTE по имени
+DATA_VERSION = prepared('entries_data_version', """
+    SELECT COALESCE((
+        SELECT version FROM t_p45717398_energy_dashboard_pro.data_versions
+        WHERE user_id = $1 AND resource = $2
+    ), 0) as version, CURRENT_DATE as today
+""", ('int', 'varchar'))
+LIST_ENTRIES = prepared('entries_list', """
+    SELECT id, entry_date as date, score, thoughts, tags, created_at, updated_at
+    FROM energy_entries
+    WHERE user_id = $1
+    ORDER BY entry_date DESC
+""", ('int',))
+STATS_TOTALS = prepared('entries_stats_totals', """
+    SELECT SUM(entry_count) as total,
+           SUM(score_sum) as score_sum,
+           SUM(score_4 + score_5) as good,
+           SUM(score_3) as neutral,
+           SUM(score_0 + score_1 + score_2) as bad,
+           SUM(score_sum) FILTER (WHERE bucket_start = date_trunc('month', CURRENT_DATE)) as sum_month,
+           SUM(entry_count) FILTER (WHERE bucket_start = date_trunc('month', CURRENT_DATE)) as count_month,
+           CURRENT_DATE as today
+    FROM t_p45717398_energy_dashboard_pro.energy_rollups
+    WHERE user_id = $1 AND granularity = 'month'
+""", ('int',))
+STATS_SERIES = prepared('entries_stats_series', """
+    SELECT entry_date, score
+    FROM energy_entries
+    WHERE user_id = $1 AND entry_date > $2 AND entry_date <= $3
+""", ('int', 'date', 'date'))
+# Блокировка (пользователь, дата) до конца транзакции: FOR UPDATE не видит ещё не вставленную
+# строку, и два одновременных первых сохранения одной даты иначе оба посчитали бы её новой
+LOCK_DATES = prepared('entries_lock_dates', """
+    SELECT pg_advisory_xact_lock($1, d - DATE '2000-01-01')
+    FROM unnest($2::date[]) AS d
+""", ('int', 'date[]'))
+LOCK_PREVIOUS = prepared('entries_lock_previous', """
+    SELECT entry_date, score, tags FROM energy_entries
+    WHERE user_id = $1 AND entry_date = ANY($2)
+    FOR UPDATE
+""", ('int', 'date[]'))
+# Upsert записей и синхронизация tag_analytics (удаление снятых тегов,
+# добавление новых, обновление оценки) одним запросом
+UPSERT_ENTRIES = prepared('entries_upsert', """
+    WITH saved AS (
+        INSERT INTO energy_entries (user_id, entry_date, score, thoughts, tags)
+        SELECT $1, i.entry_date, i.score, i.thoughts, i.tags
+        FROM unnest($2::date[], $3::int[], $4::text[], $5::jsonb[]) AS i(entry_date, score, thoughts, tags)
+        ON CONFLICT (user_id, entry_date) 
+        DO UPDATE SET score = EXCLUDED.score, thoughts = EXCLUDED.thoughts, 
+                      tags = EXCLUDED.tags,
+                      updated_at = CURRENT_TIMESTAMP
+        RETURNING id, user_id, entry_date, score, thoughts, tags, created_at, updated_at
+    ),
+    removed_tags AS (
+        DELETE FROM tag_analytics ta
+        USING saved s
+        WHERE ta.entry_id = s.id AND NOT (s.tags ? ta.tag)
+    ),
+    upserted_tags AS (
+        INSERT INTO tag_analytics (entry_id, tag, score, entry_date, user_id)
+        SELECT DISTINCT s.id, t.tag, s.score, s.entry_date, s.user_id
+        FROM saved s
+        CROSS JOIN jsonb_array_elements_text(s.tags) AS t(tag)
+        ON CONFLICT (entry_id, tag) DO UPDATE
+        SET score = EXCLUDED.score, entry_date = EXCLUDED.entry_date
+        WHERE tag_analytics.score IS DISTINCT FROM EXCLUDED.score
+           OR tag_analytics.entry_date IS DISTINCT FROM EXCLUDED.entry_date
+    )
+    SELECT id, entry_date as date, score, thoughts, tags, created_at, updated_at
+    FROM saved
+""", ('int', 'date[]', 'int[]', 'text[]', 'jsonb[]'))
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    """Разбор даты в формате YYYY-MM-DD или DD.MM.YYYY"""
+    if not value:
+        return None
+    if '.' in value:
+        return datetime.strptime(value, '%d.%m.%Y').date()
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def encode_cursor(entry_date: date) -> str:
+    """Непрозрачный курсор следующей страницы по дате последней записи"""
+    return base64.urlsafe_b64encode(entry_date.isoformat().encode()).decode()
+
+def decode_cursor(cursor: Optional[str]) -> Optional[date]:
+    """Разбор курсора, выданного encode_cursor"""
+    if not cursor:
+        return None
     try:
-        import base64
-        decoded = base64.b64decode(token.encode()).decode()
-        payload_str, signature = decoded.split('::')
-        
-        expected_signature = hashlib.sha256(f"{payload_str}{JWT_SECRET}".encode()).hexdigest()
-        
-        if signature != expected_signature:
-            return None
-        
-        payload = json.loads(payload_str)
-        
-        exp_time = datetime.fromisoformat(payload['exp'])
-        if datetime.utcnow() > exp_time:
-            return None
-        
-        return payload
+        return datetime.strptime(base64.urlsafe_b64decode(cursor.encode()).decode(), '%Y-%m-%d').date()
     except Exception:
+        raise ValueError('Invalid cursor')
+
+def encode_search_cursor(rank, entry_date: date) -> str:
+    """Курсор страницы поиска: ранг и дата последнего результата"""
+    return base64.urlsafe_b64encode(f'{rank}|{entry_date.isoformat()}'.encode()).decode()
+
+def decode_search_cursor(cursor: Optional[str]):
+    """Разбор курсора, выданного encode_search_cursor"""
+    if not cursor:
         return None
+    try:
+        rank, entry_date = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return Decimal(rank), datetime.strptime(entry_date, '%Y-%m-%d').date()
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_tags(value: Optional[str]) -> list:
+    """Список тегов фильтра из параметра через запятую"""
+    tags = [t.strip() for t in (value or '').split(',') if t.strip()]
+    if len(tags) > MAX_FILTER_TAGS or any(len(t) > MAX_TAG_LENGTH for t in tags):
+        raise ValueError('Invalid tag filter')
+    return tags
+
+def tag_conditions(any_tags: list, all_tags: list, column: str = 'tags'):
+    """Условия по тегам в виде операторов jsonb, которые обслуживает GIN-индекс idx_energy_entries_tags"""
+    conditions, params = [], []
+    if any_tags:
+        conditions.append(f'{column} ?| %s::text[]')
+        params.append(any_tags)
+    if all_tags:
+        conditions.append(f'{column} @> %s::jsonb')
+        params.append(json.dumps(all_tags))
+    return conditions, params
+
+def serialize_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Преобразование строки energy_entries в формат ответа API"""
+    entry_date = entry['date']
+    if isinstance(entry_date, str):
+        dt = datetime.strptime(entry_date, '%Y-%m-%d')
+    else:
+        dt = entry_date
+    
+    tags_data = entry.get('tags')
+    if isinstance(tags_data, str):
+        tags_list = json.loads(tags_data) if tags_data else []
+    elif tags_data is None:
+        tags_list = []
+    else:
+        tags_list = tags_data
+    
+    return {
+        'id': entry['id'],
+        'date': dt.strftime('%Y-%m-%d'),
+        'score': entry['score'],
+        'thoughts': entry['thoughts'] or '',
+        'tags': tags_list,
+        'createdAt': entry['created_at'].isoformat() if entry.get('created_at') else None,
+        'updatedAt': entry['updated_at'].isoformat() if entry.get('updated_at') else None
+    }
+
+def parse_sync_token(value: Optional[str]) -> Optional[datetime]:
+    """Разбор метки синхронизации, выданной issue_sync_token"""
+    if not value:
+        return None
+    watermark = datetime.fromisoformat(value)
+    if watermark.tzinfo is None:
+        raise ValueError('Sync token must include timezone')
+    return watermark
+
+def issue_sync_token(cur) -> datetime:
+    """Метка синхронизации по времени БД с небольшим перекрытием"""
+    cur.execute("SELECT CURRENT_TIMESTAMP - make_interval(secs => %s) as watermark", (SYNC_OVERLAP_SECONDS,))
+    return cur.fetchone()['watermark']
+
+def serialize_columnar(entries: list, fields: list) -> Dict[str, Any]:
+    """Параллельные массивы: смещения в днях от baseDate (самой новой даты) и оценки строкой цифр"""
+    base_date = entries[0]['date'] if entries else None
+    body: Dict[str, Any] = {
+        'format': 'columnar',
+        'baseDate': base_date.isoformat() if base_date else None,
+        'dayOffsets': [(base_date - entry['date']).days for entry in entries],
+        'scores': ''.join(str(entry['score']) for entry in entries)
+    }
+    if 'id' in fields:
+        body['ids'] = [entry['id'] for entry in entries]
+    if 'thoughts' in fields:
+        body['thoughts'] = [entry['thoughts'] or '' for entry in entries]
+    if 'tags' in fields:
+        body['tags'] = [entry['tags'] or [] for entry in entries]
+    return body
+
+def listing_query(user_id: int, columns: str, date_from: Optional[date], date_to: Optional[date],
+                  cursor_date: Optional[date], tag_filter, limit: Optional[int]):
+    """SQL и параметры списка записей с фильтрами; keyset-пагинация по (user_id, entry_date)
+    через уникальный индекс"""
+    conditions = ['user_id = %s']
+    params: list = [user_id]
+    if date_from:
+        conditions.append('entry_date >= %s')
+        params.append(date_from)
+    if date_to:
+        conditions.append('entry_date <= %s')
+        params.append(date_to)
+    if cursor_date:
+        conditions.append('entry_date < %s')
+        params.append(cursor_date)
+    conditions.extend(tag_filter[0])
+    params.extend(tag_filter[1])
+    
+    limit_clause = ''
+    if limit is not None:
+        limit_clause = 'LIMIT %s'
+        params.append(limit)
+    
+    return f"""
+        SELECT {columns}
+        FROM energy_entries
+        WHERE {' AND '.join(conditions)}
+        ORDER BY entry_date DESC
+        {limit_clause}
+    """, params
+
+def changes_queries(user_id: int, since: datetime):
+    """SQL и параметры delta-синхронизации: изменённые записи и tombstone удалённых"""
+    changed = ("""
+        SELECT id, entry_date as date, score, thoughts, tags, created_at, updated_at
+        FROM energy_entries
+        WHERE user_id = %s AND updated_at > %s
+        ORDER BY updated_at
+    """, [user_id, since])
+    deleted = ("""
+        SELECT entry_id, entry_date, deleted_at
+        FROM t_p45717398_energy_dashboard_pro.energy_entry_deletions
+        WHERE user_id = %s AND deleted_at > %s
+        ORDER BY deleted_at
+    """, [user_id, since])
+    return changed, deleted
+
+def fetch_changes(cur, user_id: int, since: datetime):
+    """Записи, изменённые после метки, и tombstone-записи удалённых"""
+    changed_query, deleted_query = changes_queries(user_id, since)
+    cur.execute(*changed_query)
+    changed = [serialize_entry(entry) for entry in cur.fetchall()]
+    
+    cur.execute(*deleted_query)
+    deleted = [
+        {
+            'id': row['entry_id'],
+            'date': row['entry_date'].strftime('%Y-%m-%d'),
+            'deletedAt': row['deleted_at'].isoformat()
+        }
+        for row in cur.fetchall()
+    ]
+    return changed, deleted
+
+def fetch_data_version(cur, user_id: int, resource: str):
+    """Версия данных пользователя для ETag и текущая дата БД (от неё зависит статистика)"""
+    DATA_VERSION.execute(cur, user_id, resource)
+    row = cur.fetchone()
+    return row['version'], row['today']
+
+def bump_data_version(cur, user_id: int, resource: str) -> None:
+    """Увеличение версии данных после записи, чтобы сбросить ETag клиентов"""
+    cur.execute("""
+        INSERT INTO t_p45717398_energy_dashboard_pro.data_versions (user_id, resource, version)
+        VALUES (%s, %s, 1)
+        ON CONFLICT (user_id, resource) DO UPDATE
+        SET version = data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+    """, (user_id, resource))
+
+def validate_entry(item: Any) -> Dict[str, Any]:
+    """Проверка записи из тела POST, ValueError с текстом ошибки для клиента"""
+    if not isinstance(item, dict):
+        raise ValueError('Запись должна быть объектом')
+    
+    date_str = item.get('date', '')
+    score = item.get('score')
+    thoughts = item.get('thoughts') or ''
+    tags = item.get('tags') or []
+    
+    if not date_str or score is None:
+        raise ValueError('Дата и оценка обязательны')
+    
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        raise ValueError('Оценка должна быть от 1 до 5')
+    try:
+        # Infinity и NaN из JSON не приводятся к int
+        integral = score == int(score)
+    except (ValueError, OverflowError):
+        integral = False
+    if not integral or not (1 <= score <= 5):
+        raise ValueError('Оценка должна быть от 1 до 5')
+    score = int(score)
+    
+    try:
+        db_date = parse_date(str(date_str)).isoformat()
+    except (ValueError, TypeError):
+        raise ValueError('Неверный формат даты')
+    
+    if not isinstance(thoughts, str):
+        raise ValueError('Мысли должны быть строкой')
+    
+    if not isinstance(tags, list) or not all(isinstance(t, str) and 0 < len(t) <= MAX_TAG_LENGTH for t in tags):
+        raise ValueError(f'Теги должны быть строками до {MAX_TAG_LENGTH} символов')
+    
+    return {'date': db_date, 'score': score, 'thoughts': thoughts, 'tags': tags}
+
+def upsert_entries(cur, user_id: int, items: list) -> Dict[str, Dict[str, Any]]:
+    """Upsert проверенных записей одним INSERT ... ON CONFLICT, результат по дате"""
+    dates = [item['date'] for item in items]
+    
+    # Даты блокируются по возрастанию, чтобы встречные пакеты не ждали друг друга по кругу
+    LOCK_DATES.execute(cur, user_id, sorted(dates))
+    LOCK_PREVIOUS.execute(cur, user_id, dates)
+    previous_rows = {row['entry_date'].isoformat(): row for row in cur.fetchall()}
+    previous = {entry_date: row['score'] for entry_date, row in previous_rows.items()}
+    
+    UPSERT_ENTRIES.execute(
+        cur,
+        user_id,
+        dates,
+        [item['score'] for item in items],
+        [item['thoughts'] for item in items],
+        [json.dumps(item['tags']) for item in items]
+    )
+    saved = {row['date'].isoformat(): row for row in cur.fetchall()}
+    # Системные колонки (xmax) из секционированной таблицы не возвращаются,
+    # новизна строки известна по заблокированным прежним значениям
+    for entry_date, row in saved.items():
+        row['inserted'] = entry_date not in previous
+    
+    apply_rollup_changes(cur, user_id, [
+        (entry_date, previous.get(entry_date), row['score'])
+        for entry_date, row in saved.items()
+    ])
+    apply_streak_changes(cur, user_id, added=[
+        row['date'] for entry_date, row in saved.items() if entry_date not in previous
+    ])
+    apply_risk_changes(cur, user_id, [
+        (row['date'], previous.get(entry_date), row['score'])
+        for entry_date, row in saved.items()
+    ])
+    apply_tag_changes(cur, user_id, [
+        change
+        for entry_date, row in saved.items()
+        for change in entry_tag_changes(
+            row['date'],
+            previous_rows[entry_date]['tags'] if entry_date in previous_rows else None,
+            previous.get(entry_date),
+            row['tags'],
+            row['score']
+        )
+    ])
+    bump_data_version(cur, user_id, 'entries')
+    
+    return saved
+
+def tagged_totals_query(user_id: int, tag_filter):
+    """SQL и параметры итогов по записям с тегами из фильтра"""
+    tag_sql, tag_params = tag_filter
+    filter_clause = ''.join(f' AND {c}' for c in tag_sql)
+    return f"""
+        SELECT COUNT(*) as total,
+               SUM(score) as score_sum,
+               COUNT(*) FILTER (WHERE score >= 4) as good,
+               COUNT(*) FILTER (WHERE score = 3) as neutral,
+               COUNT(*) FILTER (WHERE score <= 2) as bad,
+               SUM(score) FILTER (WHERE date_trunc('month', entry_date) = date_trunc('month', CURRENT_DATE)) as sum_month,
+               COUNT(*) FILTER (WHERE date_trunc('month', entry_date) = date_trunc('month', CURRENT_DATE)) as count_month,
+               CURRENT_DATE as today
+        FROM energy_entries
+        WHERE user_id = %s{filter_clause}
+    """, [user_id] + tag_params
+
+def tagged_series_query(user_id: int, since: date, today: date, tag_filter):
+    """SQL и параметры ряда оценок за (since, today] по записям с тегами из фильтра"""
+    tag_sql, tag_params = tag_filter
+    filter_clause = ''.join(f' AND {c}' for c in tag_sql)
+    return f"""
+        SELECT entry_date, score
+        FROM energy_entries
+        WHERE user_id = %s AND entry_date > %s AND entry_date <= %s{filter_clause}
+    """, [user_id, since, today] + tag_params
+
+def fetch_stats(cur, user_id: int, tag_filter=None) -> Dict[str, Any]:
+    """Итоги из агрегатов energy_rollups и скользящие окна по ряду оценок"""
+    tagged = bool(tag_filter and tag_filter[0])
+    if tagged:
+        # Агрегаты не разбиты по тегам, поэтому отфильтрованные итоги считаются по записям
+        cur.execute(*tagged_totals_query(user_id, tag_filter))
+    else:
+        STATS_TOTALS.execute(cur, user_id)
+    row = cur.fetchone()
+    today = row['today']
+    
+    def average(score_sum, count) -> float:
+        return round(float(score_sum) / float(count), 2) if count else 0
+    
+    stats = {
+        'good': int(row['good'] or 0),
+        'neutral': int(row['neutral'] or 0),
+        'bad': int(row['bad'] or 0),
+        'average': average(row['score_sum'], row['total']),
+        'total': int(row['total'] or 0)
+    }
+    
+    since = today - timedelta(days=ANALYTICS_LOOKBACK_DAYS)
+    if tagged:
+        cur.execute(*tagged_series_query(user_id, since, today, tag_filter))
+    else:
+        STATS_SERIES.execute(cur, user_id, since, today)
+    windows = rolling_windows([(r['entry_date'], r['score']) for r in cur.fetchall()], today, STATS_WINDOWS)
+    for days, window in windows.items():
+        stats[f'last{days}Days'] = {**window, 'average': window['average'] or 0}
+    
+    stats['currentMonth'] = {
+        'average': average(row['sum_month'], row['count_month']),
+        'count': int(row['count_month'] or 0)
+    }
+    stats['streak'] = fetch_streak(cur, user_id, today)
+    return stats
 
+def series_query(user_id: int, granularity: str, date_from: date, date_to: date):
+    """SQL и параметры временного ряда по периодам из energy_rollups"""
+    # Годовые значения собираются из месячных агрегатов
+    source = 'month' if granularity == 'year' else granularity
+    histogram_sums = ', '.join(f'SUM(r.score_{s}) as score_{s}' for s in range(0, 6))
+    min_score = ' '.join(f'WHEN a.score_{s} > 0 THEN {s}' for s in range(0, 6))
+    max_score = ' '.join(f'WHEN a.score_{s} > 0 THEN {s}' for s in range(5, -1, -1))
+    
+    return f"""
+        WITH buckets AS (
+            SELECT generate_series(
+                date_trunc(%(granularity)s, %(date_from)s::date),
+                date_trunc(%(granularity)s, %(date_to)s::date),
+                ('1 ' || %(granularity)s)::interval
+            )::date as bucket_start
+        ),
+        aggregated AS (
+            SELECT date_trunc(%(granularity)s, r.bucket_start)::date as bucket_start,
+                   SUM(r.score_sum) as score_sum, SUM(r.entry_count) as entry_count, {histogram_sums}
+            FROM t_p45717398_energy_dashboard_pro.energy_rollups r
+            WHERE r.user_id = %(user_id)s
+            AND r.granularity = %(source)s
+            AND r.bucket_start >= date_trunc(%(granularity)s, %(date_from)s::date)
+            AND r.bucket_start <= %(date_to)s::date
+            GROUP BY 1
+        )
+        SELECT b.bucket_start, a.score_sum, a.entry_count,
+               CASE {min_score} END as min_score,
+               CASE {max_score} END as max_score
+        FROM buckets b
+        LEFT JOIN aggregated a ON a.bucket_start = b.bucket_start AND a.entry_count > 0
+        ORDER BY b.bucket_start
+    """, {
+        'granularity': granularity,
+        'source': source,
+        'user_id': user_id,
+        'date_from': date_from,
+        'date_to': date_to
+    }
+
+def fetch_series(cur, user_id: int, granularity: str, date_from: date, date_to: date) -> list:
+    """Временной ряд по периодам из energy_rollups, пустые периоды заполняются generate_series"""
+    cur.execute(*series_query(user_id, granularity, date_from, date_to))
+    
+    return [
+        {
+            'start': row['bucket_start'].isoformat(),
+            'average': round(float(row['score_sum']) / float(row['entry_count']), 2) if row['entry_count'] else None,
+            'count': int(row['entry_count'] or 0),
+            'min': row['min_score'],
+            'max': row['max_score']
+        }
+        for row in cur.fetchall()
+    ]
+
+def search_query(user_id: int, query: str, filters: Dict[str, Any], after, limit: int):
+    """SQL и параметры поиска: страница из limit + 1 строк по (rank, entry_date)"""
+    conditions = ['e.user_id = %(user_id)s', 'e.thoughts_tsv @@ q.query']
+    if filters.get('date_from'):
+        conditions.append('e.entry_date >= %(date_from)s')
+    if filters.get('date_to'):
+        conditions.append('e.entry_date <= %(date_to)s')
+    if filters.get('min_score') is not None:
+        conditions.append('e.score >= %(min_score)s')
+    if filters.get('max_score') is not None:
+        conditions.append('e.score <= %(max_score)s')
+    # Ранг округляется до numeric, чтобы курсор сравнивался точно, без погрешности real
+    ranked = "round(ts_rank_cd(e.thoughts_tsv, q.query)::numeric, 6)"
+    if after:
+        conditions.append(f'({ranked}, e.entry_date) < (%(after_rank)s, %(after_date)s)')
+    
+    # ts_headline дорогой, поэтому строится только для строк страницы
+    return f"""
+        WITH q AS (SELECT websearch_to_tsquery('russian', %(query)s) as query),
+        page AS (
+            SELECT e.id, e.entry_date, e.score, e.thoughts, e.tags, {ranked} as rank
+            FROM energy_entries e, q
+            WHERE {' AND '.join(conditions)}
+            ORDER BY rank DESC, e.entry_date DESC
+            LIMIT %(limit)s
+        )
+        SELECT p.id, p.entry_date as date, p.score, p.tags, p.rank,
+               ts_headline('russian', p.thoughts, q.query, %(headline)s) as snippet
+        FROM page p, q
+        ORDER BY p.rank DESC, p.entry_date DESC
+    """, {
+        'user_id': user_id,
+        'query': query,
+        'date_from': filters.get('date_from'),
+        'date_to': filters.get('date_to'),
+        'min_score': filters.get('min_score'),
+        'max_score': filters.get('max_score'),
+        'after_rank': after[0] if after else None,
+        'after_date': after[1] if after else None,
+        'limit': limit + 1,
+        'headline': SEARCH_HEADLINE_OPTIONS
+    }
+
+def search_entries(cur, user_id: int, query: str, filters: Dict[str, Any], after, limit: int):
+    """Полнотекстовый поиск по мыслям с ранжированием и keyset-пагинацией по (rank, entry_date)"""
+    cur.execute(*search_query(user_id, query, filters, after, limit))
+    rows = cur.fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(rows[-1]['rank'], rows[-1]['date'])
+    
+    results = [
+        {
+            'id': row['id'],
+            'date': row['date'].isoformat(),
+            'score': row['score'],
+            'tags': row['tags'] or [],
+            'rank': float(row['rank']),
+            'snippet': row['snippet']
+        }
+        for row in rows
+    ]
+    return results, next_cursor
+
+def plan_samples(user_id: int) -> Dict[str, Any]:
+    """Динамические запросы функции с типичными параметрами для проверки планов
+    (python db.py --check-plans USER_ID и тесты на засеянной базе)"""
+    today = date.today()
+    since = today - timedelta(days=ANALYTICS_LOOKBACK_DAYS)
+    columns = 'id, entry_date as date, score, thoughts, tags, created_at, updated_at'
+    no_tags = ([], [])
+    any_tags = tag_conditions(['работа', 'спорт'], [])
+    all_tags = tag_conditions([], ['работа'])
+    changed, deleted = changes_queries(user_id, datetime.now() - timedelta(days=1))
+    return {
+        'listing_range': listing_query(
+            user_id, columns, today - timedelta(days=30), today, None, no_tags, DEFAULT_PAGE_SIZE + 1
+        ),
+        'listing_cursor': listing_query(
+            user_id, columns, None, None, today - timedelta(days=90), no_tags, DEFAULT_PAGE_SIZE + 1
+        ),
+        'listing_any_tags': listing_query(user_id, columns, None, None, None, any_tags, None),
+        'listing_all_tags': listing_query(user_id, columns, None, None, None, all_tags, None),
+        'stats_totals_any_tags': tagged_totals_query(user_id, any_tags),
+        'stats_totals_all_tags': tagged_totals_query(user_id, all_tags),
+        'stats_series_any_tags': tagged_series_query(user_id, since, today, any_tags),
+        'stats_series_all_tags': tagged_series_query(user_id, since, today, all_tags),
+        'search': search_query(user_id, 'работа', {}, None, DEFAULT_PAGE_SIZE),
+        'search_filtered_page': search_query(
+            user_id, 'работа', {'date_from': since, 'min_score': 3}, (Decimal('0.1'), today), DEFAULT_PAGE_SIZE
+        ),
+        'series_day': series_query(user_id, 'day', today - SERIES_DEFAULT_SPAN['day'], today),
+        'series_year': series_query(user_id, 'year', today - timedelta(days=MAX_SERIES_DAYS), today),
+        'delta_changed': changed,
+        'delta_deleted': deleted
+    }
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Main handler for energy entries API with 14-day rolling stats"""
     method: str = event.get('httpMethod', 'GET')
@@ -48,7 +638,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -60,238 +650,401 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Требуется авторизация'})
+            'body': dumps({'error': 'Требуется авторизация'})
         }
     
-    payload = verify_jwt(auth_header)
+    payload = verify_token(auth_header)
     
     if not payload:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Невалидный токен'})
+            'body': dumps({'error': 'Невалидный токен'})
         }
     
     user_id = payload['user_id']
     
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        if method == 'GET' and (event.get('queryStringParameters') or {}).get('view') not in CACHING_VIEWS:
+            conn = get_read_connection(user_id)
+        else:
+            conn = get_connection()
+        from psycopg2.extras import RealDictCursor
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
-            cur.execute("""
-                SELECT id, entry_date as date, score, thoughts, tags, created_at, updated_at
-                FROM energy_entries
-                WHERE user_id = %s
-                ORDER BY entry_date DESC
-            """, (user_id,))
+            params = event.get('queryStringParameters') or {}
             
-            entries = cur.fetchall()
+            try:
+                since = parse_sync_token(params.get('since'))
+                date_from = parse_date(params.get('from'))
+                date_to = parse_date(params.get('to'))
+                view = params.get('view')
+                # У поиска собственный формат курсора
+                cursor_date = decode_cursor(params.get('cursor')) if view != 'search' else None
+                # Список отдаётся страницами; вся история одним ответом — только по явному all=1
+                paginate = params.get('all') != '1'
+                limit = int(params.get('limit') or DEFAULT_PAGE_SIZE)
+                any_tags = parse_tags(params.get('anyTags'))
+                all_tags = parse_tags(params.get('allTags'))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Неверные параметры запроса'})
+                }
             
-            entries_list = []
-            for entry in entries:
-                entry_date = entry['date']
-                if isinstance(entry_date, str):
-                    dt = datetime.strptime(entry_date, '%Y-%m-%d')
-                else:
-                    dt = entry_date
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+            
+            # Тело ответа определяется версией данных, датой и параметрами запроса
+            version, today = fetch_data_version(cur, user_id, 'entries')
+            etag = make_etag('entries', user_id, version, today, sorted(params.items()))
+            cached = not_modified(event, etag)
+            if cached:
+                cur.close()
+                conn.close()
+                return cached
+            
+            if view == 'forecast':
+                forecast = load_forecast(conn, user_id)
+                conn.commit()
                 
-                tags_data = entry.get('tags')
-                if isinstance(tags_data, str):
-                    tags_list = json.loads(tags_data) if tags_data else []
-                elif tags_data is None:
-                    tags_list = []
-                else:
-                    tags_list = tags_data
+                cur.close()
+                conn.close()
                 
-                entries_list.append({
-                    'id': entry['id'],
-                    'date': dt.strftime('%Y-%m-%d'),
-                    'score': entry['score'],
-                    'thoughts': entry['thoughts'] or '',
-                    'tags': tags_list,
-                    'createdAt': entry['created_at'].isoformat() if entry.get('created_at') else None,
-                    'updatedAt': entry['updated_at'].isoformat() if entry.get('updated_at') else None
-                })
+                return with_etag({
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps(forecast)
+                }, etag)
+            
+            if view == 'insights':
+                insights = load_insights(conn, user_id)
+                conn.commit()
+                
+                cur.close()
+                conn.close()
+                
+                return with_etag({
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps(insights)
+                }, etag)
             
-            if len(entries_list) > 0:
-                total = len(entries_list)
-                avg_score = sum(e['score'] for e in entries_list) / total
-                good = sum(1 for e in entries_list if e['score'] >= 4)
-                neutral = sum(1 for e in entries_list if e['score'] == 3)
-                bad = sum(1 for e in entries_list if e['score'] <= 2)
+            if view == 'tags':
+                suggestions_limit = min(limit, MAX_TAG_SUGGESTIONS) if 'limit' in params else DEFAULT_TAG_SUGGESTIONS
+                prefix = (params.get('prefix') or '').strip()[:MAX_TAG_LENGTH]
+                
+                suggestions = suggest_tags(cur, user_id, prefix, suggestions_limit)
+                
+                cur.close()
+                conn.close()
+                
+                return with_etag({
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'prefix': prefix, 'tags': suggestions})
+                }, etag)
+            
+            if view == 'search':
+                query = (params.get('q') or '').strip()
+                try:
+                    search_cursor = decode_search_cursor(params.get('cursor'))
+                    filters = {
+                        'date_from': date_from,
+                        'date_to': date_to,
+                        'min_score': int(params['minScore']) if params.get('minScore') else None,
+                        'max_score': int(params['maxScore']) if params.get('maxScore') else None
+                    }
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'Неверные параметры запроса'})
+                    }
+                if not query or len(query) > MAX_SEARCH_QUERY_LENGTH:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': f'Неверный поисковый запрос (до {MAX_SEARCH_QUERY_LENGTH} символов)'})
+                    }
+                
+                results, next_cursor = search_entries(
+                    cur, user_id, query, filters, search_cursor, limit if paginate else DEFAULT_PAGE_SIZE
+                )
+                
+                cur.close()
+                conn.close()
+                
+                return with_etag({
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({
+                        'query': query,
+                        'results': results,
+                        'nextCursor': next_cursor
+                    })
+                }, etag)
+            
+            if view == 'series':
+                granularity = params.get('granularity', 'day')
+                if granularity not in SERIES_DEFAULT_SPAN:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'granularity должен быть day, week, month или year'})
+                    }
+                
+                series_to = date_to or date.today()
+                series_from = date_from or series_to - SERIES_DEFAULT_SPAN[granularity]
+                if series_from > series_to or (series_to - series_from).days > MAX_SERIES_DAYS:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'Неверный диапазон дат'})
+                    }
+                
+                buckets = fetch_series(cur, user_id, granularity, series_from, series_to)
+                
+                cur.close()
+                conn.close()
+                
+                return with_etag({
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({
+                        'granularity': granularity,
+                        'from': series_from.isoformat(),
+                        'to': series_to.isoformat(),
+                        'buckets': buckets
+                    })
+                }, etag)
+            
+            # Метка синхронизации берётся до чтения, чтобы не пропустить параллельные записи
+            sync_token = issue_sync_token(cur)
+            
+            # Если метка старше хранимых tombstone, клиент получает полный список (без ключа deleted)
+            if since and since >= sync_token - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+                changed, deleted = fetch_changes(cur, user_id, since)
+                stats_object = fetch_stats(cur, user_id)
+                
+                cur.close()
+                conn.close()
+                
+                return with_etag({
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({
+                        'entries': changed,
+                        'deleted': deleted,
+                        'stats': stats_object,
+                        'syncToken': sync_token.isoformat()
+                    })
+                }, etag)
+            
+            tag_filter = tag_conditions(any_tags, all_tags)
+            
+            columnar = params.get('format') == 'columnar'
+            if columnar:
+                # Колоночный режим читает только запрошенные колонки
+                fields = [f for f in (params.get('fields') or '').split(',') if f in COLUMNAR_OPTIONAL_FIELDS]
+                columns = ', '.join(['entry_date as date', 'score'] + fields)
             else:
-                total = 0
-                avg_score = 0
-                good = 0
-                neutral = 0
-                bad = 0
-            
-            # Статистика за последние 14 дней
-            cur.execute("""
-                SELECT AVG(score) as avg_14, COUNT(*) as count_14
-                FROM energy_entries
-                WHERE user_id = %s 
-                AND entry_date >= CURRENT_DATE - INTERVAL '14 days'
-            """, (user_id,))
-            fourteen_days_stats = cur.fetchone()
-            avg_14_days = float(fourteen_days_stats['avg_14']) if fourteen_days_stats['avg_14'] else 0
-            count_14_days = fourteen_days_stats['count_14'] or 0
-            
-            # Статистика за текущий месяц
-            cur.execute("""
-                SELECT AVG(score) as avg_month, COUNT(*) as count_month
-                FROM energy_entries
-                WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM entry_date) = EXTRACT(YEAR FROM CURRENT_DATE)
-                AND EXTRACT(MONTH FROM entry_date) = EXTRACT(MONTH FROM CURRENT_DATE)
-            """, (user_id,))
-            month_stats = cur.fetchone()
-            avg_current_month = float(month_stats['avg_month']) if month_stats['avg_month'] else 0
-            count_current_month = month_stats['count_month'] or 0
+                columns = 'id, entry_date as date, score, thoughts, tags, created_at, updated_at'
+            
+            filtered = date_from or date_to or cursor_date or tag_filter[0]
+            if not filtered and not paginate and not columnar:
+                # Полный список без фильтров по all=1
+                LIST_ENTRIES.execute(cur, user_id)
+            else:
+                cur.execute(*listing_query(
+                    user_id, columns, date_from, date_to, cursor_date, tag_filter, limit + 1 if paginate else None
+                ))
+            
+            entries = cur.fetchall()
+            
+            next_cursor = None
+            if paginate and len(entries) > limit:
+                entries = entries[:limit]
+                next_cursor = encode_cursor(entries[-1]['date'])
+            
+            # Статистика считается отдельным запросом и не зависит от размера страницы
+            stats_object = fetch_stats(cur, user_id, tag_filter)
             
             cur.close()
             conn.close()
             
-            stats_object = {
-                'good': good,
-                'neutral': neutral,
-                'bad': bad,
-                'average': round(avg_score, 2),
-                'total': total,
-                'last14Days': {
-                    'average': round(avg_14_days, 2),
-                    'count': count_14_days
-                },
-                'currentMonth': {
-                    'average': round(avg_current_month, 2),
-                    'count': count_current_month
-                }
-            }
+            if columnar:
+                body = serialize_columnar(entries, fields)
+                body.update({
+                    'stats': stats_object,
+                    'nextCursor': next_cursor,
+                    'syncToken': sync_token.isoformat()
+                })
+                return with_etag({
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps(body, separators=(',', ':'))
+                }, etag)
             
-            print(f"[DEBUG] Stats object: {json.dumps(stats_object)}")
+            entries_list = [serialize_entry(entry) for entry in entries]
             
-            return {
+            return with_etag({
                 'statusCode': 200,
                 'headers': {
                     'Content-Type': 'application/json', 
                     'Access-Control-Allow-Origin': '*',
                     'X-Function-Version': '2.1.0'
                 },
-                'body': json.dumps({
+                'body': dumps({
                     'entries': entries_list,
                     'stats': stats_object,
+                    'nextCursor': next_cursor,
+                    'syncToken': sync_token.isoformat(),
                     '_version': '2.1.0'
                 })
-            }
+            }, etag)
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
             
-            date_str = body_data.get('date', '')
-            score = body_data.get('score')
-            thoughts = body_data.get('thoughts', '')
-            category = body_data.get('category', '')
-            tags = body_data.get('tags', [])
-            
-            if not date_str or score is None:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Дата и оценка обязательны'})
-                }
-            
-            if not (1 <= score <= 5):
+            # Пакетный режим: {"entries": [{date, score, thoughts, tags}, ...]}
+            if 'entries' in body_data:
+                items = body_data.get('entries')
+                if not isinstance(items, list) or not items:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'entries должен быть непустым массивом'})
+                    }
+                if len(items) > MAX_BATCH_SIZE:
+                    return {
+                        'statusCode': 413,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': f'Не больше {MAX_BATCH_SIZE} записей за запрос'})
+                    }
+                
+                # Сначала валидируем всё, ничего не записывая
+                validated = []
+                errors = []
+                seen_dates = set()
+                for index, item in enumerate(items):
+                    try:
+                        entry_input = validate_entry(item)
+                        if entry_input['date'] in seen_dates:
+                            raise ValueError('Дата повторяется в пакете')
+                        seen_dates.add(entry_input['date'])
+                        validated.append(entry_input)
+                    except ValueError as e:
+                        errors.append({'index': index, 'error': str(e)})
+                
+                if errors:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'Пакет содержит некорректные записи', 'errors': errors})
+                    }
+                
+                saved = upsert_entries(cur, user_id, validated)
+                conn.commit()
+                mark_written(user_id)
+                
+                cur.close()
+                conn.close()
+                
+                results = []
+                for index, entry_input in enumerate(validated):
+                    entry = saved[entry_input['date']]
+                    results.append({
+                        'index': index,
+                        'status': 'created' if entry['inserted'] else 'updated',
+                        'entry': serialize_entry(entry)
+                    })
+                
                 return {
-                    'statusCode': 400,
+                    'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Оценка должна быть от 1 до 5'})
+                    'body': dumps({'results': results})
                 }
             
             try:
-                if '.' in date_str:
-                    parts = date_str.split('.')
-                    db_date = f"{parts[2]}-{parts[1]}-{parts[0]}"
-                else:
-                    db_date = date_str
-            except Exception:
+                entry_input = validate_entry(body_data)
+            except ValueError as e:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Неверный формат даты'})
+                    'body': dumps({'error': str(e)})
                 }
             
-            tags_json = json.dumps(tags)
-            
-            cur.execute("""
-                INSERT INTO energy_entries (user_id, entry_date, score, thoughts, tags)
-                VALUES (%s, %s, %s, %s, %s::jsonb)
-                ON CONFLICT (user_id, entry_date) 
-                DO UPDATE SET score = EXCLUDED.score, thoughts = EXCLUDED.thoughts, 
-                              tags = EXCLUDED.tags,
-                              updated_at = CURRENT_TIMESTAMP
-                RETURNING id, entry_date, score, thoughts, tags
-            """, (user_id, db_date, score, thoughts, tags_json))
-            
-            entry = cur.fetchone()
-            
-            if tags:
-                for tag in tags:
-                    cur.execute("""
-                        INSERT INTO tag_analytics (entry_id, tag, score, entry_date, user_id)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (entry['id'], tag, score, db_date, user_id))
-            
+            saved = upsert_entries(cur, user_id, [entry_input])
             conn.commit()
-            
-            entry_date = entry['entry_date']
-            if isinstance(entry_date, str):
-                dt = datetime.strptime(entry_date, '%Y-%m-%d')
-            else:
-                dt = entry_date
-            
-            tags_data = entry.get('tags')
-            if isinstance(tags_data, str):
-                tags_list = json.loads(tags_data) if tags_data else []
-            elif tags_data is None:
-                tags_list = []
-            else:
-                tags_list = tags_data
+            mark_written(user_id)
             
             cur.close()
             conn.close()
             
+            entry = serialize_entry(saved[entry_input['date']])
+            
             return {
                 'statusCode': 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
+                'body': dumps({
                     'id': entry['id'],
-                    'date': dt.strftime('%Y-%m-%d'),
+                    'date': entry['date'],
                     'score': entry['score'],
-                    'thoughts': entry['thoughts'] or '',
-                    'tags': tags_list
+                    'thoughts': entry['thoughts'],
+                    'tags': entry['tags']
                 })
             }
         
         elif method == 'DELETE':
-            params = event.get('queryStringParameters', {})
+            params = event.get('queryStringParameters') or {}
             entry_id = params.get('id')
             
-            if not entry_id:
+            if not entry_id or not str(entry_id).isdigit():
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'ID записи обязателен'})
+                    'body': dumps({'error': 'ID записи обязателен'})
                 }
             
-            cur.execute("""
-                DELETE FROM energy_entries
-                WHERE id = %s AND user_id = %s
-                RETURNING id
-            """, (entry_id, user_id))
+            try:
+                entry_date = parse_date(params.get('date'))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Неверный формат даты'})
+                }
+            if entry_date is None:
+                # Без даты секция записи неизвестна, и id ищется в каждой годовой секции
+                cur.execute("""
+                    SELECT entry_date FROM energy_entries
+                    WHERE id = %s AND user_id = %s
+                """, (entry_id, user_id))
+                found = cur.fetchone()
+                entry_date = found['entry_date'] if found else None
             
-            deleted = cur.fetchone()
+            deleted = None
+            if entry_date is not None:
+                # С датой удаление читает одну секцию
+                cur.execute("""
+                    DELETE FROM energy_entries
+                    WHERE id = %s AND user_id = %s AND entry_date = %s
+                    RETURNING id, entry_date, score, tags
+                """, (entry_id, user_id, entry_date))
+                deleted = cur.fetchone()
+            if deleted:
+                apply_rollup_changes(cur, user_id, [(deleted['entry_date'], deleted['score'], None)])
+                record_deletion(cur, user_id, deleted['id'], deleted['entry_date'])
+                apply_streak_changes(cur, user_id, removed=[deleted['entry_date']])
+                apply_risk_changes(cur, user_id, [(deleted['entry_date'], deleted['score'], None)])
+                apply_tag_changes(cur, user_id, entry_tag_changes(
+                    deleted['entry_date'], deleted['tags'], deleted['score'], None, None
+                ))
+                bump_data_version(cur, user_id, 'entries')
             conn.commit()
+            mark_written(user_id)
             
             cur.close()
             conn.close()
@@ -300,24 +1053,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 return {
                     'statusCode': 404,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Запись не найдена'})
+                    'body': dumps({'error': 'Запись не найдена'})
                 }
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Запись удалена'})
+                'body': dumps({'message': 'Запись удалена'})
             }
         
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'})
+            'body': dumps({'error': 'Метод не поддерживается'})
         }
     
     except Exception as e:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Ошибка сервера: {str(e)}'})
+            'body': dumps({'error': f'Ошибка сервера: {str(e)}'})
         }
\ No newline at end of file
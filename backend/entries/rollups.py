@@ -0,0 +1,55 @@
+'''
+Business: Инкрементальное обновление агрегатов energy_rollups (день / неделя / месяц)
+Args: cur - курсор открытой транзакции, изменения оценок пользователя
+Returns: None, агрегаты обновляются в той же транзакции, что и запись
+'''
+from typing import Iterable, Optional, Tuple
+
+ROLLUP_GRANULARITIES = ('day', 'week', 'month')
+HISTOGRAM_SCORES = range(0, 6)
+
+# (дата записи, старая оценка или None, новая оценка или None)
+ScoreChange = Tuple[str, Optional[int], Optional[int]]
+
+
+def _histogram_delta(score: int) -> str:
+    return (
+        f"SUM(CASE WHEN c.new_score = {score} THEN 1 ELSE 0 END"
+        f" - CASE WHEN c.old_score = {score} THEN 1 ELSE 0 END)"
+    )
+
+
+def apply_rollup_changes(cur, user_id: int, changes: Iterable[ScoreChange]) -> None:
+    """Применение изменений оценок к агрегатам одним запросом для всех периодов"""
+    changes = [c for c in changes if c[1] != c[2]]
+    if not changes:
+        return
+
+    histogram_columns = ', '.join(f'score_{s}' for s in HISTOGRAM_SCORES)
+    histogram_deltas = ',\n               '.join(_histogram_delta(s) for s in HISTOGRAM_SCORES)
+    histogram_updates = ',\n            '.join(
+        f'score_{s} = r.score_{s} + EXCLUDED.score_{s}' for s in HISTOGRAM_SCORES
+    )
+
+    cur.execute(f"""
+        INSERT INTO t_p45717398_energy_dashboard_pro.energy_rollups AS r
+            (user_id, granularity, bucket_start, score_sum, entry_count, {histogram_columns})
+        SELECT %s, g.granularity, date_trunc(g.granularity, c.entry_date)::date,
+               SUM(COALESCE(c.new_score, 0) - COALESCE(c.old_score, 0)),
+               SUM((c.new_score IS NOT NULL)::int - (c.old_score IS NOT NULL)::int),
+               {histogram_deltas}
+        FROM unnest(%s::date[], %s::int[], %s::int[]) AS c(entry_date, old_score, new_score)
+        CROSS JOIN unnest(%s::varchar[]) AS g(granularity)
+        GROUP BY g.granularity, date_trunc(g.granularity, c.entry_date)
+        ON CONFLICT (user_id, granularity, bucket_start) DO UPDATE SET
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            entry_count = r.entry_count + EXCLUDED.entry_count,
+            {histogram_updates},
+            updated_at = CURRENT_TIMESTAMP
+    """, (
+        user_id,
+        [str(c[0]) for c in changes],
+        [c[1] for c in changes],
+        [c[2] for c in changes],
+        list(ROLLUP_GRANULARITIES),
+    ))
@@ -0,0 +1,126 @@
+'''
+Business: Серии ежедневного заполнения дневника (текущая, самая длинная, пропущенные дни)
+Args: cur - курсор открытой транзакции, user_id, добавленные и удалённые даты записей
+Returns: состояние серии в user_streaks и его представление для статистики
+'''
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+# Пересчёт по всем записям пользователя методом gaps-and-islands
+RECOMPUTE_SQL = """
+    INSERT INTO t_p45717398_energy_dashboard_pro.user_streaks
+        (user_id, first_date, last_date, current_start, longest_length, total_days, updated_at)
+    WITH days AS (
+        SELECT entry_date,
+               entry_date - (ROW_NUMBER() OVER (ORDER BY entry_date))::int AS island
+        FROM t_p45717398_energy_dashboard_pro.energy_entries
+        WHERE user_id = %(user_id)s
+    ),
+    islands AS (
+        SELECT MIN(entry_date) AS start_date, MAX(entry_date) AS end_date, COUNT(*) AS length
+        FROM days
+        GROUP BY island
+    )
+    SELECT %(user_id)s, MIN(start_date), MAX(end_date),
+           (ARRAY_AGG(start_date ORDER BY end_date DESC))[1],
+           COALESCE(MAX(length), 0), COALESCE(SUM(length), 0), CURRENT_TIMESTAMP
+    FROM islands
+    ON CONFLICT (user_id) DO UPDATE SET
+        first_date = EXCLUDED.first_date,
+        last_date = EXCLUDED.last_date,
+        current_start = EXCLUDED.current_start,
+        longest_length = EXCLUDED.longest_length,
+        total_days = EXCLUDED.total_days,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING first_date, last_date, current_start, longest_length, total_days
+"""
+
+
+def _load(cur, user_id: int) -> Optional[Dict[str, Any]]:
+    cur.execute("""
+        SELECT first_date, last_date, current_start, longest_length, total_days
+        FROM t_p45717398_energy_dashboard_pro.user_streaks
+        WHERE user_id = %s
+        FOR UPDATE
+    """, (user_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+
+def recompute_streak(cur, user_id: int) -> Dict[str, Any]:
+    """Полный пересчёт серии по energy_entries"""
+    cur.execute(RECOMPUTE_SQL, {'user_id': user_id})
+    return dict(cur.fetchone())
+
+
+def apply_streak_changes(
+    cur,
+    user_id: int,
+    added: Iterable[date] = (),
+    removed: Iterable[date] = (),
+) -> None:
+    """O(1)-обновление серии при дозаписи новых дней и удалении последнего, иначе пересчёт"""
+    added = sorted(added)
+    removed = sorted(removed)
+    if not added and not removed:
+        return
+
+    state = _load(cur, user_id)
+    if state is None or state['last_date'] is None:
+        recompute_streak(cur, user_id)
+        return
+
+    for day in added:
+        if day <= state['last_date']:
+            # Вставка в прошлое может склеить серии
+            recompute_streak(cur, user_id)
+            return
+        if day != state['last_date'] + timedelta(days=1):
+            state['current_start'] = day
+        state['last_date'] = day
+        state['total_days'] += 1
+        current_length = (state['last_date'] - state['current_start']).days + 1
+        state['longest_length'] = max(state['longest_length'], current_length)
+
+    for day in removed:
+        current_length = (state['last_date'] - state['current_start']).days + 1
+        # Без пересчёта можно только укоротить текущую серию, если рекорд не она
+        if day != state['last_date'] or current_length <= 1 or state['longest_length'] <= current_length:
+            recompute_streak(cur, user_id)
+            return
+        state['last_date'] = day - timedelta(days=1)
+        state['total_days'] -= 1
+
+    cur.execute("""
+        UPDATE t_p45717398_energy_dashboard_pro.user_streaks
+        SET last_date = %s, current_start = %s, longest_length = %s, total_days = %s,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = %s
+    """, (state['last_date'], state['current_start'], state['longest_length'], state['total_days'], user_id))
+
+
+def fetch_streak(cur, user_id: int, today: date) -> Dict[str, int]:
+    """Текущая и самая длинная серия и пропущенные дни на дату today"""
+    cur.execute("""
+        SELECT first_date, last_date, current_start, longest_length, total_days
+        FROM t_p45717398_energy_dashboard_pro.user_streaks
+        WHERE user_id = %s
+    """, (user_id,))
+    state = cur.fetchone()
+
+    # Строка появляется при первой записи пользователя
+    if state is None or state['last_date'] is None:
+        return {'current': 0, 'longest': 0, 'missedDays': 0}
+
+    # Сегодняшний день ещё не считается пропущенным
+    current = 0
+    if state['last_date'] >= today - timedelta(days=1):
+        current = (state['last_date'] - state['current_start']).days + 1
+    span_end = max(min(state['last_date'], today), today - timedelta(days=1))
+    missed = (span_end - state['first_date']).days + 1 - state['total_days']
+
+    return {
+        'current': current,
+        'longest': state['longest_length'],
+        'missedDays': max(missed, 0)
+    }
@@ -4,11 +4,12 @@ Args: event with httpMethod, context with request_id
 Returns: Latest chat_id from bot updates
 '''
 
-import json
 import os
 from typing import Dict, Any
-import requests
 
+from responses import compressible, dumps
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -30,11 +31,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'error': 'TELEGRAM_BOT_TOKEN not configured'})
+            'body': dumps({'error': 'TELEGRAM_BOT_TOKEN not configured'})
         }
     
     # Get updates from Telegram
     url = f'https://api.telegram.org/bot{bot_token}/getUpdates'
+    import requests
     response = requests.get(url)
     
     if response.status_code != 200:
@@ -42,7 +44,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Failed to get updates from Telegram'})
+            'body': dumps({'error': 'Failed to get updates from Telegram'})
         }
     
     data = response.json()
@@ -53,7 +55,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'message': 'No messages found. Send a message to the bot first.'})
+            'body': dumps({'message': 'No messages found. Send a message to the bot first.'})
         }
     
     # Get the latest message
@@ -66,7 +68,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'isBase64Encoded': False,
-        'body': json.dumps({
+        'body': dumps({
             'chat_id': chat_id,
             'username': username,
             'first_name': first_name,
@@ -6,37 +6,21 @@ Returns: HTTP response dict
 '''
 
 import json
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 from datetime import datetime
-import hashlib
-import base64
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
-JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-key-change-in-production')
+from db import get_connection, get_read_connection, mark_written, prepared
+from responses import compressible, dumps, make_etag, not_modified, with_etag
+from tokens import verify_token
 
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
-    try:
-        decoded = base64.b64decode(token.encode()).decode()
-        payload_str, signature = decoded.split('::')
-        
-        expected_signature = hashlib.sha256(f"{payload_str}{JWT_SECRET}".encode()).hexdigest()
-        
-        if signature != expected_signature:
-            return None
-        
-        payload = json.loads(payload_str)
-        
-        exp_time = datetime.fromisoformat(payload['exp'])
-        if datetime.utcnow() > exp_time:
-            return None
-        
-        return payload
-    except Exception:
-        return None
+GOAL_FOR_MONTH = prepared('goals_for_month', '''
+    SELECT id, year, month, goal_score, created_at, updated_at
+    FROM t_p45717398_energy_dashboard_pro.monthly_goals
+    WHERE user_id = $1 AND year = $2 AND month = $3
+''', ('int', 'int', 'int'))
 
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -46,7 +30,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -59,7 +43,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Токен не предоставлен'}),
+            'body': dumps({'error': 'Токен не предоставлен'}),
             'isBase64Encoded': False
         }
     
@@ -68,7 +52,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Невалидный или истёкший токен'}),
+            'body': dumps({'error': 'Невалидный или истёкший токен'}),
             'isBase64Encoded': False
         }
     
@@ -76,7 +60,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     conn = None
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = get_read_connection(user_id) if method == 'GET' else get_connection()
+        from psycopg2.extras import RealDictCursor
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
@@ -92,11 +77,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 year = int(year)
                 month = int(month)
             
-            cur.execute('''
-                SELECT id, year, month, goal_score, created_at, updated_at
-                FROM t_p45717398_energy_dashboard_pro.monthly_goals
-                WHERE user_id = %s AND year = %s AND month = %s
-            ''', (user_id, year, month))
+            GOAL_FOR_MONTH.execute(cur, user_id, year, month)
             
             goal = cur.fetchone()
             
@@ -112,12 +93,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             else:
                 result = None
             
-            return {
+            etag = make_etag('goals', user_id, year, month, goal['id'] if goal else 'none', result and result['updatedAt'])
+            cached = not_modified(event, etag)
+            if cached:
+                return cached
+            
+            return with_etag({
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(result),
+                'body': dumps(result),
                 'isBase64Encoded': False
-            }
+            }, etag)
         
         elif method == 'POST' or method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
@@ -129,7 +115,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'year, month и goalScore обязательны'}),
+                    'body': dumps({'error': 'year, month и goalScore обязательны'}),
                     'isBase64Encoded': False
                 }
             
@@ -137,7 +123,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'goalScore должен быть от 0 до 5'}),
+                    'body': dumps({'error': 'goalScore должен быть от 0 до 5'}),
                     'isBase64Encoded': False
                 }
             
@@ -154,6 +140,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             goal = cur.fetchone()
             conn.commit()
+            mark_written(user_id)
             
             result = {
                 'id': goal['id'],
@@ -167,14 +154,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(result),
+                'body': dumps(result),
                 'isBase64Encoded': False
             }
         
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'body': dumps({'error': 'Метод не поддерживается'}),
             'isBase64Encoded': False
         }
         
@@ -184,7 +171,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
+            'body': dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
     finally:
@@ -0,0 +1,154 @@
+'''
+Business: Общая обработка HTTP-ответов функций: JSON в UTF-8, сжатие по Accept-Encoding, ETag и 304
+Args: event - входящее событие (заголовки запроса), response - dict ответа обработчика
+Returns: dict ответа, при необходимости с телом gzip/br в base64 и isBase64Encoded=True
+'''
+import base64
+import gzip
+import hashlib
+import json
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Меньшие тела не сжимаем: выигрыш не окупает CPU и base64
+COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(payload: Any, **kwargs) -> str:
+    """json.dumps без \\uXXXX-экранирования кириллицы"""
+    kwargs.setdefault('ensure_ascii', False)
+    return json.dumps(payload, **kwargs)
+
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    """Заголовок запроса без учёта регистра имени"""
+    headers = event.get('headers') or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def _accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in (header or '').split(','):
+        token, _, params = part.strip().partition(';')
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+    return accepted
+
+
+def _choose_encoding(event: Dict[str, Any]) -> Optional[str]:
+    accepted = _accepted_encodings(get_header(event, 'Accept-Encoding'))
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', accepted.get('*', 0)) > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """Сжатие тела ответа, если клиент это поддерживает и тело достаточно большое"""
+    body = response.get('body')
+    if not isinstance(body, str) or response.get('isBase64Encoded'):
+        return response
+
+    headers = dict(response.get('headers') or {})
+    headers['Vary'] = 'Accept-Encoding'
+    response = {**response, 'headers': headers}
+
+    raw = body.encode('utf-8')
+    encoding = _choose_encoding(event)
+    if encoding is None or len(raw) < COMPRESSION_MIN_BYTES:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL)
+
+    headers['Content-Encoding'] = encoding
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    return response
+
+
+def compressible(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]):
+    """Декоратор обработчика функции: сжимает любой возвращённый ответ"""
+    @wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        return compress_response(event, handler(event, context))
+    return wrapper
+
+
+def make_etag(*parts: Any) -> str:
+    """Слабый ETag из версии ресурса и всего, от чего зависит тело ответа"""
+    digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def not_modified(event: Dict[str, Any], etag: str) -> Optional[Dict[str, Any]]:
+    """Ответ 304, если If-None-Match клиента совпадает с текущим ETag"""
+    header = get_header(event, 'If-None-Match')
+    if not header:
+        return None
+    candidates = [c.strip() for c in header.split(',')]
+    bare = etag[2:] if etag.startswith('W/') else etag
+    if '*' not in candidates and etag not in candidates and bare not in candidates:
+        return None
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def with_etag(response: Dict[str, Any], etag: str) -> Dict[str, Any]:
+    """Добавление ETag к ответу, чтобы клиент мог прислать If-None-Match"""
+    headers = dict(response.get('headers') or {})
+    headers['ETag'] = etag
+    headers['Cache-Control'] = 'private, no-cache'
+    headers['Access-Control-Expose-Headers'] = 'ETag'
+    return {**response, 'headers': headers}
+
+
+if __name__ == '__main__':
+    import timeit
+
+    # Год записей, как в ответе GET entries без пагинации
+    sample = {'statusCode': 200, 'headers': {}, 'isBase64Encoded': False, 'body': dumps({'entries': [
+        {'id': i, 'date': f'2024-01-{i % 28 + 1:02d}', 'score': i % 5 + 1,
+         'thoughts': 'Сегодня было много работы, вечером прогулка', 'tags': ['работа', 'прогулка']}
+        for i in range(365)
+    ]})}
+    runs = 200
+    raw = len(sample['body'].encode('utf-8'))
+    for encoding in ('gzip', 'br'):
+        if encoding == 'br' and brotli is None:
+            continue
+        event = {'headers': {'Accept-Encoding': encoding}}
+        elapsed = timeit.timeit(lambda: compress_response(event, sample), number=runs)
+        sent = len(compress_response(event, sample)['body'])
+        print(f'{encoding}: {raw} -> {sent} bytes (base64), {elapsed / runs * 1e3:.3f} ms/response')
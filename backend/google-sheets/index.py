@@ -1,9 +1,11 @@
-import json
 import os
 from typing import Dict, Any, List
 import urllib.request
 import urllib.parse
 
+from responses import compressible, dumps
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Получает данные из Google Sheets и возвращает их в формате JSON
@@ -29,7 +31,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 405,
             'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': dumps({'error': 'Method not allowed'})
         }
     
     sheet_url = os.environ.get('GOOGLE_SHEET_URL', '').strip()
@@ -64,7 +66,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
+            'body': dumps({
                 'entries': demo_entries,
                 'stats': demo_stats,
                 'demo': True
@@ -91,7 +93,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'entries': [], 'stats': {}})
+                'body': dumps({'entries': [], 'stats': {}})
             }
         
         print(f'Total CSV lines: {len(lines)}')
@@ -184,7 +186,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Access-Control-Allow-Origin': '*'
             },
             'isBase64Encoded': False,
-            'body': json.dumps({
+            'body': dumps({
                 'entries': entries,
                 'stats': stats
             }, ensure_ascii=False)
@@ -220,7 +222,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
+            'body': dumps({
                 'entries': demo_entries,
                 'stats': demo_stats,
                 'demo': True,
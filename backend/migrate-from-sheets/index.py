@@ -3,14 +3,15 @@
 Читает все записи из таблицы и переносит их в базу данных
 '''
 
-import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
 import urllib.request
 from typing import Dict, Any, List
 from datetime import datetime
 
+from db import DATABASE_URL, get_connection
+from responses import compressible, dumps
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -31,18 +32,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Only POST method allowed'}),
+            'body': dumps({'error': 'Only POST method allowed'}),
             'isBase64Encoded': False
         }
     
-    DATABASE_URL = os.environ.get('DATABASE_URL')
     GOOGLE_SHEET_URL = os.environ.get('GOOGLE_SHEET_URL')
     
     if not DATABASE_URL:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'DATABASE_URL not configured'}),
+            'body': dumps({'error': 'DATABASE_URL not configured'}),
             'isBase64Encoded': False
         }
     
@@ -50,7 +50,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'GOOGLE_SHEET_URL not configured'}),
+            'body': dumps({'error': 'GOOGLE_SHEET_URL not configured'}),
             'isBase64Encoded': False
         }
     
@@ -68,7 +68,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Google Sheet is empty or has no data'}),
+                'body': dumps({'error': 'Google Sheet is empty or has no data'}),
                 'isBase64Encoded': False
             }
         
@@ -111,11 +111,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'No valid entries found in Google Sheet'}),
+                'body': dumps({'error': 'No valid entries found in Google Sheet'}),
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = get_connection()
+        from psycopg2.extras import RealDictCursor
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         inserted_count = 0
@@ -141,7 +142,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
+            'body': dumps({
                 'success': True,
                 'inserted': inserted_count,
                 'updated': updated_count,
@@ -156,7 +157,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
+            'body': dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
     
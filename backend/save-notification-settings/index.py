@@ -1,8 +1,10 @@
 import json
-import os
-import psycopg2
 from typing import Dict, Any
 
+from db import get_connection
+from responses import compressible, dumps
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Save user notification settings to database
@@ -27,7 +29,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': dumps({'error': 'Method not allowed'})
         }
     
     body_data = json.loads(event.get('body', '{}'))
@@ -41,12 +43,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'userId is required'})
+            'body': dumps({'error': 'userId is required'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    
-    conn = psycopg2.connect(dsn)
+    conn = get_connection()
     cur = conn.cursor()
     
     cur.execute(
@@ -62,5 +62,5 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'isBase64Encoded': False,
-        'body': json.dumps({'success': True})
+        'body': dumps({'success': True})
     }
\ No newline at end of file
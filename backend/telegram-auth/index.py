@@ -6,31 +6,20 @@ Returns: HTTP response dict с JWT токеном или ошибкой
 '''
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime, timedelta
 import hashlib
 import hmac
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 
-JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-key-change-in-production')
-DATABASE_URL = os.environ.get('DATABASE_URL')
-TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
+from db import get_connection, prepared
+from responses import compressible, dumps
+from tokens import create_token
 
-def create_jwt(user_id: int, email: str) -> str:
-    """Создание простого JWT токена"""
-    payload = {
-        'user_id': user_id,
-        'email': email,
-        'exp': (datetime.utcnow() + timedelta(days=30)).isoformat()
-    }
-    
-    payload_str = json.dumps(payload)
-    signature = hashlib.sha256(f"{payload_str}{JWT_SECRET}".encode()).hexdigest()
-    
-    token = f"{payload_str}::{signature}"
-    import base64
-    return base64.b64encode(token.encode()).decode()
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
+USER_BY_EMAIL = prepared(
+    'telegram_user_by_email',
+    "SELECT id, email, full_name FROM t_p45717398_energy_dashboard_pro.users WHERE email = $1",
+    ('varchar',)
+)
 
 def verify_telegram_auth(data: Dict[str, str]) -> bool:
     """Проверка подписи данных от Telegram"""
@@ -49,6 +38,7 @@ def verify_telegram_auth(data: Dict[str, str]) -> bool:
     
     return calculated_hash == check_hash
 
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -69,7 +59,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
     
@@ -92,7 +82,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Недостаточно данных от Telegram'}),
+                'body': dumps({'error': 'Недостаточно данных от Telegram'}),
                 'isBase64Encoded': False
             }
         
@@ -100,20 +90,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 401,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Неверная подпись Telegram'}),
+                'body': dumps({'error': 'Неверная подпись Telegram'}),
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = get_connection()
+        from psycopg2.extras import RealDictCursor
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         email = f"telegram_{telegram_id}@energy.app"
         full_name = f"{first_name} {last_name}".strip() or username or f"User {telegram_id}"
         
-        cur.execute(
-            "SELECT id, email, full_name FROM t_p45717398_energy_dashboard_pro.users WHERE email = %s",
-            (email,)
-        )
+        USER_BY_EMAIL.execute(cur, email)
         user = cur.fetchone()
         
         if user:
@@ -133,7 +121,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             user = cur.fetchone()
             conn.commit()
         
-        token = create_jwt(user['id'], user['email'])
+        token = create_token(user['id'], user['email'])
         
         cur.close()
         conn.close()
@@ -141,7 +129,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
+            'body': dumps({
                 'token': token,
                 'user': {
                     'id': user['id'],
@@ -156,6 +144,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Ошибка сервера: {str(e)}'}),
+            'body': dumps({'error': f'Ошибка сервера: {str(e)}'}),
             'isBase64Encoded': False
         }
\ No newline at end of file
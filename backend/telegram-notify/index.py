@@ -4,6 +4,9 @@ from typing import Dict, Any
 import urllib.request
 import urllib.parse
 
+from responses import compressible, dumps
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Отправка уведомлений в Telegram
@@ -30,7 +33,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': dumps({'error': 'Method not allowed'})
         }
     
     bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
@@ -39,7 +42,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'error': 'TELEGRAM_BOT_TOKEN not configured'})
+            'body': dumps({'error': 'TELEGRAM_BOT_TOKEN not configured'})
         }
     
     try:
@@ -52,7 +55,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'isBase64Encoded': False,
-                'body': json.dumps({'error': 'chat_id is required'})
+                'body': dumps({'error': 'chat_id is required'})
             }
         
         telegram_url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
@@ -76,7 +79,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'success': True, 'message_id': result.get('result', {}).get('message_id')})
+            'body': dumps({'success': True, 'message_id': result.get('result', {}).get('message_id')})
         }
         
     except Exception as e:
@@ -84,5 +87,5 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
+            'body': dumps({'error': str(e)})
         }
@@ -4,11 +4,12 @@ Args: event with httpMethod
 Returns: User data from database
 '''
 
-import json
-import os
-import psycopg2
 from typing import Dict, Any
 
+from db import get_read_connection
+from responses import compressible, dumps
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -24,9 +25,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    
-    conn = psycopg2.connect(dsn)
+    conn = get_read_connection()
     cur = conn.cursor()
     
     cur.execute("""
@@ -52,5 +51,5 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'isBase64Encoded': False,
-        'body': json.dumps(result, ensure_ascii=False, indent=2)
+        'body': dumps(result, ensure_ascii=False, indent=2)
     }
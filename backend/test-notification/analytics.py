@@ -0,0 +1,102 @@
+'''
+Business: Скользящие окна по ряду оценок пользователя (средние, волатильность, лучшие и худшие периоды)
+Args: series - пары (дата, оценка), end - последний день анализа, windows - длины окон в днях
+Returns: dict длина окна -> статистика окна
+'''
+from datetime import date, timedelta
+from itertools import accumulate
+from math import sqrt
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+DEFAULT_WINDOWS = (7, 14, 30, 90)
+# Окно участвует в поиске лучшего/худшего периода, если заполнено хотя бы наполовину
+MIN_WINDOW_COVERAGE = 0.5
+
+
+def _window(prefix_sum, prefix_sq, prefix_count, lo: int, hi: int) -> Tuple[int, int, int]:
+    """Сумма, сумма квадратов и число записей на отрезке [lo, hi) по префиксным суммам"""
+    lo = max(lo, 0)
+    return (
+        prefix_sum[hi] - prefix_sum[lo],
+        prefix_sq[hi] - prefix_sq[lo],
+        prefix_count[hi] - prefix_count[lo],
+    )
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def rolling_windows(
+    series: Iterable[Tuple[date, int]],
+    end: date,
+    windows: Sequence[int] = DEFAULT_WINDOWS,
+) -> Dict[int, Dict[str, Any]]:
+    """Все окна за один проход: префиксные суммы по плотному ряду дней до end включительно"""
+    points = [(d, s) for d, s in series if d <= end]
+    longest = max(windows)
+    start = min([d for d, _ in points] + [end - timedelta(days=longest - 1)])
+    days = (end - start).days + 1
+
+    scores = [0] * days
+    logged = [0] * days
+    for entry_date, score in points:
+        offset = (entry_date - start).days
+        scores[offset] = score
+        logged[offset] = 1
+
+    prefix_sum = [0, *accumulate(scores)]
+    prefix_sq = [0, *accumulate(s * s for s in scores)]
+    prefix_count = [0, *accumulate(logged)]
+
+    result: Dict[int, Dict[str, Any]] = {}
+    for size in windows:
+        total, squares, count = _window(prefix_sum, prefix_sq, prefix_count, days - size, days)
+        average = total / count if count else None
+        std_dev = sqrt(max(squares / count - average * average, 0.0)) if count else None
+
+        prev_total, _, prev_count = _window(prefix_sum, prefix_sq, prefix_count, days - 2 * size, days - size)
+        previous_average = prev_total / prev_count if prev_count else None
+
+        # Средние всех окон длины size: разности префиксных сумм, сдвинутых на size, одним проходом zip
+        min_count = max(1, int(size * MIN_WINDOW_COVERAGE))
+        averages = [
+            ((sum_hi - sum_lo) / (count_hi - count_lo), hi)
+            for hi, sum_hi, sum_lo, count_hi, count_lo in zip(
+                range(size, days + 1), prefix_sum[size:], prefix_sum, prefix_count[size:], prefix_count
+            )
+            if count_hi - count_lo >= min_count
+        ]
+        # max/min возвращают первое из равных окон
+        best = max(averages, key=itemgetter(0), default=None)
+        worst = min(averages, key=itemgetter(0), default=None)
+
+        result[size] = {
+            'average': _round(average),
+            'count': count,
+            'stdDev': _round(std_dev),
+            'previousAverage': _round(previous_average),
+            'best': {
+                'average': _round(best[0]),
+                'end': (start + timedelta(days=best[1] - 1)).isoformat()
+            } if best else None,
+            'worst': {
+                'average': _round(worst[0]),
+                'end': (start + timedelta(days=worst[1] - 1)).isoformat()
+            } if worst else None,
+        }
+    return result
+
+
+if __name__ == '__main__':
+    import random
+    import timeit
+
+    today = date.today()
+    # Год, пять и двадцать лет дневника с пропусками и 100k точек подряд
+    for days, fill in ((365, 0.7), (5 * 365, 0.7), (20 * 365, 0.7), (100000, 1.0)):
+        sample = [(today - timedelta(days=i), random.randint(1, 5)) for i in range(days) if random.random() < fill]
+        runs = max(3, 200000 // days)
+        elapsed = timeit.timeit(lambda: rolling_windows(sample, today), number=runs)
+        print(f'{len(sample)} entries over {days} days, windows {DEFAULT_WINDOWS}: {elapsed / runs * 1e3:.3f} ms/call')
@@ -4,14 +4,31 @@ Args: event with httpMethod and queryStringParameters (type: daily/weekly/burnou
 Returns: Result of sending test notification
 '''
 
-import json
 import os
-import requests
-import psycopg2
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any, Optional
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
 
+from analytics import rolling_windows
+from insights import load_insights
+from risk import describe_risk
+from db import DATABASE_URL, get_connection, prepared
+from responses import compressible, dumps
+
+if TYPE_CHECKING:
+    from zoneinfo import ZoneInfo
+
+WEEK_SERIES = prepared('test_week_series', """
+    SELECT entry_date, score
+    FROM t_p45717398_energy_dashboard_pro.energy_entries
+    WHERE user_id = $1 AND entry_date > $2 AND entry_date <= $3
+""", ('int', 'date', 'date'))
+BURNOUT_RISK = prepared('test_burnout_risk', """
+    SELECT reason, low_streak, low_sum, ewma
+    FROM t_p45717398_energy_dashboard_pro.energy_risk
+    WHERE user_id = $1 AND at_risk
+""", ('int',))
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -28,14 +45,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-    dsn = os.environ.get('DATABASE_URL')
     
-    if not bot_token or not dsn:
+    if not bot_token or not DATABASE_URL:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Missing configuration'})
+            'body': dumps({'error': 'Missing configuration'})
         }
     
     params = event.get('queryStringParameters') or {}
@@ -45,7 +61,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     user_id = 1
     full_name = 'Катерина'
     
-    conn = psycopg2.connect(dsn)
+    from zoneinfo import ZoneInfo
+    
+    conn = get_connection()
     tz = ZoneInfo('Europe/Moscow')
     
     if notification_type == 'daily':
@@ -67,16 +85,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 message += f"📉 Небольшой спад ({weekly_stats['trend']:.1f}). Отдыхай больше!"
             else:
                 message += "➡️ Стабильная неделя. Так держать!"
+            
+            message += get_tag_highlight(conn, user_id)
         else:
             message = f"{full_name}, недостаточно данных для недельного отчёта. Заполняй дневник каждый день! 📝"
     
     elif notification_type == 'burnout':
-        burnout_risk = check_burnout_risk(conn, user_id)
+        burnout_risk = get_burnout_risk(conn, user_id)
         
         if burnout_risk:
             message = f"⚠️ {full_name}, важное предупреждение!\n\n"
-            message += f"Я заметил, что последние {burnout_risk['days']} дня твоя оценка энергии низкая "
-            message += f"(в среднем {burnout_risk['avg_score']:.1f}/5).\n\n"
+            message += f"Я заметил, что {burnout_risk}.\n\n"
             message += "Это может быть признаком выгорания. 🔥\n\n"
             message += "Рекомендации:\n"
             message += "• Возьми выходной или отпуск\n"
@@ -92,7 +111,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Invalid type parameter'})
+            'body': dumps({'error': 'Invalid type parameter'})
         }
     
     conn.close()
@@ -104,6 +123,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'parse_mode': 'HTML'
     }
     
+    import requests
     response = requests.post(url, json=payload, timeout=10)
     
     if response.status_code == 200:
@@ -111,7 +131,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({
+            'body': dumps({
                 'success': True,
                 'type': notification_type,
                 'message': 'Test notification sent!'
@@ -122,85 +142,54 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({
+            'body': dumps({
                 'success': False,
                 'error': response.text
             })
         }
 
 
-def get_weekly_stats(conn, user_id: int, tz: ZoneInfo) -> Dict[str, Any]:
+def get_weekly_stats(conn, user_id: int, tz: 'ZoneInfo') -> Dict[str, Any]:
     cur = conn.cursor()
     
     from datetime import timezone
     now_utc = datetime.now(timezone.utc)
-    now_user = now_utc.astimezone(tz)
-    week_ago = now_user - timedelta(days=7)
-    two_weeks_ago = now_user - timedelta(days=14)
-    
-    cur.execute("""
-        SELECT 
-            COUNT(*) as count,
-            AVG(score) as avg_score
-        FROM t_p45717398_energy_dashboard_pro.energy_entries
-        WHERE user_id = %s AND entry_date >= %s AND entry_date < %s
-    """, (user_id, week_ago.date(), now_user.date()))
-    
-    result = cur.fetchone()
-    
-    if not result or result[0] == 0:
-        cur.close()
-        return None
+    yesterday = now_utc.astimezone(tz).date() - timedelta(days=1)
     
-    count, avg_score = result
+    WEEK_SERIES.execute(cur, user_id, yesterday - timedelta(days=14), yesterday)
     
-    cur.execute("""
-        SELECT AVG(score) as prev_avg_score
-        FROM t_p45717398_energy_dashboard_pro.energy_entries
-        WHERE user_id = %s AND entry_date >= %s AND entry_date < %s
-    """, (user_id, two_weeks_ago.date(), week_ago.date()))
+    series = cur.fetchall()
+    cur.close()
     
-    prev_result = cur.fetchone()
-    prev_avg = prev_result[0] if prev_result and prev_result[0] else avg_score
+    week = rolling_windows(series, yesterday, (7,))[7]
     
-    cur.close()
+    if week['count'] == 0:
+        return None
+    
+    prev_avg = week['previousAverage'] if week['previousAverage'] is not None else week['average']
     
     return {
-        'count': count,
-        'avg_score': float(avg_score),
-        'trend': float(avg_score - prev_avg)
+        'count': week['count'],
+        'avg_score': week['average'],
+        'trend': week['average'] - prev_avg
     }
 
 
-def check_burnout_risk(conn, user_id: int) -> Dict[str, Any]:
+def get_tag_highlight(conn, user_id: int) -> str:
+    """Строка отчёта о теге, который заметнее всего поднимает энергию (по кэшу выводов)"""
+    insights = load_insights(conn, user_id)
+    conn.commit()
+    for tag in insights['tags']:
+        # Только теги, у которых весь 95% интервал разницы выше нуля
+        if tag['ci95'] and tag['ci95'][0] > 0:
+            return f"\n\n🏷 Больше всего энергии даёт «{tag['tag']}»: {tag['averageWith']:.1f} против {tag['averageWithout']:.1f} без него"
+    return ''
+
+
+def get_burnout_risk(conn, user_id: int) -> Optional[str]:
+    """Причина флага риска пользователя из состояния детектора, если флаг поднят"""
     cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT score, entry_date
-        FROM t_p45717398_energy_dashboard_pro.energy_entries
-        WHERE user_id = %s
-        ORDER BY entry_date DESC
-        LIMIT 5
-    """, (user_id,))
-    
-    entries = cur.fetchall()
+    BURNOUT_RISK.execute(cur, user_id)
+    row = cur.fetchone()
     cur.close()
-    
-    if len(entries) < 3:
-        return None
-    
-    low_energy_days = 0
-    total_score = 0
-    
-    for score, entry_date in entries:
-        if score <= 2:
-            low_energy_days += 1
-            total_score += score
-    
-    if low_energy_days >= 3:
-        return {
-            'days': low_energy_days,
-            'avg_score': total_score / low_energy_days
-        }
-    
-    return None
\ No newline at end of file
+    return describe_risk(*row) if row else None
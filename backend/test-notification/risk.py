@@ -0,0 +1,149 @@
+'''
+Business: Инкрементальный детектор спада энергии (EWMA-базовая линия, дисперсия, серия низких оценок)
+Args: cur - курсор открытой транзакции, user_id, изменения оценок (дата, старая, новая)
+Returns: None, флаг риска и его причина сохраняются в energy_risk в той же транзакции
+'''
+from datetime import date
+from math import sqrt
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Вес новой оценки в экспоненциальном среднем
+EWMA_ALPHA = 0.3
+# Оценка, которая считается низкой, и длина серии таких оценок для предупреждения
+LOW_SCORE = 2
+LOW_STREAK_DAYS = 3
+# Базовая линия ниже этого уровня после MIN_BASELINE_ENTRIES записей — устойчиво низкая энергия
+LOW_BASELINE = 2.5
+MIN_BASELINE_ENTRIES = 7
+# Падение ниже базовой линии на столько стандартных отклонений — резкий спад
+DROP_Z = 2.0
+# Сколько последних записей переигрывается при полном пересчёте
+RECOMPUTE_ENTRIES = 90
+
+# (дата записи, старая оценка или None, новая оценка или None)
+ScoreChange = Tuple[date, Optional[int], Optional[int]]
+
+
+def _initial_state() -> Dict[str, Any]:
+    return {
+        'last_date': None, 'observations': 0, 'ewma': None, 'ewm_var': 0.0,
+        'low_streak': 0, 'low_sum': 0, 'reason': None
+    }
+
+
+def _step(state: Dict[str, Any], entry_date, score: int) -> None:
+    """Учёт одной новой оценки за O(1)"""
+    mean, var = state['ewma'], state['ewm_var']
+    z = None
+    if state['observations'] >= MIN_BASELINE_ENTRIES and var > 0:
+        z = (score - mean) / sqrt(var)
+
+    if score <= LOW_SCORE:
+        state['low_streak'] += 1
+        state['low_sum'] += score
+    else:
+        state['low_streak'] = 0
+        state['low_sum'] = 0
+
+    if mean is None:
+        state['ewma'], state['ewm_var'] = float(score), 0.0
+    else:
+        diff = score - mean
+        increment = EWMA_ALPHA * diff
+        state['ewma'] = mean + increment
+        state['ewm_var'] = (1 - EWMA_ALPHA) * (var + diff * increment)
+    state['observations'] += 1
+    state['last_date'] = entry_date
+
+    if state['low_streak'] >= LOW_STREAK_DAYS:
+        state['reason'] = 'low_streak'
+    elif state['observations'] >= MIN_BASELINE_ENTRIES and state['ewma'] <= LOW_BASELINE:
+        state['reason'] = 'low_baseline'
+    elif z is not None and z <= -DROP_Z:
+        state['reason'] = 'sudden_drop'
+    else:
+        state['reason'] = None
+
+
+def _load(cur, user_id: int) -> Optional[Dict[str, Any]]:
+    cur.execute("""
+        SELECT last_date, observations, ewma, ewm_var, low_streak, low_sum, reason
+        FROM t_p45717398_energy_dashboard_pro.energy_risk
+        WHERE user_id = %s
+        FOR UPDATE
+    """, (user_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+
+def _recompute(cur, user_id: int) -> Dict[str, Any]:
+    """Переигрывание последних записей, когда изменилось прошлое"""
+    cur.execute("""
+        SELECT entry_date, score FROM (
+            SELECT entry_date, score
+            FROM t_p45717398_energy_dashboard_pro.energy_entries
+            WHERE user_id = %s
+            ORDER BY entry_date DESC
+            LIMIT %s
+        ) recent
+        ORDER BY entry_date
+    """, (user_id, RECOMPUTE_ENTRIES))
+    state = _initial_state()
+    for row in cur.fetchall():
+        _step(state, row['entry_date'], row['score'])
+    return state
+
+
+def apply_risk_changes(cur, user_id: int, changes: Iterable[ScoreChange]) -> None:
+    """O(1) на оценку при дозаписи новых дней, иначе пересчёт по последним записям"""
+    changes = sorted((c for c in changes if c[1] != c[2]), key=lambda c: c[0])
+    if not changes:
+        return
+
+    state = _load(cur, user_id)
+    appending = state is not None and all(
+        old is None and new is not None and (state['last_date'] is None or day > state['last_date'])
+        for day, old, new in changes
+    )
+    if appending:
+        for day, _, score in changes:
+            _step(state, day, score)
+    else:
+        state = _recompute(cur, user_id)
+
+    cur.execute("""
+        INSERT INTO t_p45717398_energy_dashboard_pro.energy_risk
+            (user_id, last_date, observations, ewma, ewm_var, low_streak, low_sum, at_risk, reason, flagged_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, CASE WHEN %s THEN CURRENT_TIMESTAMP END)
+        ON CONFLICT (user_id) DO UPDATE SET
+            last_date = EXCLUDED.last_date,
+            observations = EXCLUDED.observations,
+            ewma = EXCLUDED.ewma,
+            ewm_var = EXCLUDED.ewm_var,
+            low_streak = EXCLUDED.low_streak,
+            low_sum = EXCLUDED.low_sum,
+            at_risk = EXCLUDED.at_risk,
+            reason = EXCLUDED.reason,
+            flagged_at = CASE
+                WHEN NOT EXCLUDED.at_risk THEN NULL
+                WHEN energy_risk.at_risk THEN energy_risk.flagged_at
+                ELSE CURRENT_TIMESTAMP
+            END,
+            updated_at = CURRENT_TIMESTAMP
+    """, (
+        user_id, state['last_date'], state['observations'], state['ewma'], state['ewm_var'],
+        state['low_streak'], state['low_sum'], state['reason'] is not None, state['reason'],
+        state['reason'] is not None
+    ))
+
+
+def describe_risk(reason: str, low_streak: int, low_sum: int, ewma: float) -> str:
+    """Причина предупреждения человеческим языком для уведомления"""
+    if reason == 'low_streak':
+        return (
+            f"последние {low_streak} дня твоя оценка энергии низкая "
+            f"(в среднем {low_sum / low_streak:.1f}/5)"
+        )
+    if reason == 'low_baseline':
+        return f"твоя энергия уже давно держится на низком уровне (около {ewma:.1f}/5)"
+    return f"твоя энергия резко упала ниже обычного уровня (сейчас около {ewma:.1f}/5)"
@@ -0,0 +1,158 @@
+'''
+Business: Общие фикстуры тестов backend: общие модули на sys.path и тестовая база с миграциями
+Args: TEST_DATABASE_URL - строка подключения к серверу PostgreSQL, на котором можно создать базу
+Returns: фикстуры database (DSN готовой базы) и connect (новое соединение к ней)
+'''
+import glob
+import os
+import sys
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'db_migrations')
+SCHEMA = 't_p45717398_energy_dashboard_pro'
+
+# Все общие модули лежат копиями в entries
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'entries'))
+
+# Таблицу users в схеме создаёт платформа, миграции только добавляют в неё колонки
+PLATFORM_USERS_SQL = f'''
+    CREATE TABLE {SCHEMA}.users (
+        id SERIAL PRIMARY KEY,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    -- Демо-пользователи, на которых ссылаются миграции с демо-данными
+    INSERT INTO {SCHEMA}.users (id, email, password_hash) VALUES (7, 'test@test', ''), (50, 'demo@demo', '');
+    SELECT setval(pg_get_serial_sequence('{SCHEMA}.users', 'id'), 1000);
+'''
+
+
+def _dsn_with_database(dsn: str, name: str) -> str:
+    from psycopg2.extensions import make_dsn, parse_dsn
+    return make_dsn(**{**parse_dsn(dsn), 'dbname': name})
+
+
+@pytest.fixture(scope='session')
+def database():
+    """Свежая база со всеми миграциями; удаляется после сессии"""
+    server_dsn = os.environ.get('TEST_DATABASE_URL')
+    if not server_dsn:
+        pytest.skip('TEST_DATABASE_URL не задан')
+    psycopg2 = pytest.importorskip('psycopg2')
+
+    name = f'energy_test_{uuid.uuid4().hex[:8]}'
+    admin = psycopg2.connect(server_dsn)
+    admin.autocommit = True
+    admin.cursor().execute(f'CREATE DATABASE {name}')
+
+    dsn = _dsn_with_database(server_dsn, name)
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f'CREATE SCHEMA {SCHEMA}')
+    cur.execute(PLATFORM_USERS_SQL)
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*.sql'))):
+        # Первая миграция написана без схемы и создаёт свои таблицы в public
+        cur.execute(f"SET search_path TO {'public' if os.path.basename(path).startswith('V0001__') else SCHEMA}")
+        with open(path) as f:
+            cur.execute(f.read())
+    conn.close()
+
+    yield dsn
+
+    admin.cursor().execute(f'DROP DATABASE {name} WITH (FORCE)')
+    admin.close()
+
+
+@pytest.fixture
+def connect(database):
+    """Фабрика соединений с search_path схемы, как у ролей функций"""
+    import psycopg2
+    from db import _reusable_connection_class
+    opened = []
+
+    def open_connection():
+        conn = psycopg2.connect(
+            database,
+            connection_factory=_reusable_connection_class(),
+            options=f'-c search_path={SCHEMA}'
+        )
+        opened.append(conn)
+        return conn
+
+    yield open_connection
+    for conn in opened:
+        conn.close()
+
+
+@pytest.fixture
+def user_id(connect):
+    """Новый пользователь без записей"""
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute(
+        f"INSERT INTO {SCHEMA}.users (email, password_hash) VALUES (%s, '') RETURNING id",
+        (f'{uuid.uuid4().hex}@test',)
+    )
+    new_id = cur.fetchone()[0]
+    conn.commit()
+    return new_id
+
+
+@pytest.fixture
+def handler_database(database, monkeypatch):
+    """Обработчики функций ходят в тестовую базу через db.get_connection"""
+    from psycopg2.extensions import make_dsn
+    import db
+    monkeypatch.setattr(db, 'DATABASE_URL', make_dsn(database, options=f'-c search_path={SCHEMA}'))
+    monkeypatch.setattr(db, '_connections', {})
+    return db.DATABASE_URL
+
+
+# Засеянная база для проверок планов: пользователи и год ежедневных записей с тегами
+SEED_USERS = 500
+SEED_FILL = 0.7
+SEED_TAGS = ('работа', 'спорт', 'семья', 'сон', 'друзья', 'учёба', 'прогулка', 'кофе')
+# Тег, который встречается примерно в одной записи из пятисот
+SEED_RARE_TAG = 'редкий'
+
+
+@pytest.fixture(scope='session')
+def seeded(database):
+    """Id засеянных пользователей; записи вставляются по дням, как приходят в боевой базе"""
+    import psycopg2
+    conn = psycopg2.connect(database, options=f'-c search_path={SCHEMA}')
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT ensure_energy_entries_partitions(EXTRACT(YEAR FROM CURRENT_DATE)::int - 1)")
+    cur.execute("""
+        INSERT INTO users (email, password_hash)
+        SELECT 'seed' || n || '@test', '' FROM generate_series(1, %s) n
+        RETURNING id
+    """, (SEED_USERS,))
+    user_ids = sorted(row[0] for row in cur.fetchall())
+    cur.execute("""
+        INSERT INTO energy_entries (user_id, entry_date, score, thoughts, tags)
+        SELECT u.id, d::date, 1 + (random() * 4)::int, 'Запись дня: ' || t.tags::text, t.tags
+        FROM generate_series(CURRENT_DATE - 364, CURRENT_DATE, interval '1 day') d
+        CROSS JOIN unnest(%s::int[]) AS u(id)
+        CROSS JOIN LATERAL (
+            SELECT (
+                SELECT COALESCE(jsonb_agg(tag), '[]'::jsonb)
+                FROM unnest(%s::text[]) AS tag
+                -- ссылка на u.id заставляет считать набор тегов заново для каждой записи
+                WHERE random() < 0.2 AND u.id > 0
+            ) || CASE WHEN random() < 0.002 THEN jsonb_build_array(%s::text) ELSE '[]'::jsonb END AS tags
+        ) t
+        WHERE random() < %s
+        ORDER BY d, u.id
+    """, (user_ids, list(SEED_TAGS), SEED_RARE_TAG, SEED_FILL))
+    cur.execute('VACUUM ANALYZE energy_entries')
+    conn.close()
+    return user_ids
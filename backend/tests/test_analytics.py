@@ -0,0 +1,74 @@
+import random
+from datetime import date, timedelta
+from statistics import pstdev
+
+from analytics import rolling_windows
+
+END = date(2024, 3, 31)
+
+
+def _naive(series, end, size):
+    """Окно размера size, пересчитанное по каждому дню напрямую"""
+    scores = dict(series)
+
+    def window(last):
+        return [scores[d] for d in (last - timedelta(days=i) for i in range(size)) if d in scores]
+
+    current = window(end)
+    previous = window(end - timedelta(days=size))
+    start = min(list(scores) + [end - timedelta(days=size - 1)])
+    candidates = []
+    for offset in range((end - start).days - size + 2):
+        last = start + timedelta(days=offset + size - 1)
+        values = window(last)
+        if len(values) >= max(1, size // 2):
+            candidates.append((sum(values) / len(values), last))
+    return {
+        'average': round(sum(current) / len(current), 2) if current else None,
+        'count': len(current),
+        'stdDev': round(pstdev(current), 2) if current else None,
+        'previousAverage': round(sum(previous) / len(previous), 2) if previous else None,
+        'best': max(candidates, key=lambda c: c[0], default=None),
+        'worst': min(candidates, key=lambda c: c[0], default=None),
+    }
+
+
+def test_windows_match_direct_computation():
+    rng = random.Random(3)
+    series = [(END - timedelta(days=i), rng.randint(1, 5)) for i in range(200) if rng.random() < 0.6]
+
+    windows = rolling_windows(series, END)
+
+    for size, window in windows.items():
+        expected = _naive(series, END, size)
+        for key in ('average', 'count', 'stdDev', 'previousAverage'):
+            assert window[key] == expected[key], (size, key)
+        assert window['best']['average'] == round(expected['best'][0], 2), size
+        assert window['worst']['average'] == round(expected['worst'][0], 2), size
+
+
+def test_best_and_worst_windows_end_on_the_first_extreme_day():
+    series = [(END - timedelta(days=i), 5 if i < 7 else 1) for i in range(21)]
+
+    week = rolling_windows(series, END, (7,))[7]
+
+    assert week['average'] == 5.0
+    assert week['stdDev'] == 0.0
+    assert week['previousAverage'] == 1.0
+    assert week['best'] == {'average': 5.0, 'end': END.isoformat()}
+    assert week['worst'] == {'average': 1.0, 'end': (END - timedelta(days=20 - 6)).isoformat()}
+
+
+def test_sparse_windows_and_future_entries():
+    series = [(END, 4), (END + timedelta(days=1), 1)]
+
+    windows = rolling_windows(series, END, (2, 7))
+
+    assert windows[2] == {
+        'average': 4.0, 'count': 1, 'stdDev': 0.0, 'previousAverage': None,
+        'best': {'average': 4.0, 'end': END.isoformat()},
+        'worst': {'average': 4.0, 'end': END.isoformat()},
+    }
+    # Одна запись из семи дней не покрывает окно наполовину
+    assert windows[7]['best'] is None and windows[7]['average'] == 4.0
+    assert rolling_windows([], END, (7,))[7]['average'] is None
@@ -0,0 +1,34 @@
+import db
+
+
+def test_plain_fallback_casts_parameters_to_declared_types():
+    statement = db.Statement('test_plain_casts', 'SELECT $1 + 1 WHERE $2 = ANY($3)', ('int', 'date', 'date[]'))
+    assert statement._plain_sql == 'SELECT %(p1)s::int + 1 WHERE %(p2)s::date = ANY(%(p3)s::date[])'
+
+
+def test_plain_and_prepared_execution_agree(connect):
+    statement = db.Statement('test_plain_vs_prepared', """
+        SELECT d FROM unnest($1::date[]) AS d WHERE d = ANY($2) ORDER BY d
+    """, ('date[]', 'date[]'))
+    params = (['2024-01-02', '2024-01-01'], ['2024-01-01'])
+    conn = connect()
+    cur = conn.cursor()
+
+    statement.execute(cur, *params)
+    prepared_rows = cur.fetchall()
+    assert conn.prepared[statement.name]
+
+    cur.execute(statement._plain_sql, {f'p{i}': value for i, value in enumerate(params, 1)})
+    assert cur.fetchall() == prepared_rows
+    assert [str(row[0]) for row in prepared_rows] == ['2024-01-01']
+
+
+def test_benchmark_times_both_paths_and_leaves_connection_idle(seeded, connect):
+    import index
+    conn = connect()
+
+    result = db.benchmark(conn, index.STATS_TOTALS, (seeded[0],), runs=20)
+
+    assert set(result) == {'planning_ms', 'plain_ms', 'prepared_ms'}
+    assert all(value > 0 for value in result.values())
+    assert conn.get_transaction_status() == db._IDLE
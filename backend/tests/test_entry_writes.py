@@ -0,0 +1,95 @@
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+import index
+
+
+def test_upsert_reports_created_then_updated(connect, user_id):
+    conn = connect()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    item = {'date': '2024-03-05', 'score': 4, 'thoughts': '', 'tags': ['спорт']}
+
+    assert index.upsert_entries(cur, user_id, [item])['2024-03-05']['inserted'] is True
+    assert index.upsert_entries(cur, user_id, [{**item, 'score': 2}])['2024-03-05']['inserted'] is False
+    conn.commit()
+
+
+def _rollup(cur, user_id, granularity, bucket_start):
+    cur.execute("""
+        SELECT score_sum, entry_count FROM energy_rollups
+        WHERE user_id = %s AND granularity = %s AND bucket_start = %s
+    """, (user_id, granularity, bucket_start))
+    return cur.fetchone()
+
+
+def test_concurrent_first_saves_of_a_date_count_once(connect, user_id):
+    first, second = connect(), connect()
+    saved = threading.Event()
+    errors = []
+
+    def save(conn, item, wait=None):
+        try:
+            if wait:
+                wait.wait(5)
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            index.upsert_entries(cur, user_id, [item])
+            if not wait:
+                saved.set()
+                # Вторая транзакция успевает дойти до своей вставки, пока первая не закоммичена
+                time.sleep(0.3)
+            conn.commit()
+        except Exception as e:
+            errors.append(e)
+            conn.rollback()
+
+    threads = [
+        threading.Thread(target=save, args=(first, {'date': '2024-03-05', 'score': 4, 'thoughts': '', 'tags': ['спорт']})),
+        threading.Thread(target=save, args=(second, {'date': '2024-03-05', 'score': 2, 'thoughts': '', 'tags': ['спорт']}, saved)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    cur = connect().cursor(cursor_factory=RealDictCursor)
+    for granularity, bucket in (('day', '2024-03-05'), ('week', '2024-03-04'), ('month', '2024-03-01')):
+        assert _rollup(cur, user_id, granularity, bucket) == {'score_sum': 2, 'entry_count': 1}
+    cur.execute('SELECT total_days FROM user_streaks WHERE user_id = %s', (user_id,))
+    assert cur.fetchone()['total_days'] == 1
+    cur.execute('SELECT usage_count FROM user_tags WHERE user_id = %s AND tag = %s', (user_id, 'спорт'))
+    assert cur.fetchone()['usage_count'] == 1
+
+
+def _delete(user_id, params):
+    from tokens import create_token
+    response = index.handler({
+        'httpMethod': 'DELETE',
+        'headers': {'X-Auth-Token': create_token(user_id, 'delete@test')},
+        'queryStringParameters': params
+    }, None)
+    return response['statusCode']
+
+
+def test_delete_by_id_with_and_without_date(connect, user_id, handler_database):
+    conn = connect()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    saved = index.upsert_entries(cur, user_id, [
+        {'date': '2024-03-05', 'score': 4, 'thoughts': '', 'tags': []},
+        {'date': '2024-03-06', 'score': 3, 'thoughts': '', 'tags': []},
+    ])
+    conn.commit()
+    first, second = saved['2024-03-05']['id'], saved['2024-03-06']['id']
+
+    assert _delete(user_id, {'id': str(first), 'date': '2024-03-06'}) == 404
+    assert _delete(user_id + 1, {'id': str(first)}) == 404
+    assert _delete(user_id, {'id': str(first), 'date': '2024-03-05'}) == 200
+    assert _delete(user_id, {'id': str(second)}) == 200
+    assert _delete(user_id, {'id': 'x'}) == 400
+
+    cur.execute('SELECT COUNT(*) as left FROM energy_entries WHERE user_id = %s', (user_id,))
+    assert cur.fetchone()['left'] == 0
+    cur.execute('SELECT COUNT(*) as tombstones FROM energy_entry_deletions WHERE user_id = %s', (user_id,))
+    assert cur.fetchone()['tombstones'] == 2
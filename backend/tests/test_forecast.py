@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+import pytest
+
+from forecast import HISTORY_DAYS, MIN_OBSERVATIONS, _step, fit_model, refit_all
+
+
+def test_step_with_score_corrects_level_trend_and_season():
+    model = {'alpha': 0.5, 'beta': 0.1, 'gamma': 0.2, 'level': 3.0, 'trend': 0.5, 'season': [0.0] * 7}
+    monday = date(2024, 3, 4)
+    model['season'][0] = 0.5
+
+    error = _step(model, monday, 5)
+
+    # Прогноз на шаг: 3 + 0.9 * 0.5 + 0.5 = 3.95
+    assert error == pytest.approx(1.05)
+    assert model['level'] == pytest.approx(0.5 * 4.5 + 0.5 * 3.45)
+    assert model['trend'] == pytest.approx(0.1 * (3.975 - 3.0) + 0.9 * 0.9 * 0.5)
+    assert model['season'][0] == pytest.approx(0.2 * (5 - 3.975) + 0.8 * 0.5)
+
+
+def test_step_without_score_drifts_with_damped_trend():
+    model = {'alpha': 0.5, 'beta': 0.1, 'gamma': 0.2, 'level': 3.0, 'trend': 0.5, 'season': [0.1] * 7}
+
+    assert _step(model, date(2024, 3, 4), None) is None
+    assert model['level'] == pytest.approx(3.45)
+    assert model['trend'] == pytest.approx(0.45)
+    assert model['season'] == [0.1] * 7
+
+
+def test_refit_all_matches_fit_model(connect):
+    np = pytest.importorskip('numpy')
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute('SELECT CURRENT_DATE')
+    today = cur.fetchone()[0]
+
+    rng = np.random.default_rng(7)
+    series = {}
+    for n in range(20):
+        cur.execute("INSERT INTO users (email, password_hash) VALUES (%s, '') RETURNING id", (f'forecast{n}@test',))
+        user_id = cur.fetchone()[0]
+        days = sorted(rng.choice(HISTORY_DAYS, size=int(rng.integers(MIN_OBSERVATIONS, 300)), replace=False))
+        base = rng.uniform(2, 4)
+        points = [
+            (today - timedelta(days=int(age)), int(min(5, max(1, round(base + rng.normal(0, 1) + (age % 7 == 0))))))
+            for age in days
+        ]
+        cur.executemany(
+            'INSERT INTO energy_entries (user_id, entry_date, score) VALUES (%s, %s, %s)',
+            [(user_id, d, s) for d, s in points]
+        )
+        series[user_id] = points
+    conn.commit()
+
+    refit_all(conn)
+
+    for user_id, points in series.items():
+        expected = fit_model(points)
+        cur.execute("""
+            SELECT alpha, beta, gamma, level, trend, season, sse, errors, observations, last_date
+            FROM user_forecasts WHERE user_id = %s
+        """, (user_id,))
+        alpha, beta, gamma, level, trend, season, sse, errors, observations, last_date = cur.fetchone()
+        assert (alpha, beta, gamma) == (expected['alpha'], expected['beta'], expected['gamma'])
+        assert level == pytest.approx(expected['level'], abs=1e-9)
+        assert trend == pytest.approx(expected['trend'], abs=1e-9)
+        assert list(season) == pytest.approx(expected['season'], abs=1e-9)
+        assert sse == pytest.approx(expected['sse'], rel=1e-9)
+        assert (errors, observations, last_date) == (expected['errors'], expected['observations'], expected['last_date'])
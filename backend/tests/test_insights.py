@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+from math import sqrt
+from statistics import mean, variance
+
+from insights import MIN_TAG_OCCURRENCES, Z_95, compute_insights, describe_insights
+
+START = date(2024, 3, 1)
+# (оценка, теги) по дням подряд
+DAYS = [
+    (5, ['спорт', 'сон']), (4, ['спорт']), (2, []), (5, ['спорт', 'сон']),
+    (3, ['кофе']), (4, ['спорт', 'сон']), (1, ['кофе']), (2, []),
+]
+ENTRIES = [(START + timedelta(days=i), score, tags) for i, (score, tags) in enumerate(DAYS)]
+
+
+def test_tag_statistics_match_direct_computation():
+    insights = compute_insights(ENTRIES)
+    sport = next(t for t in insights['tags'] if t['tag'] == 'спорт')
+
+    with_tag = [s for s, tags in DAYS if 'спорт' in tags]
+    without_tag = [s for s, tags in DAYS if 'спорт' not in tags]
+    difference = mean(with_tag) - mean(without_tag)
+    margin = Z_95 * sqrt(variance(with_tag) / len(with_tag) + variance(without_tag) / len(without_tag))
+
+    assert insights['entries'] == len(DAYS)
+    assert insights['average'] == round(mean(s for s, _ in DAYS), 2)
+    assert sport['count'] == 4
+    assert sport['averageWith'] == round(mean(with_tag), 2)
+    assert sport['averageWithout'] == round(mean(without_tag), 2)
+    assert sport['difference'] == round(difference, 2)
+    assert sport['ci95'] == [round(difference - margin, 2), round(difference + margin, 2)]
+    assert sport['lift'] == round(mean(with_tag) / mean(s for s, _ in DAYS), 2)
+    # Следующие дни после «спорт»: 4, 2, 3, 1
+    assert sport['nextDay']['count'] == 4
+    assert sport['nextDay']['average'] == 2.5
+
+
+def test_rare_tags_are_skipped_and_pairs_counted():
+    insights = compute_insights(ENTRIES)
+
+    assert {t['tag'] for t in insights['tags']} == {'спорт', 'сон'}
+    assert all(t['count'] >= MIN_TAG_OCCURRENCES for t in insights['tags'])
+    # Теги отсортированы по модулю разницы
+    assert [abs(t['difference']) for t in insights['tags']] == sorted(
+        (abs(t['difference']) for t in insights['tags']), reverse=True
+    )
+    assert insights['pairs'] == [{'tags': ['сон', 'спорт'], 'count': 3, 'jaccard': 0.75, 'average': 4.67}]
+
+
+def test_empty_history_and_description():
+    assert compute_insights([]) == {'entries': 0, 'average': None, 'tags': [], 'pairs': []}
+
+    lines = describe_insights(compute_insights(ENTRIES))
+    assert lines[0] == (
+        '«спорт» (4 дн.): средняя 4.5 против 2.0 без тега (+2.50, 95% ДИ +1.52…+3.48), на следующий день -1.17'
+    )
+    assert lines[-1] == '«сон» и «спорт» вместе 3 раз, средняя 4.67'
@@ -0,0 +1,40 @@
+import json
+from datetime import date, timedelta
+
+from psycopg2.extras import RealDictCursor
+
+import index
+
+
+def _get(user_id, params=None):
+    from tokens import create_token
+    response = index.handler({
+        'httpMethod': 'GET',
+        'headers': {'X-Auth-Token': create_token(user_id, 'list@test')},
+        'queryStringParameters': params
+    }, None)
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])
+
+
+def test_default_listing_is_paginated_and_full_list_is_opt_in(connect, user_id, handler_database):
+    conn = connect()
+    total = index.DEFAULT_PAGE_SIZE + 30
+    index.upsert_entries(conn.cursor(cursor_factory=RealDictCursor), user_id, [
+        {'date': (date(2024, 1, 1) + timedelta(days=n)).isoformat(), 'score': 3, 'thoughts': '', 'tags': []}
+        for n in range(total)
+    ])
+    conn.commit()
+
+    first = _get(user_id)
+    assert len(first['entries']) == index.DEFAULT_PAGE_SIZE
+    assert first['entries'][0]['date'] == (date(2024, 1, 1) + timedelta(days=total - 1)).isoformat()
+    assert first['stats']['total'] == total
+
+    rest = _get(user_id, {'cursor': first['nextCursor']})
+    assert len(rest['entries']) == 30
+    assert rest['nextCursor'] is None
+
+    everything = _get(user_id, {'all': '1'})
+    assert len(everything['entries']) == total
+    assert everything['nextCursor'] is None
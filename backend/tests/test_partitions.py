@@ -0,0 +1,27 @@
+def test_partition_for_a_year_in_default_takes_its_rows(connect, user_id):
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO energy_entries (user_id, entry_date, score, tags)
+        VALUES (%s, '2003-05-01', 3, '["спорт"]'), (%s, '2003-06-01', 4, '[]')
+        RETURNING id
+    """, (user_id, user_id))
+    tagged_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO tag_analytics (entry_id, tag, score, entry_date, user_id)
+        VALUES (%s, 'спорт', 3, '2003-05-01', %s)
+    """, (tagged_id, user_id))
+    cur.execute("SELECT DISTINCT tableoid::regclass::text FROM energy_entries WHERE user_id = %s", (user_id,))
+    assert cur.fetchall() == [('energy_entries_default',)]
+
+    cur.execute('SELECT ensure_energy_entries_partitions()')
+    assert cur.fetchone()[0] == 1
+    conn.commit()
+
+    cur.execute("SELECT DISTINCT tableoid::regclass::text FROM energy_entries WHERE user_id = %s", (user_id,))
+    assert cur.fetchall() == [('energy_entries_y2003',)]
+    cur.execute('SELECT entry_id FROM tag_analytics WHERE user_id = %s', (user_id,))
+    assert cur.fetchall() == [(tagged_id,)]
+
+    cur.execute('SELECT ensure_energy_entries_partitions()')
+    assert cur.fetchone()[0] == 0
@@ -0,0 +1,48 @@
+import db
+import index
+
+
+def test_registered_statements_have_no_plan_problems(seeded, connect):
+    conn = connect()
+    for statement in db.STATEMENTS.values():
+        assert db.check_plan(conn, statement) == [], statement.name
+
+
+def test_dynamic_queries_have_no_plan_problems(seeded, connect):
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute('SELECT COUNT(*) FROM energy_entries')
+    assert cur.fetchone()[0] >= 100000
+    for name, (sql, params) in index.plan_samples(seeded[len(seeded) // 2]).items():
+        assert db.check_query_plan(conn, sql, params) == [], name
+
+
+def _parent_indexes(conn, plan):
+    """Индексы секционированной таблицы, которыми пользуется план (индексы секций сводятся к родительскому)"""
+    names = {node['Index Name'] for node in db._plan_nodes(plan) if 'Index Name' in node}
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COALESCE(p.inhparent::regclass::text, i.relname)
+        FROM pg_class i
+        LEFT JOIN pg_inherits p ON p.inhrelid = i.oid
+        WHERE i.relname = ANY(%s)
+    """, (list(names),))
+    indexes = {row[0].split('.')[-1] for row in cur.fetchall()}
+    conn.rollback()
+    return indexes
+
+
+def test_tag_filters_use_the_tags_gin_index(seeded, connect):
+    from conftest import SEED_RARE_TAG
+    conn = connect()
+    user_id = seeded[len(seeded) // 2]
+    columns = 'id, entry_date as date, score, thoughts, tags, created_at, updated_at'
+    since, today = index.date.today() - index.timedelta(days=index.ANALYTICS_LOOKBACK_DAYS), index.date.today()
+    for tag_filter in (index.tag_conditions([SEED_RARE_TAG], []), index.tag_conditions([], [SEED_RARE_TAG])):
+        for name, (sql, params) in {
+            'listing': index.listing_query(user_id, columns, None, None, None, tag_filter, None),
+            'stats_totals': index.tagged_totals_query(user_id, tag_filter),
+            'stats_series': index.tagged_series_query(user_id, since, today, tag_filter),
+        }.items():
+            plan = db.query_plan(conn, sql, params)
+            assert 'idx_energy_entries_tags' in _parent_indexes(conn, plan), (name, tag_filter[0])
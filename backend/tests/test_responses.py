@@ -0,0 +1,72 @@
+import base64
+import gzip
+import json
+
+import pytest
+
+import responses
+from responses import compress_response, make_etag, not_modified, with_etag
+
+BODY = json.dumps({'entries': [{'thoughts': 'Сегодня хороший день'}] * 100}, ensure_ascii=False)
+
+
+def _response(body=BODY):
+    return {'statusCode': 200, 'headers': {'Content-Type': 'application/json'}, 'body': body, 'isBase64Encoded': False}
+
+
+def test_gzip_when_brotli_is_not_accepted():
+    response = compress_response({'headers': {'accept-encoding': 'gzip, deflate'}}, _response())
+
+    assert response['isBase64Encoded'] is True
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert response['headers']['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(base64.b64decode(response['body'])).decode('utf-8') == BODY
+
+
+def test_brotli_is_preferred_when_available():
+    brotli = pytest.importorskip('brotli')
+
+    response = compress_response({'headers': {'Accept-Encoding': 'gzip, br'}}, _response())
+
+    assert response['headers']['Content-Encoding'] == 'br'
+    assert brotli.decompress(base64.b64decode(response['body'])).decode('utf-8') == BODY
+
+
+@pytest.mark.parametrize('event, body', [
+    ({'headers': {}}, BODY),
+    ({'headers': {'Accept-Encoding': 'gzip;q=0, br;q=0'}}, BODY),
+    ({'headers': {'Accept-Encoding': 'gzip'}}, '{"ok": true}'),
+])
+def test_body_is_left_as_is(event, body, monkeypatch):
+    monkeypatch.setattr(responses, 'brotli', None)
+
+    response = compress_response(event, _response(body))
+
+    assert response['body'] == body
+    assert response['isBase64Encoded'] is False
+    assert 'Content-Encoding' not in response['headers']
+    assert response['headers']['Vary'] == 'Accept-Encoding'
+
+
+def test_not_modified_matches_weak_and_bare_etags():
+    etag = make_etag('entries', 3, 'page=1')
+    assert etag.startswith('W/"') and etag == make_etag('entries', 3, 'page=1')
+    assert etag != make_etag('entries', 4, 'page=1')
+
+    for header in (etag, etag[2:], f'"other", {etag}', '*'):
+        response = not_modified({'headers': {'If-None-Match': header}}, etag)
+        assert response['statusCode'] == 304 and response['headers']['ETag'] == etag, header
+
+    assert not_modified({'headers': {}}, etag) is None
+    assert not_modified({'headers': {'if-none-match': make_etag('entries', 4)}}, etag) is None
+
+
+def test_with_etag_keeps_response_headers():
+    response = with_etag(_response(), 'W/"abc"')
+
+    assert response['headers'] == {
+        'Content-Type': 'application/json',
+        'ETag': 'W/"abc"',
+        'Cache-Control': 'private, no-cache',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
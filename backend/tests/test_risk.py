@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+import pytest
+
+from risk import EWMA_ALPHA, LOW_STREAK_DAYS, MIN_BASELINE_ENTRIES, _initial_state, _step, describe_risk
+
+START = date(2024, 3, 1)
+
+
+def _play(scores):
+    state = _initial_state()
+    for offset, score in enumerate(scores):
+        _step(state, START + timedelta(days=offset), score)
+    return state
+
+
+def test_step_updates_ewma_and_variance():
+    state = _play([4, 2])
+
+    assert state['ewma'] == pytest.approx(4 - EWMA_ALPHA * 2)
+    assert state['ewm_var'] == pytest.approx((1 - EWMA_ALPHA) * (0 + (-2) * (-2 * EWMA_ALPHA)))
+    assert state['observations'] == 2
+    assert state['last_date'] == START + timedelta(days=1)
+
+
+def test_low_streak_is_flagged_and_reset_by_a_good_day():
+    state = _play([4] * 5 + [2, 1, 2])
+
+    assert state['reason'] == 'low_streak'
+    assert (state['low_streak'], state['low_sum']) == (LOW_STREAK_DAYS, 5)
+    assert describe_risk(state['reason'], state['low_streak'], state['low_sum'], state['ewma']).startswith(
+        'последние 3 дня'
+    )
+
+    _step(state, START + timedelta(days=8), 4)
+    assert (state['low_streak'], state['low_sum'], state['reason']) == (0, 0, None)
+
+
+def test_sudden_drop_needs_a_baseline():
+    # До MIN_BASELINE_ENTRIES записей падение не оценивается
+    assert _play([5, 4, 5, 1])['reason'] is None
+
+    state = _play([5, 4] * MIN_BASELINE_ENTRIES + [1])
+    assert state['reason'] == 'sudden_drop'
+
+
+def test_low_baseline_after_enough_entries():
+    # Низкие оценки не идут подряд, но уровень держится ниже LOW_BASELINE
+    state = _play([3, 2] * MIN_BASELINE_ENTRIES)
+
+    assert state['low_streak'] == 1
+    assert state['reason'] == 'low_baseline'
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from psycopg2.extras import RealDictCursor
+
+import index
+
+
+def _seed(conn, user_id):
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute('SELECT CURRENT_DATE as today')
+    today = cur.fetchone()['today']
+    items = [
+        (1, 5, ['спорт']),
+        (2, 4, []),
+        (3, 2, ['спорт', 'сон']),
+        (40, 3, ['сон']),
+    ]
+    index.upsert_entries(cur, user_id, [
+        {'date': (today - timedelta(days=ago)).isoformat(), 'score': score, 'thoughts': '', 'tags': tags}
+        for ago, score, tags in items
+    ])
+    conn.commit()
+    month = [score for ago, score, _ in items if (today - timedelta(days=ago)).replace(day=1) == today.replace(day=1)]
+    return cur, month
+
+
+def test_stats_from_rollups_match_entries(connect, user_id):
+    cur, month = _seed(connect(), user_id)
+
+    stats = index.fetch_stats(cur, user_id)
+
+    assert {k: stats[k] for k in ('good', 'neutral', 'bad', 'average', 'total')} == {
+        'good': 2, 'neutral': 1, 'bad': 1, 'average': 3.5, 'total': 4
+    }
+    assert stats['last7Days']['average'] == 3.67
+    assert stats['last7Days']['count'] == 3
+    assert stats['last90Days']['count'] == 4
+    assert stats['currentMonth'] == {
+        'average': round(sum(month) / len(month), 2) if month else 0, 'count': len(month)
+    }
+    assert stats['streak'] == {'current': 3, 'longest': 3, 'missedDays': 36}
+
+
+def test_tag_filtered_stats_count_only_tagged_entries(connect, user_id):
+    cur, _ = _seed(connect(), user_id)
+
+    any_tag = index.fetch_stats(cur, user_id, index.tag_conditions(['спорт'], []))
+    all_tags = index.fetch_stats(cur, user_id, index.tag_conditions([], ['спорт', 'сон']))
+
+    assert (any_tag['total'], any_tag['average'], any_tag['good'], any_tag['bad']) == (2, 3.5, 1, 1)
+    assert any_tag['last7Days']['count'] == 2
+    assert (all_tags['total'], all_tags['average'], all_tags['last90Days']['count']) == (1, 2.0, 1)
@@ -0,0 +1,94 @@
+'''
+Business: Сравнение прежнего и нового пути статистики entries на 10, 1k и 100k записях одного пользователя
+Args: TEST_DATABASE_URL; результаты видны с pytest -s tests/test_stats_benchmark.py
+Returns: мс на вызов для каждого пути; записи засеваются в транзакции и откатываются
+'''
+import time
+
+from psycopg2.extras import RealDictCursor
+
+import index
+from streaks import recompute_streak
+
+SIZES = (10, 1000, 100000)
+
+
+def _old_stats(cur, user_id):
+    """Статистика до single-pass агрегации: все записи пользователя, цикл по ним и ещё два запроса"""
+    cur.execute("""
+        SELECT id, entry_date as date, score, thoughts, tags, created_at, updated_at
+        FROM energy_entries
+        WHERE user_id = %s
+        ORDER BY entry_date DESC
+    """, (user_id,))
+    entries = cur.fetchall()
+    total = len(entries)
+    avg_score = sum(e['score'] for e in entries) / total if total else 0
+    good = sum(1 for e in entries if e['score'] >= 4)
+    neutral = sum(1 for e in entries if e['score'] == 3)
+    bad = sum(1 for e in entries if e['score'] <= 2)
+
+    cur.execute("""
+        SELECT AVG(score) as avg_14, COUNT(*) as count_14
+        FROM energy_entries
+        WHERE user_id = %s
+        AND entry_date >= CURRENT_DATE - INTERVAL '14 days'
+    """, (user_id,))
+    last_14 = cur.fetchone()
+    cur.execute("""
+        SELECT AVG(score) as avg_month, COUNT(*) as count_month
+        FROM energy_entries
+        WHERE user_id = %s
+        AND EXTRACT(YEAR FROM entry_date) = EXTRACT(YEAR FROM CURRENT_DATE)
+        AND EXTRACT(MONTH FROM entry_date) = EXTRACT(MONTH FROM CURRENT_DATE)
+    """, (user_id,))
+    month = cur.fetchone()
+    return {
+        'good': good, 'neutral': neutral, 'bad': bad, 'average': round(avg_score, 2), 'total': total,
+        'last14Days': {'average': round(float(last_14['avg_14'] or 0), 2), 'count': last_14['count_14']},
+        'currentMonth': {'average': round(float(month['avg_month'] or 0), 2), 'count': month['count_month']},
+    }
+
+
+def _per_call_ms(call, runs):
+    call()
+    started = time.perf_counter()
+    for _ in range(runs):
+        call()
+    return (time.perf_counter() - started) * 1000 / runs
+
+
+def test_single_pass_stats_against_the_old_path(connect, user_id):
+    conn = connect()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    results = {}
+    for size in SIZES:
+        cur.execute('DELETE FROM energy_entries WHERE user_id = %s', (user_id,))
+        # Ежедневные записи до сегодняшнего дня; 100k дней уходят в секцию по умолчанию
+        cur.execute("""
+            INSERT INTO energy_entries (user_id, entry_date, score, thoughts, tags)
+            SELECT %s, CURRENT_DATE - n, 1 + n %% 5, '', '[]'::jsonb
+            FROM generate_series(0, %s - 1) n
+        """, (user_id, size))
+        cur.execute('SELECT rebuild_energy_rollups(%s)', (user_id,))
+        recompute_streak(cur, user_id)
+        cur.execute('ANALYZE energy_entries')
+
+        old, new = _old_stats(cur, user_id), index.fetch_stats(cur, user_id)
+        assert {k: new[k] for k in ('good', 'neutral', 'bad', 'average', 'total')} == {
+            k: old[k] for k in ('good', 'neutral', 'bad', 'average', 'total')
+        }
+        assert new['currentMonth'] == old['currentMonth']
+
+        runs = 3 if size >= 100000 else 50
+        results[size] = (
+            _per_call_ms(lambda: _old_stats(cur, user_id), runs),
+            _per_call_ms(lambda: index.fetch_stats(cur, user_id), runs),
+        )
+    conn.rollback()
+
+    for size, (old_ms, new_ms) in results.items():
+        print(f'{size} entries: old {old_ms:.2f} ms, fetch_stats {new_ms:.2f} ms ({old_ms / new_ms:.1f}x)')
+    # Прежний путь растёт с историей, новый читает месячные агрегаты и ряд за год
+    old_ms, new_ms = results[SIZES[-1]]
+    assert new_ms < old_ms
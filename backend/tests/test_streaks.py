@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+
+from psycopg2.extras import RealDictCursor
+
+from streaks import apply_streak_changes, fetch_streak, recompute_streak
+
+START = date(2024, 3, 1)
+
+
+def _state(cur, user_id):
+    cur.execute("""
+        SELECT first_date, last_date, current_start, longest_length, total_days
+        FROM user_streaks WHERE user_id = %s
+    """, (user_id,))
+    return dict(cur.fetchone())
+
+
+def _change(cur, user_id, added=(), removed=()):
+    """Запись дней в energy_entries и инкрементальное обновление серии; результат сверяется с пересчётом"""
+    for offset in added:
+        cur.execute(
+            'INSERT INTO energy_entries (user_id, entry_date, score) VALUES (%s, %s, 3)',
+            (user_id, START + timedelta(days=offset))
+        )
+    for offset in removed:
+        cur.execute(
+            'DELETE FROM energy_entries WHERE user_id = %s AND entry_date = %s',
+            (user_id, START + timedelta(days=offset))
+        )
+    apply_streak_changes(
+        cur, user_id,
+        added=[START + timedelta(days=o) for o in added],
+        removed=[START + timedelta(days=o) for o in removed]
+    )
+    state = _state(cur, user_id)
+    assert state == recompute_streak(cur, user_id), (added, removed)
+    return state
+
+
+def test_incremental_updates_match_recompute(connect, user_id):
+    cur = connect().cursor(cursor_factory=RealDictCursor)
+
+    _change(cur, user_id, added=[0, 1, 2])
+    _change(cur, user_id, added=[3])
+    state = _change(cur, user_id, added=[6, 7])
+    assert (state['current_start'], state['longest_length'], state['total_days']) == (START + timedelta(days=6), 4, 6)
+
+    # Удаление последнего дня короткой текущей серии обходится без пересчёта
+    state = _change(cur, user_id, removed=[7])
+    assert state['last_date'] == START + timedelta(days=6)
+    # Вставка в прошлое склеивает серии, удаление из середины рвёт их
+    state = _change(cur, user_id, added=[4, 5])
+    assert (state['current_start'], state['longest_length']) == (START, 7)
+    state = _change(cur, user_id, removed=[2])
+    assert (state['current_start'], state['longest_length'], state['total_days']) == (START + timedelta(days=3), 4, 6)
+
+
+def test_fetch_streak_counts_missed_days(connect, user_id):
+    cur = connect().cursor(cursor_factory=RealDictCursor)
+    assert fetch_streak(cur, user_id, START) == {'current': 0, 'longest': 0, 'missedDays': 0}
+
+    _change(cur, user_id, added=[0, 1, 4, 5, 6])
+    last = START + timedelta(days=6)
+
+    # Сегодняшний день ещё не пропущен, а после пропуска вчера серия обнуляется
+    assert fetch_streak(cur, user_id, last + timedelta(days=1)) == {'current': 3, 'longest': 3, 'missedDays': 2}
+    assert fetch_streak(cur, user_id, last + timedelta(days=2)) == {'current': 0, 'longest': 3, 'missedDays': 3}
@@ -0,0 +1,53 @@
+from datetime import date
+
+from psycopg2.extras import RealDictCursor
+
+import index
+from tag_dictionary import entry_tag_changes, suggest_tags
+
+
+def test_entry_tag_changes_diff():
+    day = date(2024, 3, 5)
+    assert sorted(entry_tag_changes(day, None, None, ['a', 'b'], 4)) == [('a', None, 4, day), ('b', None, 4, day)]
+    assert sorted(entry_tag_changes(day, ['a', 'b'], 4, ['b', 'c'], 4)) == [('a', 4, None, day), ('c', None, 4, day)]
+    assert entry_tag_changes(day, ['a'], 4, ['a'], 2) == [('a', 4, 2, day)]
+    assert entry_tag_changes(day, ['a'], 4, ['a'], 4) == []
+    assert entry_tag_changes(day, ['a', 'a'], 3, None, None) == [('a', 3, None, day)]
+
+
+def _dictionary(cur, user_id):
+    cur.execute('SELECT tag, usage_count, last_used FROM user_tags WHERE user_id = %s ORDER BY tag', (user_id,))
+    return [(row['tag'], row['usage_count'], str(row['last_used'])) for row in cur.fetchall()]
+
+
+def test_last_used_moves_back_when_latest_use_is_removed(connect, user_id):
+    conn = connect()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    index.upsert_entries(cur, user_id, [
+        {'date': '2024-03-01', 'score': 4, 'thoughts': '', 'tags': ['спорт']},
+        {'date': '2024-03-09', 'score': 3, 'thoughts': '', 'tags': ['спорт', 'работа']},
+    ])
+    assert _dictionary(cur, user_id) == [('работа', 1, '2024-03-09'), ('спорт', 2, '2024-03-09')]
+
+    index.upsert_entries(cur, user_id, [{'date': '2024-03-09', 'score': 3, 'thoughts': '', 'tags': ['работа']}])
+    assert _dictionary(cur, user_id) == [('работа', 1, '2024-03-09'), ('спорт', 1, '2024-03-01')]
+    conn.commit()
+
+
+def test_popular_tags_come_from_the_refreshed_view(connect):
+    conn = connect()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    users = []
+    for n in range(3):
+        cur.execute("INSERT INTO users (email, password_hash) VALUES (%s, '') RETURNING id", (f'popular{n}@test',))
+        users.append(cur.fetchone()['id'])
+    for user in users:
+        index.upsert_entries(cur, user, [{'date': '2024-04-01', 'score': 4, 'thoughts': '', 'tags': ['йога']}])
+    conn.commit()
+
+    assert 'йога' not in [s['tag'] for s in suggest_tags(cur, users[0] + 1000, 'йо', 10)]
+    cur.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY popular_tags')
+    conn.commit()
+    assert suggest_tags(cur, users[0] + 1000, 'йо', 10) == [
+        {'tag': 'йога', 'count': None, 'lastUsed': None, 'average': None, 'source': 'popular'}
+    ]
@@ -0,0 +1,65 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+import tokens
+from tokens import create_token, verify_token
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(tokens, '_verified', tokens.OrderedDict())
+
+
+def test_valid_token_is_verified_and_cached():
+    token = create_token(42, 'user@example.com')
+
+    payload = verify_token(token)
+    assert (payload['user_id'], payload['email']) == (42, 'user@example.com')
+    assert len(tokens._verified) == 1
+
+    # Вызывающий код может менять полученный dict, не портя кэш
+    payload['user_id'] = 1
+    assert verify_token(token)['user_id'] == 42
+
+
+@pytest.mark.parametrize('token', [
+    '',
+    'not base64!',
+    base64.b64encode(b'{"user_id": 1}::bad-signature').decode(),
+])
+def test_invalid_tokens_are_rejected_and_not_cached(token):
+    assert verify_token(token) is None
+    assert not tokens._verified
+
+
+def test_tampered_payload_fails_the_signature():
+    payload_str, signature = base64.b64decode(create_token(42, 'user@example.com')).decode().split('::')
+    forged = base64.b64encode(f"{payload_str.replace('42', '43')}::{signature}".encode()).decode()
+
+    assert verify_token(forged) is None
+
+
+def test_expired_token_is_rejected_and_evicted(monkeypatch):
+    token = create_token(42, 'user@example.com')
+    assert verify_token(token) is not None
+
+    later = datetime.utcnow() + tokens.TOKEN_LIFETIME + timedelta(seconds=1)
+    monkeypatch.setattr(tokens, 'datetime', type('Later', (datetime,), {'utcnow': staticmethod(lambda: later)}))
+
+    assert verify_token(token) is None
+    assert not tokens._verified
+
+
+def test_cache_keeps_the_most_recently_used_tokens(monkeypatch):
+    monkeypatch.setattr(tokens, 'CACHE_SIZE', 2)
+    first, second, third = (create_token(n, f'{n}@example.com') for n in (1, 2, 3))
+
+    verify_token(first)
+    verify_token(second)
+    verify_token(first)
+    verify_token(third)
+
+    cached = {payload['user_id'] for payload, _ in tokens._verified.values()}
+    assert cached == {1, 3}
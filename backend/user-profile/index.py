@@ -1,9 +1,12 @@
 import json
-import os
 from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
 
+from db import DATABASE_URL, get_connection, get_read_connection, mark_written, prepared
+from responses import compressible, dumps, make_etag, not_modified, with_etag
+
+PROFILE_NAME = prepared('profile_name', "SELECT name FROM user_profiles WHERE user_id = $1", ('varchar',))
+
+@compressible
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Manage user profile (get/update user name)
@@ -19,7 +22,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -32,35 +35,38 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'User ID required'})
+            'body': dumps({'error': 'User ID required'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    if not dsn:
+    if not DATABASE_URL:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Database configuration missing'})
+            'body': dumps({'error': 'Database configuration missing'})
         }
     
-    conn = psycopg2.connect(dsn)
+    conn = get_read_connection(user_id) if method == 'GET' else get_connection()
+    from psycopg2.extras import RealDictCursor
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     if method == 'GET':
-        cursor.execute(
-            "SELECT name FROM user_profiles WHERE user_id = %s",
-            (user_id,)
-        )
+        PROFILE_NAME.execute(cursor, user_id)
         result = cursor.fetchone()
         cursor.close()
         conn.close()
         
-        return {
+        name = result['name'] if result else None
+        etag = make_etag('profile', user_id, name)
+        cached = not_modified(event, etag)
+        if cached:
+            return cached
+        
+        return with_etag({
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'name': result['name'] if result else None})
-        }
+            'body': dumps({'name': name})
+        }, etag)
     
     if method == 'PUT':
         body_data = json.loads(event.get('body', '{}'))
@@ -78,6 +84,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         )
         result = cursor.fetchone()
         conn.commit()
+        mark_written(user_id)
         cursor.close()
         conn.close()
         
@@ -85,12 +92,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'name': result['name']})
+            'body': dumps({'name': result['name']})
         }
     
     conn.close()
     return {
         'statusCode': 405,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'})
+        'body': dumps({'error': 'Method not allowed'})
     }
@@ -0,0 +1,100 @@
+-- Агрегаты записей энергии по пользователю и периоду (день / неделя / месяц).
+-- Поддерживаются инкрементально при записи в entries и energy, чтобы статистика
+-- дашборда читалась за O(число периодов), а не за O(число записей).
+CREATE TABLE IF NOT EXISTS t_p45717398_energy_dashboard_pro.energy_rollups (
+    user_id INTEGER NOT NULL,
+    granularity VARCHAR(8) NOT NULL CHECK (granularity IN ('day', 'week', 'month')),
+    bucket_start DATE NOT NULL,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    entry_count INTEGER NOT NULL DEFAULT 0,
+    score_0 INTEGER NOT NULL DEFAULT 0,
+    score_1 INTEGER NOT NULL DEFAULT 0,
+    score_2 INTEGER NOT NULL DEFAULT 0,
+    score_3 INTEGER NOT NULL DEFAULT 0,
+    score_4 INTEGER NOT NULL DEFAULT 0,
+    score_5 INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, granularity, bucket_start)
+);
+
+COMMENT ON TABLE t_p45717398_energy_dashboard_pro.energy_rollups IS 'Сумма, количество и гистограмма оценок по пользователю за день, неделю и месяц';
+
+-- Полная пересборка агрегатов из energy_entries (для одного пользователя или для всех)
+CREATE OR REPLACE FUNCTION t_p45717398_energy_dashboard_pro.rebuild_energy_rollups(p_user_id INTEGER DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rebuilt INTEGER;
+BEGIN
+    DELETE FROM t_p45717398_energy_dashboard_pro.energy_rollups
+    WHERE p_user_id IS NULL OR user_id = p_user_id;
+
+    INSERT INTO t_p45717398_energy_dashboard_pro.energy_rollups
+        (user_id, granularity, bucket_start, score_sum, entry_count,
+         score_0, score_1, score_2, score_3, score_4, score_5)
+    SELECT e.user_id, g.granularity, date_trunc(g.granularity, e.entry_date)::date,
+           SUM(e.score), COUNT(*),
+           COUNT(*) FILTER (WHERE e.score = 0), COUNT(*) FILTER (WHERE e.score = 1),
+           COUNT(*) FILTER (WHERE e.score = 2), COUNT(*) FILTER (WHERE e.score = 3),
+           COUNT(*) FILTER (WHERE e.score = 4), COUNT(*) FILTER (WHERE e.score = 5)
+    FROM t_p45717398_energy_dashboard_pro.energy_entries e
+    CROSS JOIN (VALUES ('day'), ('week'), ('month')) AS g(granularity)
+    WHERE e.user_id IS NOT NULL
+      AND (p_user_id IS NULL OR e.user_id = p_user_id)
+    GROUP BY e.user_id, g.granularity, date_trunc(g.granularity, e.entry_date);
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$;
+
+-- Проверка согласованности: периоды, где агрегат расходится с сырыми данными.
+-- Пустые строки (entry_count = 0 после удалений) считаются эквивалентными отсутствующим.
+CREATE OR REPLACE FUNCTION t_p45717398_energy_dashboard_pro.check_energy_rollups(p_user_id INTEGER DEFAULT NULL)
+RETURNS TABLE (
+    user_id INTEGER,
+    granularity VARCHAR,
+    bucket_start DATE,
+    expected_sum BIGINT,
+    actual_sum BIGINT,
+    expected_count BIGINT,
+    actual_count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH expected AS (
+        SELECT e.user_id, g.granularity::varchar AS granularity,
+               date_trunc(g.granularity, e.entry_date)::date AS bucket_start,
+               SUM(e.score) AS score_sum, COUNT(*) AS entry_count,
+               ARRAY[COUNT(*) FILTER (WHERE e.score = 0), COUNT(*) FILTER (WHERE e.score = 1),
+                     COUNT(*) FILTER (WHERE e.score = 2), COUNT(*) FILTER (WHERE e.score = 3),
+                     COUNT(*) FILTER (WHERE e.score = 4), COUNT(*) FILTER (WHERE e.score = 5)] AS histogram
+        FROM t_p45717398_energy_dashboard_pro.energy_entries e
+        CROSS JOIN (VALUES ('day'), ('week'), ('month')) AS g(granularity)
+        WHERE e.user_id IS NOT NULL
+          AND (p_user_id IS NULL OR e.user_id = p_user_id)
+        GROUP BY e.user_id, g.granularity, date_trunc(g.granularity, e.entry_date)
+    ),
+    actual AS (
+        SELECT r.user_id, r.granularity, r.bucket_start, r.score_sum::bigint AS score_sum,
+               r.entry_count::bigint AS entry_count,
+               ARRAY[r.score_0, r.score_1, r.score_2, r.score_3, r.score_4, r.score_5]::bigint[] AS histogram
+        FROM t_p45717398_energy_dashboard_pro.energy_rollups r
+        WHERE r.entry_count <> 0
+          AND (p_user_id IS NULL OR r.user_id = p_user_id)
+    )
+    SELECT COALESCE(x.user_id, a.user_id), COALESCE(x.granularity, a.granularity),
+           COALESCE(x.bucket_start, a.bucket_start),
+           x.score_sum, a.score_sum, x.entry_count, a.entry_count
+    FROM expected x
+    FULL OUTER JOIN actual a
+        ON a.user_id = x.user_id AND a.granularity = x.granularity AND a.bucket_start = x.bucket_start
+    WHERE x.score_sum IS DISTINCT FROM a.score_sum
+       OR x.entry_count IS DISTINCT FROM a.entry_count
+       OR x.histogram IS DISTINCT FROM a.histogram;
+$$;
+
+-- Первичное заполнение по существующим записям
+SELECT t_p45717398_energy_dashboard_pro.rebuild_energy_rollups();
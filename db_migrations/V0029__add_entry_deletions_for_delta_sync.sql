@@ -0,0 +1,15 @@
+-- Журнал удалений записей энергии (tombstones) для delta-синхронизации клиентов
+CREATE TABLE IF NOT EXISTS t_p45717398_energy_dashboard_pro.energy_entry_deletions (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL,
+    entry_date DATE NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_energy_entry_deletions_user_deleted
+ON t_p45717398_energy_dashboard_pro.energy_entry_deletions(user_id, deleted_at);
+
+-- Выборка изменённых записей по метке синхронизации
+CREATE INDEX IF NOT EXISTS idx_energy_entries_user_updated
+ON t_p45717398_energy_dashboard_pro.energy_entries(user_id, updated_at);
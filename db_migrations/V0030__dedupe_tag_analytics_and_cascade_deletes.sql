@@ -0,0 +1,39 @@
+-- Разовая чистка tag_analytics: до этого каждое пересохранение дня добавляло
+-- строки заново, а удаление записи оставляло сироты.
+
+-- Сироты удалённых записей
+DELETE FROM t_p45717398_energy_dashboard_pro.tag_analytics ta
+WHERE NOT EXISTS (
+    SELECT 1 FROM t_p45717398_energy_dashboard_pro.energy_entries e WHERE e.id = ta.entry_id
+);
+
+-- Теги, которых уже нет в записи
+DELETE FROM t_p45717398_energy_dashboard_pro.tag_analytics ta
+USING t_p45717398_energy_dashboard_pro.energy_entries e
+WHERE e.id = ta.entry_id
+  AND NOT (COALESCE(e.tags, '[]'::jsonb) ? ta.tag);
+
+-- Дубли (entry_id, tag): оставляем самую свежую строку
+DELETE FROM t_p45717398_energy_dashboard_pro.tag_analytics ta
+USING t_p45717398_energy_dashboard_pro.tag_analytics newer
+WHERE newer.entry_id = ta.entry_id
+  AND newer.tag = ta.tag
+  AND newer.id > ta.id;
+
+-- Оценка и дата должны совпадать с текущей записью
+UPDATE t_p45717398_energy_dashboard_pro.tag_analytics ta
+SET score = e.score, entry_date = e.entry_date, user_id = e.user_id
+FROM t_p45717398_energy_dashboard_pro.energy_entries e
+WHERE e.id = ta.entry_id
+  AND (ta.score <> e.score OR ta.entry_date <> e.entry_date OR ta.user_id IS DISTINCT FROM e.user_id);
+
+-- Одна строка на тег записи: основа для ON CONFLICT (entry_id, tag)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tag_analytics_entry_tag
+ON t_p45717398_energy_dashboard_pro.tag_analytics(entry_id, tag);
+
+DROP INDEX IF EXISTS t_p45717398_energy_dashboard_pro.idx_tag_analytics_entry_id;
+
+-- Удаление записи удаляет её аналитику тегов
+ALTER TABLE t_p45717398_energy_dashboard_pro.tag_analytics
+ADD CONSTRAINT fk_tag_analytics_entry
+FOREIGN KEY (entry_id) REFERENCES t_p45717398_energy_dashboard_pro.energy_entries(id) ON DELETE CASCADE;
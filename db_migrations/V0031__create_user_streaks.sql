@@ -0,0 +1,33 @@
+-- Кэш серий ежедневного заполнения дневника: обновляется за O(1) при записи,
+-- полный пересчёт (gaps-and-islands) нужен только при вставке в прошлое и удалениях
+CREATE TABLE IF NOT EXISTS t_p45717398_energy_dashboard_pro.user_streaks (
+    user_id INTEGER PRIMARY KEY,
+    first_date DATE,
+    last_date DATE,
+    current_start DATE,
+    longest_length INTEGER NOT NULL DEFAULT 0,
+    total_days INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN t_p45717398_energy_dashboard_pro.user_streaks.current_start IS 'Начало последней непрерывной серии, заканчивающейся в last_date';
+
+INSERT INTO t_p45717398_energy_dashboard_pro.user_streaks
+    (user_id, first_date, last_date, current_start, longest_length, total_days)
+WITH days AS (
+    SELECT user_id, entry_date,
+           entry_date - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY entry_date))::int AS island
+    FROM t_p45717398_energy_dashboard_pro.energy_entries
+    WHERE user_id IS NOT NULL
+),
+islands AS (
+    SELECT user_id, MIN(entry_date) AS start_date, MAX(entry_date) AS end_date, COUNT(*) AS length
+    FROM days
+    GROUP BY user_id, island
+)
+SELECT user_id, MIN(start_date), MAX(end_date),
+       (ARRAY_AGG(start_date ORDER BY end_date DESC))[1],
+       MAX(length), SUM(length)
+FROM islands
+GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
@@ -0,0 +1,9 @@
+-- Счётчик версий данных пользователя по ресурсу: увеличивается при каждой записи,
+-- чтобы GET мог вычислить ETag одним поиском по первичному ключу
+CREATE TABLE IF NOT EXISTS t_p45717398_energy_dashboard_pro.data_versions (
+    user_id INTEGER NOT NULL,
+    resource VARCHAR(32) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, resource)
+);
@@ -0,0 +1,8 @@
+-- Полнотекстовый поиск по мыслям: вычисляемый tsvector с русской морфологией и GIN-индекс,
+-- чтобы поиск не требовал последовательного сканирования ILIKE
+ALTER TABLE t_p45717398_energy_dashboard_pro.energy_entries
+ADD COLUMN IF NOT EXISTS thoughts_tsv tsvector
+GENERATED ALWAYS AS (to_tsvector('russian', COALESCE(thoughts, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_energy_entries_thoughts_tsv
+ON t_p45717398_energy_dashboard_pro.energy_entries USING GIN (thoughts_tsv);
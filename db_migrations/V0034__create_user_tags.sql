@@ -0,0 +1,27 @@
+-- Словарь тегов пользователя для автодополнения: обновляется при записи,
+-- поиск по префиксу идёт по индексу вместо чтения всех записей
+CREATE TABLE IF NOT EXISTS t_p45717398_energy_dashboard_pro.user_tags (
+    user_id INTEGER NOT NULL,
+    tag VARCHAR(50) NOT NULL,
+    usage_count INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    last_used DATE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, tag)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_tags_user_prefix
+ON t_p45717398_energy_dashboard_pro.user_tags (user_id, LOWER(tag) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_user_tags_prefix
+ON t_p45717398_energy_dashboard_pro.user_tags (LOWER(tag) text_pattern_ops);
+
+INSERT INTO t_p45717398_energy_dashboard_pro.user_tags (user_id, tag, usage_count, score_sum, last_used)
+SELECT e.user_id, t.tag, COUNT(*), SUM(e.score), MAX(e.entry_date)
+FROM t_p45717398_energy_dashboard_pro.energy_entries e
+CROSS JOIN LATERAL (
+    SELECT DISTINCT tag FROM jsonb_array_elements_text(COALESCE(e.tags, '[]'::jsonb)) AS x(tag)
+) t
+WHERE e.user_id IS NOT NULL AND LENGTH(t.tag) BETWEEN 1 AND 50
+GROUP BY e.user_id, t.tag
+ON CONFLICT (user_id, tag) DO NOTHING;
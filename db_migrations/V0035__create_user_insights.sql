@@ -0,0 +1,8 @@
+-- Кэш выводов о влиянии тегов: действителен, пока версия данных записей пользователя
+-- (data_versions, resource = 'entries') совпадает с version
+CREATE TABLE IF NOT EXISTS t_p45717398_energy_dashboard_pro.user_insights (
+    user_id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL,
+    payload JSONB NOT NULL,
+    computed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,20 @@
+-- Состояние детектора спада энергии: обновляется за O(1) при каждой новой оценке,
+-- крон уведомлений читает только пользователей с at_risk вместо запроса по каждому
+CREATE TABLE IF NOT EXISTS t_p45717398_energy_dashboard_pro.energy_risk (
+    user_id INTEGER PRIMARY KEY,
+    last_date DATE,
+    observations INTEGER NOT NULL DEFAULT 0,
+    ewma DOUBLE PRECISION,
+    ewm_var DOUBLE PRECISION NOT NULL DEFAULT 0,
+    low_streak INTEGER NOT NULL DEFAULT 0,
+    low_sum INTEGER NOT NULL DEFAULT 0,
+    at_risk BOOLEAN NOT NULL DEFAULT FALSE,
+    reason VARCHAR(32),
+    flagged_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN t_p45717398_energy_dashboard_pro.energy_risk.reason IS 'low_streak, low_baseline или sudden_drop';
+
+CREATE INDEX IF NOT EXISTS idx_energy_risk_flagged
+ON t_p45717398_energy_dashboard_pro.energy_risk (last_date) WHERE at_risk;
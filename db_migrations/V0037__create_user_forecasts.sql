@@ -0,0 +1,20 @@
+-- Параметры и состояние модели прогноза энергии (Хольт-Винтерс с недельной сезонностью).
+-- version — версия данных записей, на которой модель актуальна; history_count и history_checksum
+-- описывают записи до last_date, чтобы отличать дозапись новых дней от правок в прошлом
+CREATE TABLE IF NOT EXISTS t_p45717398_energy_dashboard_pro.user_forecasts (
+    user_id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL,
+    alpha DOUBLE PRECISION NOT NULL,
+    beta DOUBLE PRECISION NOT NULL,
+    gamma DOUBLE PRECISION NOT NULL,
+    level DOUBLE PRECISION NOT NULL,
+    trend DOUBLE PRECISION NOT NULL,
+    season DOUBLE PRECISION[] NOT NULL,
+    sse DOUBLE PRECISION NOT NULL,
+    errors INTEGER NOT NULL,
+    observations INTEGER NOT NULL,
+    last_date DATE NOT NULL,
+    history_count INTEGER NOT NULL,
+    history_checksum BIGINT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
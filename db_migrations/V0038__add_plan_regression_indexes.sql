@@ -0,0 +1,10 @@
+-- Индексы под запросы, которые проверка планов (python db.py --check-plans) ловила на Seq Scan:
+-- вход ищет пользователя по LOWER(email), а idx_users_email построен по самому email
+CREATE INDEX IF NOT EXISTS idx_users_email_lower
+ON t_p45717398_energy_dashboard_pro.users (LOWER(email));
+
+-- Крон уведомлений читает только пользователей с привязанным Telegram
+CREATE INDEX IF NOT EXISTS idx_users_telegram_recipients
+ON t_p45717398_energy_dashboard_pro.users (id) WHERE telegram_chat_id IS NOT NULL;
+
+ANALYZE t_p45717398_energy_dashboard_pro.users;
@@ -0,0 +1,114 @@
+-- Декларативное секционирование energy_entries по entry_date: одна секция на год и секция по умолчанию.
+-- Запросы по диапазону дат читают только нужные секции, а VACUUM и индексы работают с таблицами одного года.
+-- Ключ секционирования входит в каждое уникальное ограничение: первичный ключ (id, entry_date),
+-- уникальность (user_id, entry_date) для ON CONFLICT в entries/energy сохраняется как есть.
+
+-- Внешний ключ tag_analytics ссылается на id и пересоздаётся составным после переноса
+ALTER TABLE t_p45717398_energy_dashboard_pro.tag_analytics
+DROP CONSTRAINT IF EXISTS fk_tag_analytics_entry;
+
+ALTER TABLE t_p45717398_energy_dashboard_pro.energy_entries
+RENAME TO energy_entries_unpartitioned;
+
+CREATE TABLE t_p45717398_energy_dashboard_pro.energy_entries (
+    id INTEGER NOT NULL DEFAULT nextval('t_p45717398_energy_dashboard_pro.energy_entries_id_seq'),
+    entry_date DATE NOT NULL,
+    score INTEGER NOT NULL CONSTRAINT energy_entries_score_check CHECK (score >= 0 AND score <= 5),
+    thoughts TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER,
+    tags JSONB DEFAULT '[]'::jsonb,
+    thoughts_tsv tsvector GENERATED ALWAYS AS (to_tsvector('russian', COALESCE(thoughts, ''))) STORED
+) PARTITION BY RANGE (entry_date);
+
+ALTER SEQUENCE t_p45717398_energy_dashboard_pro.energy_entries_id_seq
+OWNED BY t_p45717398_energy_dashboard_pro.energy_entries.id;
+
+-- Записи вне созданных годовых секций; пока в ней есть строки года, секция этого года не создаётся
+CREATE TABLE t_p45717398_energy_dashboard_pro.energy_entries_default
+PARTITION OF t_p45717398_energy_dashboard_pro.energy_entries DEFAULT;
+
+-- Годовые секции с first_year по текущий год + years_ahead. Вызывается кроном уведомлений,
+-- чтобы секция следующего года существовала до первой записи в ней
+CREATE OR REPLACE FUNCTION t_p45717398_energy_dashboard_pro.ensure_energy_entries_partitions(
+    first_year INTEGER DEFAULT EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER,
+    years_ahead INTEGER DEFAULT 1
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    last_year INTEGER := EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER + years_ahead;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR y IN first_year..last_year LOOP
+        partition_name := 'energy_entries_y' || y;
+        CONTINUE WHEN to_regclass('t_p45717398_energy_dashboard_pro.' || partition_name) IS NOT NULL;
+
+        IF EXISTS (
+            SELECT 1 FROM t_p45717398_energy_dashboard_pro.energy_entries_default
+            WHERE entry_date >= make_date(y, 1, 1) AND entry_date < make_date(y + 1, 1, 1)
+        ) THEN
+            RAISE NOTICE 'energy_entries_default has rows for %, partition % not created', y, partition_name;
+            CONTINUE;
+        END IF;
+
+        EXECUTE format(
+            'CREATE TABLE t_p45717398_energy_dashboard_pro.%I
+             PARTITION OF t_p45717398_energy_dashboard_pro.energy_entries
+             FOR VALUES FROM (%L) TO (%L)',
+            partition_name, make_date(y, 1, 1), make_date(y + 1, 1, 1)
+        );
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+SELECT t_p45717398_energy_dashboard_pro.ensure_energy_entries_partitions(
+    LEAST(
+        COALESCE((SELECT EXTRACT(YEAR FROM MIN(entry_date))::INTEGER
+                  FROM t_p45717398_energy_dashboard_pro.energy_entries_unpartitioned),
+                 EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER),
+        EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER
+    )
+);
+
+INSERT INTO t_p45717398_energy_dashboard_pro.energy_entries
+    (id, entry_date, score, thoughts, created_at, updated_at, user_id, tags)
+SELECT id, entry_date, score, thoughts, created_at, updated_at, user_id, tags
+FROM t_p45717398_energy_dashboard_pro.energy_entries_unpartitioned;
+
+DROP TABLE t_p45717398_energy_dashboard_pro.energy_entries_unpartitioned;
+
+ALTER TABLE t_p45717398_energy_dashboard_pro.energy_entries
+ADD CONSTRAINT energy_entries_pkey PRIMARY KEY (id, entry_date);
+
+-- Основа для ON CONFLICT (user_id, entry_date); по нему же идут выборки пользователя по датам
+-- (обратный проход заменяет прежний idx_energy_entries_user_date)
+ALTER TABLE t_p45717398_energy_dashboard_pro.energy_entries
+ADD CONSTRAINT energy_entries_user_date_unique UNIQUE (user_id, entry_date);
+
+ALTER TABLE t_p45717398_energy_dashboard_pro.energy_entries
+ADD CONSTRAINT fk_energy_entries_user
+FOREIGN KEY (user_id) REFERENCES t_p45717398_energy_dashboard_pro.users(id);
+
+CREATE INDEX IF NOT EXISTS idx_energy_entries_tags
+ON t_p45717398_energy_dashboard_pro.energy_entries USING GIN (tags);
+
+CREATE INDEX IF NOT EXISTS idx_energy_entries_user_updated
+ON t_p45717398_energy_dashboard_pro.energy_entries(user_id, updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_energy_entries_thoughts_tsv
+ON t_p45717398_energy_dashboard_pro.energy_entries USING GIN (thoughts_tsv);
+
+-- Удаление записи по-прежнему удаляет её аналитику тегов; entry_date в tag_analytics
+-- совпадает с датой записи (синхронизируется при каждом сохранении)
+ALTER TABLE t_p45717398_energy_dashboard_pro.tag_analytics
+ADD CONSTRAINT fk_tag_analytics_entry
+FOREIGN KEY (entry_id, entry_date)
+REFERENCES t_p45717398_energy_dashboard_pro.energy_entries(id, entry_date) ON DELETE CASCADE;
+
+ANALYZE t_p45717398_energy_dashboard_pro.energy_entries;
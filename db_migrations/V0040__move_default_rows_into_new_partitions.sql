@@ -0,0 +1,74 @@
+-- Секция года создаётся и тогда, когда строки этого года уже попали в energy_entries_default:
+-- они переносятся в новую секцию в той же транзакции. Кроме лет first_year..текущий + years_ahead
+-- обрабатываются все годы, строки которых лежат в секции по умолчанию.
+-- Функция вызывается ежедневным обслуживанием в check-notifications, а не на каждом запросе.
+CREATE OR REPLACE FUNCTION t_p45717398_energy_dashboard_pro.ensure_energy_entries_partitions(
+    first_year INTEGER DEFAULT EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER,
+    years_ahead INTEGER DEFAULT 1
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    last_year INTEGER := EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER + years_ahead;
+    y INTEGER;
+    partition_name TEXT;
+    range_start DATE;
+    range_end DATE;
+    created INTEGER := 0;
+BEGIN
+    FOR y IN
+        SELECT generate_series(first_year, last_year)
+        UNION
+        SELECT DISTINCT EXTRACT(YEAR FROM entry_date)::INTEGER
+        FROM t_p45717398_energy_dashboard_pro.energy_entries_default
+        ORDER BY 1
+    LOOP
+        partition_name := 'energy_entries_y' || y;
+        CONTINUE WHEN to_regclass('t_p45717398_energy_dashboard_pro.' || partition_name) IS NOT NULL;
+        range_start := make_date(y, 1, 1);
+        range_end := make_date(y + 1, 1, 1);
+
+        -- Пока строки года в секции по умолчанию, секцию года создать нельзя. Запись в секцию
+        -- по умолчанию блокируется до конца транзакции, строки года и их аналитика тегов
+        -- откладываются, удаляются (аналитика уходит каскадом) и возвращаются уже в новую секцию
+        LOCK TABLE t_p45717398_energy_dashboard_pro.energy_entries_default IN EXCLUSIVE MODE;
+
+        CREATE TEMP TABLE moved_entries AS
+        SELECT id, entry_date, score, thoughts, created_at, updated_at, user_id, tags
+        FROM t_p45717398_energy_dashboard_pro.energy_entries_default
+        WHERE entry_date >= range_start AND entry_date < range_end;
+
+        CREATE TEMP TABLE moved_tags AS
+        SELECT ta.*
+        FROM t_p45717398_energy_dashboard_pro.tag_analytics ta
+        JOIN moved_entries m ON m.id = ta.entry_id AND m.entry_date = ta.entry_date;
+
+        DELETE FROM t_p45717398_energy_dashboard_pro.energy_entries_default
+        WHERE entry_date >= range_start AND entry_date < range_end;
+
+        EXECUTE format(
+            'CREATE TABLE t_p45717398_energy_dashboard_pro.%I
+             PARTITION OF t_p45717398_energy_dashboard_pro.energy_entries
+             FOR VALUES FROM (%L) TO (%L)',
+            partition_name, range_start, range_end
+        );
+
+        INSERT INTO t_p45717398_energy_dashboard_pro.energy_entries
+            (id, entry_date, score, thoughts, created_at, updated_at, user_id, tags)
+        SELECT id, entry_date, score, thoughts, created_at, updated_at, user_id, tags
+        FROM moved_entries;
+
+        INSERT INTO t_p45717398_energy_dashboard_pro.tag_analytics
+        SELECT * FROM moved_tags;
+
+        DROP TABLE moved_entries;
+        DROP TABLE moved_tags;
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- Годы, строки которых уже лежат в секции по умолчанию, получают свои секции сразу
+SELECT t_p45717398_energy_dashboard_pro.ensure_energy_entries_partitions();
@@ -0,0 +1,19 @@
+-- Популярные теги всех пользователей для подсказок новым пользователям: заранее посчитанный
+-- GROUP BY по user_tags вместо подсчёта на каждый запрос автодополнения.
+-- Пересчитывается ежедневным обслуживанием в check-notifications (REFRESH ... CONCURRENTLY).
+-- Тег попадает в список, только если им пользуются не меньше трёх человек.
+CREATE MATERIALIZED VIEW IF NOT EXISTS t_p45717398_energy_dashboard_pro.popular_tags AS
+SELECT tag, COUNT(*)::INTEGER AS users, SUM(usage_count)::INTEGER AS usage_count
+FROM t_p45717398_energy_dashboard_pro.user_tags
+GROUP BY tag
+HAVING COUNT(*) >= 3;
+
+-- Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_popular_tags_tag
+ON t_p45717398_energy_dashboard_pro.popular_tags (tag);
+
+CREATE INDEX IF NOT EXISTS idx_popular_tags_prefix
+ON t_p45717398_energy_dashboard_pro.popular_tags (LOWER(tag) text_pattern_ops);
+
+-- Префиксный поиск по тегам всех пользователей теперь идёт по представлению
+DROP INDEX IF EXISTS t_p45717398_energy_dashboard_pro.idx_user_tags_prefix;
@@ -327,7 +327,8 @@ const EnergyCalendar = ({ data, isLoading }: EnergyCalendarProps) => {
                     try {
                       const token = localStorage.getItem('auth_token');
                       const entryId = selectedDay.entry.id;
-                      const response = await fetch(`${API_URL}?id=${entryId}`, {
+                      const entryDate = encodeURIComponent(selectedDay.entry.date);
+                      const response = await fetch(`${API_URL}?id=${entryId}&date=${entryDate}`, {
                         method: 'DELETE',
                         headers: {
                           'Content-Type': 'application/json',
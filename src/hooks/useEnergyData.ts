@@ -1,6 +1,9 @@
-import { useQuery } from '@tanstack/react-query';
+import { useEffect, useMemo } from 'react';
+import { useInfiniteQuery } from '@tanstack/react-query';
 
 const API_URL = 'https://functions.poehali.dev/2d4b8a75-8e94-40d2-8412-5e0040b74b86';
+// Совпадает с DEFAULT_PAGE_SIZE в backend/entries: первая страница грузится за постоянное время
+const PAGE_SIZE = 100;
 
 interface EnergyEntry {
   id?: number;
@@ -35,6 +38,12 @@ interface EnergyData {
   stats: EnergyStats;
 }
 
+interface EnergyPage {
+  entries: EnergyEntry[];
+  stats?: EnergyStats;
+  nextCursor: string | null;
+}
+
 const calculateStats = (entries: EnergyEntry[]): EnergyStats => {
   const total = entries.length;
   const good = entries.filter(e => e.score >= 3).length;
@@ -100,72 +109,99 @@ const addDerivedFields = (entry: EnergyEntry): EnergyEntry => {
   return { ...entry, category, week, month };
 };
 
+const fetchPage = async (token: string | null, cursor: string | null): Promise<EnergyPage> => {
+  const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+  if (cursor) {
+    params.set('cursor', cursor);
+  }
+  const response = await fetch(`${API_URL}?${params.toString()}`, {
+    headers: {
+      'X-Auth-Token': token || '',
+    },
+  });
+  if (!response.ok) {
+    throw new Error('Failed to fetch energy data');
+  }
+  const data = await response.json();
+  return { entries: data.entries || [], stats: data.stats, nextCursor: data.nextCursor ?? null };
+};
+
+const buildEnergyData = (pages: EnergyPage[]): EnergyData => {
+  const rawEntries = pages.flatMap(page => page.entries);
+  
+  const sortedEntries = [...rawEntries].sort((a, b) => {
+    const dateA = new Date(a.date).getTime();
+    const dateB = new Date(b.date).getTime();
+    return dateA - dateB;
+  });
+  
+  const entries = sortedEntries.map(addDerivedFields);
+  
+  // Статистика считается на сервере по всей истории и приходит с первой страницей
+  let stats = pages[0]?.stats || calculateStats(entries);
+  
+  if (!stats.last14Days && entries.length > 0) {
+    // Находим самую позднюю дату в entries (это текущая дата на сервере)
+    const latestDate = new Date(Math.max(...entries.map(e => new Date(e.date).getTime())));
+    
+    const fourteenDaysAgo = new Date(latestDate.getTime() - 14 * 24 * 60 * 60 * 1000);
+    const last14DaysEntries = entries.filter(e => {
+      const entryDate = new Date(e.date);
+      return entryDate >= fourteenDaysAgo && entryDate <= latestDate;
+    });
+    
+    const currentMonthEntries = entries.filter(e => {
+      const entryDate = new Date(e.date);
+      return entryDate.getFullYear() === latestDate.getFullYear() && 
+             entryDate.getMonth() === latestDate.getMonth();
+    });
+    
+    stats = {
+      ...stats,
+      last14Days: {
+        average: last14DaysEntries.length > 0 
+          ? last14DaysEntries.reduce((sum, e) => sum + e.score, 0) / last14DaysEntries.length 
+          : 0,
+        count: last14DaysEntries.length
+      },
+      currentMonth: {
+        average: currentMonthEntries.length > 0
+          ? currentMonthEntries.reduce((sum, e) => sum + e.score, 0) / currentMonthEntries.length
+          : 0,
+        count: currentMonthEntries.length
+      }
+    };
+  }
+  
+  return { entries, stats };
+};
+
 export const useEnergyData = () => {
   const token = localStorage.getItem('auth_token');
   
-  return useQuery<EnergyData>({
-    queryKey: ['energy-data', 'v4'],
-    queryFn: async () => {
-      const response = await fetch(API_URL, {
-        headers: {
-          'X-Auth-Token': token || '',
-        },
-      });
-      if (!response.ok) {
-        throw new Error('Failed to fetch energy data');
-      }
-      const data = await response.json();
-      const rawEntries: EnergyEntry[] = data.entries || [];
-      
-      const sortedEntries = [...rawEntries].sort((a, b) => {
-        const dateA = new Date(a.date).getTime();
-        const dateB = new Date(b.date).getTime();
-        return dateA - dateB;
-      });
-      
-      const entries = sortedEntries.map(addDerivedFields);
-      
-      // ВАЖНО: Если бэкенд вернул новую версию с last14Days — используем её
-      // Иначе считаем на фронте (временно, пока бэкенд не обновится)
-      let stats = data.stats || calculateStats(entries);
-      
-      if (!stats.last14Days && entries.length > 0) {
-        // Находим самую позднюю дату в entries (это текущая дата на сервере)
-        const latestDate = new Date(Math.max(...entries.map(e => new Date(e.date).getTime())));
-        
-        const fourteenDaysAgo = new Date(latestDate.getTime() - 14 * 24 * 60 * 60 * 1000);
-        const last14DaysEntries = entries.filter(e => {
-          const entryDate = new Date(e.date);
-          return entryDate >= fourteenDaysAgo && entryDate <= latestDate;
-        });
-        
-        const currentMonthEntries = entries.filter(e => {
-          const entryDate = new Date(e.date);
-          return entryDate.getFullYear() === latestDate.getFullYear() && 
-                 entryDate.getMonth() === latestDate.getMonth();
-        });
-        
-        stats = {
-          ...stats,
-          last14Days: {
-            average: last14DaysEntries.length > 0 
-              ? last14DaysEntries.reduce((sum, e) => sum + e.score, 0) / last14DaysEntries.length 
-              : 0,
-            count: last14DaysEntries.length
-          },
-          currentMonth: {
-            average: currentMonthEntries.length > 0
-              ? currentMonthEntries.reduce((sum, e) => sum + e.score, 0) / currentMonthEntries.length
-              : 0,
-            count: currentMonthEntries.length
-          }
-        };
-      }
-      
-      return { entries, stats };
-    },
+  const query = useInfiniteQuery<EnergyPage>({
+    queryKey: ['energy-data', 'v5'],
+    queryFn: ({ pageParam }) => fetchPage(token, pageParam as string | null),
+    initialPageParam: null,
+    getNextPageParam: lastPage => lastPage.nextCursor ?? undefined,
     refetchInterval: 30000,
     enabled: !!token,
     staleTime: 0,
   });
-};
\ No newline at end of file
+  
+  const { hasNextPage, isFetchingNextPage, fetchNextPage } = query;
+  
+  // Дашборд показывается по первой странице, более старая история догружается по nextCursor
+  useEffect(() => {
+    if (hasNextPage && !isFetchingNextPage) {
+      fetchNextPage();
+    }
+  }, [hasNextPage, isFetchingNextPage, fetchNextPage]);
+  
+  const data = useMemo(
+    () => (query.data ? buildEnergyData(query.data.pages) : undefined),
+    [query.data]
+  );
+  
+  return { ...query, data };
+};